@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for per-frame brightness/contrast statistics.
+
+Compares the original full-frame float64 np.mean/np.std path with the
+subsampled meanStdDev kernel used by analyze_frame_for_visuals.
+
+Usage: python bench_frame_stats.py [iterations]
+"""
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Add current directory to path to import main module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import compute_frame_statistics, to_grayscale
+
+RESOLUTIONS = [
+    ('480p', 480, 640),
+    ('720p', 720, 1280),
+    ('1080p', 1080, 1920),
+]
+
+
+def legacy_statistics(cv_frame):
+    gray = cv2.cvtColor(cv_frame, cv2.COLOR_BGR2GRAY)
+    return float(np.mean(gray)), float(np.std(gray))
+
+
+def kernel_statistics(cv_frame):
+    return compute_frame_statistics(to_grayscale(cv_frame))
+
+
+def time_per_frame_us(func, frame, iterations):
+    func(frame)  # warm up buffers
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(frame)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = np.random.default_rng(0)
+    print(f"{'res':<6} {'legacy us':>10} {'kernel us':>10} {'speedup':>8} {'d_mean':>7} {'d_std':>7}")
+    for label, height, width in RESOLUTIONS:
+        frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        legacy_us = time_per_frame_us(legacy_statistics, frame, iterations)
+        kernel_us = time_per_frame_us(kernel_statistics, frame, iterations)
+        legacy_mean, legacy_std = legacy_statistics(frame)
+        kernel_mean, kernel_std = kernel_statistics(frame)
+        print(f"{label:<6} {legacy_us:>10.1f} {kernel_us:>10.1f} {legacy_us / kernel_us:>7.1f}x "
+              f"{abs(legacy_mean - kernel_mean):>7.2f} {abs(legacy_std - kernel_std):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,11 @@
 import os
 import multiprocessing
+import shutil
+
+# Workers write Prometheus samples here; /metrics aggregates them. Must be set before the app imports prometheus_client.
+prometheus_multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/ai-interviewer-metrics')
+# Shared by workers for /admin/diagnostics requests and results (profiles, slow requests, tracemalloc)
+diagnostics_dir = os.environ.setdefault('DIAGNOSTICS_DIR', '/tmp/ai-interviewer-diagnostics')
 
 # Server socket
 bind = "0.0.0.0:5001"
@@ -7,7 +13,10 @@ backlog = 2048
 
 # Worker processes
 workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
-worker_class = "sync"
+# Threaded workers. Each open /ws/frames stream holds one thread for its whole life, so main.py serves at most
+# FRAME_STREAMS_PER_WORKER (default threads // 2) streams per worker and sends the rest to HTTP frame posts
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', "gthread")
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
 worker_connections = 1000
 timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
 keepalive = 2
@@ -17,10 +26,11 @@ max_requests = 1000
 max_requests_jitter = 50
 
 # Logging
-accesslog = "-"
+# ACCESS_LOG=off drops the per-request access line (nginx already logs every request with its request id)
+accesslog = None if os.environ.get('ACCESS_LOG', '-').lower() in ('off', 'none', '') else os.environ.get('ACCESS_LOG', '-')
 errorlog = "-"
-loglevel = "info"
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s request_id=%({x-request-id}o)s'
 
 # Process naming
 proc_name = "ai-interviewer"
@@ -50,6 +60,11 @@ spew = False
 # Server hooks
 def on_starting(server):
     server.log.info("Starting AI Interviewer server")
+    # Samples from a previous run would otherwise be summed into this one
+    shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+    os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+    shutil.rmtree(diagnostics_dir, ignore_errors=True)
+    os.makedirs(diagnostics_dir, exist_ok=True)
 
 def on_reload(server):
     server.log.info("Reloading AI Interviewer server")
@@ -65,6 +80,12 @@ def post_fork(server, worker):
 
 def post_worker_init(worker):
     worker.log.info("Worker initialized (pid: %s)", worker.pid)
+    # Runs after gunicorn resets the worker's signal handlers; lets /admin/diagnostics target this worker
+    try:
+        from main import install_diagnostics_signal_handler
+        install_diagnostics_signal_handler()
+    except Exception as e:
+        worker.log.warning("Diagnostics handler not installed: %s", e)
 
 def worker_abort(worker):
     worker.log.info("Worker aborted (pid: %s)", worker.pid)
@@ -78,5 +99,16 @@ def when_ready(server):
 def worker_exit(server, worker):
     server.log.info("Worker exited (pid: %s)", worker.pid)
 
+def child_exit(server, worker):
+    try:
+        os.remove(os.path.join(diagnostics_dir, "worker-%s" % worker.pid))
+    except OSError:
+        pass
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
+
 def on_exit(server):
     server.log.info("Server exiting") 
\ No newline at end of file
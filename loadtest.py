@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Load test for the interview app under gunicorn, against a local OpenAI stand-in.
+
+Starts mock_openai_server in-process, launches gunicorn (gunicorn.conf.py) in a
+scratch working directory so interview_data.db and uploads are not touched, and
+runs scripted candidate sessions concurrently:
+
+    login -> /upload_resume -> /start_interview -> N x (/analyze_visuals frames,
+    /submit_answer, /generate_speech) -> /submit_evaluations
+
+Reports requests/s, p50/p95/p99 latency per endpoint and peak RSS per worker.
+
+Each session logs in as its own candidate, so per-user state (admission tickets,
+sessions) is exercised as in production. Accounts come from --users-csv (the
+username,password,allowed format of `manage_users.py import`), from --user-pattern
+with --password, or from a single --user / LOADTEST_USER shared by every session.
+When loadtest.py starts gunicorn itself, the CSV or pattern accounts are imported
+into the scratch users.db; with no accounts given it creates throwaway
+loadtest0000, loadtest0001, ... candidates there.
+
+Usage:
+    python loadtest.py --sessions 20 --concurrency 5 --answers 4
+    python loadtest.py --workers 2 --threads 8 --chat-latency 0.8 --json results.json
+    python loadtest.py --base-url http://127.0.0.1:5001 --users-csv candidates.csv   # drive an already running server
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import requests
+
+from mock_openai_server import start_mock_server
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRATCH_SKIP = {'interview_data.db', 'users.db', 'uploads', '__pycache__', '.git', 'logs'}
+SAMPLE_ANSWERS = [
+    "In my last role I led a team of four analysts to rebuild our monthly reporting, which cut preparation time by a third.",
+    "I chose this path because I enjoy working with clients and turning data into decisions that improve their outcomes.",
+    "When two deadlines collided I agreed new priorities with both stakeholders and delivered the urgent piece first.",
+    "My biggest lesson was to test assumptions early with users instead of waiting for the final review.",
+    "I keep up with the field through industry reports, a weekly reading group and short online courses.",
+]
+
+
+def make_docx_resume():
+    """Smallest DOCX docx2txt can read: one paragraph per resume line"""
+    lines = ["Jane Candidate", "Analyst, Example Corp, 2020-2024", "Led monthly reporting rebuild; cut preparation time by 30%",
+             "MBA, Example University", "Skills: financial modelling, SQL, stakeholder management"]
+    body = "".join(f"<w:p><w:r><w:t>{line}</w:t></w:r></w:p>" for line in lines)
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{body}</w:body></w:document>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as docx:
+        docx.writestr('[Content_Types].xml', '<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                      '<Default Extension="xml" ContentType="application/xml"/></Types>')
+        docx.writestr('word/document.xml', document)
+    return buffer.getvalue()
+
+
+def make_frame_jpeg(seed, width=320, height=240):
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 110, dtype=np.uint8)
+    frame += rng.integers(0, 20, size=frame.shape, dtype=np.uint8)
+    _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+    return buffer.tobytes()
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.samples[endpoint].append(seconds)
+            if not ok: self.errors[endpoint] += 1
+
+    def timed(self, endpoint, http_call, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = http_call(*args, **kwargs)
+        except requests.RequestException:
+            self.record(endpoint, time.perf_counter() - started, False)
+            return None
+        self.record(endpoint, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values: return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class RssSampler:
+    """Peak VmRSS per gunicorn worker, read from /proc (Linux only)"""
+
+    def __init__(self, master_pid, interval=0.5):
+        self.master_pid, self.interval = master_pid, interval
+        self.peak_kb, self.stop_event = {}, threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def worker_pids(self):
+        pids = []
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit(): continue
+            try:
+                with open(f'/proc/{entry}/stat') as stat_file:
+                    ppid = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            if ppid == self.master_pid: pids.append(int(entry))
+        return pids
+
+    @staticmethod
+    def rss_kb(pid):
+        try:
+            with open(f'/proc/{pid}/status') as status_file:
+                for line in status_file:
+                    if line.startswith('VmRSS:'): return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            for pid in [self.master_pid] + self.worker_pids():
+                self.peak_kb[pid] = max(self.peak_kb.get(pid, 0), self.rss_kb(pid))
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        if os.path.isdir('/proc'): self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive(): self.thread.join()
+        return self.peak_kb
+
+
+def prepare_scratch_dir():
+    """Scratch cwd for gunicorn: code and PDFs symlinked, fresh databases and uploads"""
+    scratch_dir = tempfile.mkdtemp(prefix='ai-interviewer-load-')
+    for entry in os.listdir(REPO_DIR):
+        if entry in SCRATCH_SKIP: continue
+        os.symlink(os.path.join(REPO_DIR, entry), os.path.join(scratch_dir, entry))
+    shutil.copy(os.path.join(REPO_DIR, 'users.db'), scratch_dir)
+    os.makedirs(os.path.join(scratch_dir, 'uploads', 'snapshots'))
+    os.makedirs(os.path.join(scratch_dir, 'metrics'))
+    return scratch_dir
+
+
+def load_users_csv(csv_path):
+    """(username, password, allowed) rows of a manage_users.py import CSV"""
+    with open(csv_path, newline='', encoding='utf-8') as f_csv:
+        rows = [{key.strip().lower(): (value or '').strip() for key, value in record.items() if key} for record in csv.DictReader(f_csv)]
+    return [(row['username'], row['password'], row.get('allowed') or 'MBA') for row in rows if row.get('username') and row.get('password')]
+
+
+def resolve_users(args):
+    """Returns (users, needs_import): the (username, password, allowed) accounts sessions log in as, in turn"""
+    if args.users_csv:
+        users = load_users_csv(args.users_csv)
+        if not users: raise SystemExit(f"No username,password rows in {args.users_csv}")
+        return users, True
+    if args.user_pattern:
+        if args.base_url and not args.password: raise SystemExit("--user-pattern with --base-url needs --password")
+        password = args.password or uuid.uuid4().hex
+        return [(args.user_pattern.format(n=n), password, args.allowed) for n in range(args.sessions)], True
+    if args.user:
+        if ':' not in args.user: raise SystemExit("--user / LOADTEST_USER must be username:password")
+        username, password = args.user.split(':', 1)
+        return [(username, password, args.allowed)], False
+    if args.base_url:
+        raise SystemExit("--base-url needs accounts: pass --users-csv, --user-pattern with --password, or --user")
+    # Throwaway accounts, only ever written to the scratch users.db
+    password = uuid.uuid4().hex
+    return [(f"loadtest{n:04d}", password, args.allowed) for n in range(args.sessions)], True
+
+
+def import_scratch_users(scratch_dir, users):
+    """Loads the accounts into the scratch users.db with manage_users.py import"""
+    csv_path = os.path.join(scratch_dir, 'loadtest_users.csv')
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f_csv:
+        writer = csv.writer(f_csv)
+        writer.writerow(['username', 'password', 'allowed'])
+        writer.writerows(users)
+    try:
+        subprocess.run([sys.executable, 'manage_users.py', '--db', 'users.db', '--workers', '1', 'import', csv_path, '--update'],
+                       cwd=scratch_dir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    finally:
+        os.remove(csv_path)
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_gunicorn(scratch_dir, port, workers, threads, openai_base_url):
+    env = dict(os.environ, OPENAI_API_KEY='mock-key', OPENAI_BASE_URL=openai_base_url,
+               GUNICORN_THREADS=str(threads), PYTHONUNBUFFERED='1',
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(scratch_dir, 'metrics'))
+    subprocess.run([sys.executable, '-c', 'import main; main.init_db()'], cwd=scratch_dir, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    log_file = open(os.path.join(scratch_dir, 'gunicorn.log'), 'w')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads), '--access-logfile', '-', 'main:app'],
+        cwd=scratch_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT, start_new_session=True)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 90
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited early; see {log_file.name}")
+        try:
+            if requests.get(f'{base_url}/health', timeout=2).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not become healthy in time; see {log_file.name}")
+
+
+def run_session(session_index, base_url, recorder, args, resume_bytes):
+    http = requests.Session()
+    username, password, _ = args.users[session_index % len(args.users)]
+    login = recorder.timed('/login', http.post, f'{base_url}/login', data={'username': username, 'password': password}, timeout=30)
+    if login is None or login.status_code != 200: return False
+
+    upload = recorder.timed('/upload_resume', http.post, f'{base_url}/upload_resume',
+                            files={'resume': ('resume.docx', resume_bytes)}, timeout=60)
+    resume_id = upload.json().get('resume_id') if upload is not None and upload.status_code == 200 else None
+    start_data = {'interview_track': args.track, 'mode': 'text', 'use_camera': 'true'}
+    if resume_id: start_data['resume_id'] = resume_id
+    start = recorder.timed('/start_interview', http.post, f'{base_url}/start_interview', data=start_data,
+                           files={'resume': ('resume.docx', resume_bytes)}, timeout=120)
+    while start is not None and start.status_code == 202:
+        # Waiting room: poll like index.html does, then resubmit once admitted
+        status = start.json()
+        while status.get('waiting') and not status.get('admitted'):
+            time.sleep(status.get('poll_after_ms', 3000) / 1000)
+            status = http.get(f'{base_url}/waiting_room', timeout=30).json()
+        if status.get('waiting'): time.sleep(status.get('poll_after_ms', 3000) / 1000)
+        start = recorder.timed('/start_interview', http.post, f'{base_url}/start_interview', data=start_data,
+                               files={'resume': ('resume.docx', resume_bytes)}, timeout=120)
+    if start is None or start.status_code != 200: return False
+    question = start.json().get('current_question', '')
+
+    evaluations = []
+    for answer_index in range(args.answers):
+        for frame_index in range(args.frames_per_answer):
+            recorder.timed('/analyze_visuals', http.post, f'{base_url}/analyze_visuals',
+                           files={'image': ('frame.jpg', make_frame_jpeg(session_index * 1000 + answer_index * 10 + frame_index))}, timeout=30)
+        answer_text = SAMPLE_ANSWERS[(session_index + answer_index) % len(SAMPLE_ANSWERS)]
+        submit = recorder.timed('/submit_answer', http.post, f'{base_url}/submit_answer', json={'answer': answer_text},
+                                headers={'Idempotency-Key': uuid.uuid4().hex}, timeout=120)
+        if submit is None or submit.status_code != 200: return False
+        result = submit.json()
+        evaluations.append({'question': question, 'answer': answer_text, 'evaluation': '', 'score': 0})
+        if args.tts and result.get('reply'):
+            recorder.timed('/generate_speech', http.post, f'{base_url}/generate_speech', json={'text': result['reply']}, timeout=60)
+        if result.get('finished'):
+            evaluations = result.get('evaluations') or evaluations
+            break
+        question = result.get('current_question', '')
+
+    saved = recorder.timed('/submit_evaluations', http.post, f'{base_url}/submit_evaluations', json={'evaluations': evaluations}, timeout=30)
+    return saved is not None and saved.status_code == 200
+
+
+def summarize(recorder, elapsed, sessions_ok, sessions_total, rss_peaks):
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        endpoints[endpoint] = {
+            'count': len(ordered), 'errors': recorder.errors.get(endpoint, 0), 'rps': len(ordered) / elapsed,
+            'p50_ms': percentile(ordered, 50) * 1000, 'p95_ms': percentile(ordered, 95) * 1000, 'p99_ms': percentile(ordered, 99) * 1000,
+        }
+    total_requests = sum(e['count'] for e in endpoints.values())
+    return {
+        'elapsed_s': elapsed, 'sessions_ok': sessions_ok, 'sessions_total': sessions_total,
+        'requests': total_requests, 'requests_per_s': total_requests / elapsed if elapsed else 0.0,
+        'endpoints': endpoints, 'peak_rss_mb': {str(pid): kb / 1024.0 for pid, kb in sorted(rss_peaks.items())},
+    }
+
+
+def print_report(report):
+    print(f"\n{report['sessions_ok']}/{report['sessions_total']} sessions completed in {report['elapsed_s']:.1f}s, "
+          f"{report['requests']} requests, {report['requests_per_s']:.1f} req/s")
+    print(f"{'endpoint':<22} {'count':>6} {'err':>4} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, stats in report['endpoints'].items():
+        print(f"{endpoint:<22} {stats['count']:>6} {stats['errors']:>4} {stats['rps']:>7.2f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+    if report['peak_rss_mb']:
+        print("peak RSS (first pid is the gunicorn master): " + ", ".join(f"{pid}={mb:.0f}MB" for pid, mb in report['peak_rss_mb'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scripted candidate sessions against gunicorn with a mock OpenAI API.")
+    parser.add_argument('--sessions', type=int, default=10, help="Total candidate sessions to run")
+    parser.add_argument('--concurrency', type=int, default=4, help="Sessions running at the same time")
+    parser.add_argument('--answers', type=int, default=4, help="Answers submitted per session")
+    parser.add_argument('--frames-per-answer', type=int, default=3, help="Frames sent to /analyze_visuals before each answer")
+    parser.add_argument('--track', default='resume', help="interview_track sent to /start_interview")
+    parser.add_argument('--user', default=os.getenv('LOADTEST_USER'), help="username:password shared by every session (default $LOADTEST_USER)")
+    parser.add_argument('--user-pattern', default=None, help="One account per session, e.g. 'loadtest{n:04d}'; all use --password")
+    parser.add_argument('--password', default=os.getenv('LOADTEST_PASSWORD'), help="Password for --user-pattern accounts (default $LOADTEST_PASSWORD, random when loadtest.py creates them)")
+    parser.add_argument('--users-csv', default=None, help="username,password,allowed CSV (manage_users.py import format); sessions take rows in turn")
+    parser.add_argument('--allowed', default='MBA', help="Role of accounts created from --user-pattern or by default")
+    parser.add_argument('--tts', action='store_true', help="Also request /generate_speech for each reply")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument('--chat-latency', type=float, default=0.3, help="Mock chat latency in seconds")
+    parser.add_argument('--vision-latency', type=float, default=1.0, help="Mock vision latency in seconds")
+    parser.add_argument('--tts-latency', type=float, default=0.5, help="Mock TTS latency in seconds")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Mock seconds per generated token")
+    parser.add_argument('--base-url', default=None, help="Drive an already running server instead of starting gunicorn")
+    parser.add_argument('--json', default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+    args.users, needs_import = resolve_users(args)
+    if len({username for username, _, _ in args.users}) < min(args.sessions, args.concurrency):
+        print(f"warning: {len(args.users)} account(s) for {args.concurrency} concurrent sessions; per-user state will be shared", file=sys.stderr)
+
+    mock_server, openai_base_url = start_mock_server(0, args.chat_latency, args.vision_latency, args.tts_latency, args.token_delay)
+    gunicorn_process, scratch_dir, rss_sampler = None, None, None
+    base_url = args.base_url
+    try:
+        if not base_url:
+            scratch_dir = prepare_scratch_dir()
+            if needs_import: import_scratch_users(scratch_dir, args.users)
+            gunicorn_process, base_url = start_gunicorn(scratch_dir, free_port(), args.workers, args.threads, openai_base_url)
+            rss_sampler = RssSampler(gunicorn_process.pid).start()
+            print(f"gunicorn pid {gunicorn_process.pid} on {base_url} (scratch dir {scratch_dir}), mock OpenAI on {openai_base_url}")
+
+        recorder = LatencyRecorder()
+        resume_bytes = make_docx_resume()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+            outcomes = list(executor.map(lambda i: run_session(i, base_url, recorder, args, resume_bytes), range(args.sessions)))
+        elapsed = time.perf_counter() - started
+        report = summarize(recorder, elapsed, sum(outcomes), args.sessions, rss_sampler.stop() if rss_sampler else {})
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+        return 0 if report['sessions_ok'] == args.sessions else 1
+    finally:
+        if gunicorn_process and gunicorn_process.poll() is None:
+            os.killpg(gunicorn_process.pid, signal.SIGTERM)
+            try:
+                gunicorn_process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(gunicorn_process.pid, signal.SIGKILL)
+        if scratch_dir and gunicorn_process and gunicorn_process.returncode in (0, -signal.SIGTERM):
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        mock_server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
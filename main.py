@@ -2,33 +2,538 @@ import os
 import json
 import time
 import sqlite3
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, g
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+from werkzeug.security import check_password_hash, generate_password_hash
 from flask_cors import CORS
-from openai import OpenAI
+from openai import APIConnectionError, InternalServerError, OpenAI, RateLimitError
 import pdfplumber
 import docx2txt
 from dotenv import load_dotenv
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import logging
+import logging.handlers
+import queue
 import re
 import threading
 import cv2
 import numpy as np
 from datetime import datetime
 import base64
+import hashlib
+import hmac
+import ipaddress
 import random
+import uuid
+import atexit
+import contextvars
+import functools
+import heapq
+import itertools
+import math
+import mmap
+import signal
+import struct
+import sys
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+except ImportError:
+    Histogram = None
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+except ImportError:
+    otel_trace = None
 
-# Setup logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 load_dotenv()
 
+# Setup logging. Records are enqueued by the calling thread and written by one listener thread per worker,
+# so request threads never block on stdout/file I/O. LOG_FORMAT=json emits one JSON object per line.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_FILE = os.getenv('LOG_FILE')
+LIBRARY_LOG_LEVEL = os.getenv('LIBRARY_LOG_LEVEL', 'WARNING').upper()
+NOISY_LIBRARY_LOGGERS = ('httpx', 'httpcore', 'openai', 'urllib3', 'pdfminer', 'PIL')
+FRAME_LOG_SAMPLE_EVERY = max(1, int(os.getenv('FRAME_LOG_SAMPLE_EVERY', '100')))
+LOG_TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Request-scoped attributes (request id, user, interview) shared by log records and trace spans
+current_trace_attributes = contextvars.ContextVar('current_trace_attributes', default={})
+log_listener = None
+frame_log_counter = 0
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        if getattr(record, 'request_id', None): entry['request_id'] = record.request_id
+        if record.exc_info: entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class RequestIdLogFilter(logging.Filter):
+    """Stamps the record with the current request id while still on the request thread"""
+    def filter(self, record):
+        record.request_id = current_trace_attributes.get().get('request.id')
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues the record as-is so the listener thread does the formatting; mutable args are rendered up front"""
+    def prepare(self, record):
+        if record.args and not (isinstance(record.args, tuple) and all(isinstance(arg, (str, int, float, bool, type(None))) for arg in record.args)):
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+def stop_logging():
+    """Drains queued records and closes the outputs; registered with atexit so a worker's last lines are not lost"""
+    global log_listener
+    if log_listener is None: return
+    try: log_listener.stop()
+    except Exception: pass
+    for handler in log_listener.handlers:
+        if isinstance(handler, logging.FileHandler): handler.close()
+    log_listener = None
+
+def setup_logging():
+    """(Re)builds the queue pipeline; also runs in forked children, where the parent's listener thread does not exist"""
+    global log_listener
+    stop_logging()
+    formatter = JsonLogFormatter() if LOG_FORMAT == 'json' else logging.Formatter(LOG_TEXT_FORMAT)
+    output_handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        try:
+            os.makedirs(os.path.dirname(LOG_FILE) or '.', exist_ok=True)
+            output_handlers.append(logging.FileHandler(LOG_FILE))
+        except OSError as e_log_file:
+            print(f"Logging: cannot open LOG_FILE {LOG_FILE}: {e_log_file}")
+    for handler in output_handlers: handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdLogFilter())
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler): root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    for library_logger in NOISY_LIBRARY_LOGGERS:
+        logging.getLogger(library_logger).setLevel(getattr(logging, LIBRARY_LOG_LEVEL, logging.WARNING))
+    log_listener = logging.handlers.QueueListener(log_queue, *output_handlers, respect_handler_level=True)
+    log_listener.start()
+
+def should_log_frame():
+    """True for one in FRAME_LOG_SAMPLE_EVERY per-frame log calls (only counted when DEBUG is enabled)"""
+    global frame_log_counter
+    if not logging.getLogger().isEnabledFor(logging.DEBUG): return False
+    frame_log_counter += 1
+    return (frame_log_counter - 1) % FRAME_LOG_SAMPLE_EVERY == 0
+
+setup_logging()
+atexit.register(stop_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=setup_logging)
+
+# Prometheus metrics (optional). Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py)
+# makes every worker write its samples there and /metrics aggregates them across workers.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 12.0, 20.0, 30.0, 60.0)
+if Histogram:
+    METRICS = {
+        'llm_latency': Histogram('interviewer_llm_request_seconds', 'OpenAI request latency by task', ['task'], buckets=LLM_BUCKETS),
+        'frame_decode': Histogram('interviewer_frame_decode_seconds', 'Camera frame JPEG decode time', buckets=FAST_BUCKETS),
+        'face_detect': Histogram('interviewer_face_detect_seconds', 'detectMultiScale time per analyzed frame', buckets=FAST_BUCKETS),
+        'document_extract': Histogram('interviewer_document_extract_seconds', 'PDF/DOCX text extraction time', ['kind'], buckets=LLM_BUCKETS),
+        'sqlite_write': Histogram('interviewer_sqlite_write_seconds', 'SQLite write transaction time', ['table'], buckets=FAST_BUCKETS),
+        'fallback': Counter('interviewer_llm_fallback_total', 'LLM requests answered by a local fallback path', ['task', 'reason']),
+        'cache_lookup': Counter('interviewer_cache_lookups_total', 'Cache lookups by cache and result', ['cache', 'result']),
+        'openai_error': Counter('interviewer_openai_errors_total', 'OpenAI API calls that raised', ['task']),
+        'llm_queue_wait': Histogram('interviewer_llm_queue_wait_seconds', 'Time an LLM call waited for a worker slot by priority class', ['priority'], buckets=LLM_BUCKETS),
+        'openai_rate_limit_wait': Histogram('interviewer_openai_rate_limit_wait_seconds', 'Time an OpenAI call waited for shared rate-limit capacity', ['priority'], buckets=LLM_BUCKETS),
+        'openai_rate_limited': Counter('interviewer_openai_rate_limited_total', 'OpenAI calls answered with 429', ['task']),
+    }
+else:
+    METRICS = {}
+    logging.warning("prometheus_client not installed. /metrics will be unavailable.")
+
+def observe_metric(name, value, **labels):
+    metric = METRICS.get(name)
+    if metric is not None:
+        (metric.labels(**labels) if labels else metric).observe(value)
+
+def increment_metric(name, **labels):
+    metric = METRICS.get(name)
+    if metric is not None:
+        (metric.labels(**labels) if labels else metric).inc()
+
+def record_cache_lookup(cache_name, hit):
+    increment_metric('cache_lookup', cache=cache_name, result='hit' if hit else 'miss')
+
+@contextmanager
+def metric_timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_metric(name, time.perf_counter() - started, **labels)
+
+# Tracing (optional, OpenTelemetry SDK). TRACE_EXPORTER=console prints spans to stdout, TRACE_EXPORTER=file
+# appends one JSON span per line to TRACE_FILE; spans are exported off the request path by a batch processor.
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none').lower()
+TRACE_FILE = os.getenv('TRACE_FILE', 'logs/traces.jsonl')
+REQUEST_ID_HEADER = 'X-Request-ID'
+tracer = None
+if otel_trace and TRACE_EXPORTER in ('console', 'file'):
+    try:
+        if TRACE_EXPORTER == 'file':
+            os.makedirs(os.path.dirname(TRACE_FILE) or '.', exist_ok=True)
+            span_exporter = ConsoleSpanExporter(out=open(TRACE_FILE, 'a', buffering=1), formatter=lambda span: span.to_json(indent=None) + "\n")
+        else:
+            span_exporter = ConsoleSpanExporter()
+        trace_provider = TracerProvider(resource=Resource.create({'service.name': 'ai-interviewer'}))
+        trace_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        tracer = trace_provider.get_tracer('ai-interviewer')
+    except Exception as e_trace_setup:
+        logging.error(f"Tracing setup failed; continuing without spans: {e_trace_setup}")
+elif TRACE_EXPORTER not in ('none', ''):
+    logging.warning(f"TRACE_EXPORTER={TRACE_EXPORTER} requested but opentelemetry-sdk is not installed (or exporter unknown). Tracing disabled.")
+
+@contextmanager
+def trace_span(name, **attributes):
+    """Child span of the current request's span, tagged with request/session ids; a no-op when tracing is off"""
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name) as span:
+        for key, value in {**current_trace_attributes.get(), **attributes}.items():
+            if value is not None: span.set_attribute(key, value)
+        yield span
+
+def traced(span_name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def set_span_attributes(span, **attributes):
+    if span is None: return
+    for key, value in attributes.items():
+        if value is not None: span.set_attribute(key, value)
+
+def submit_with_context(executor, fn, *args):
+    """executor.submit that carries the caller's trace context (and request ids) into the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
 app = Flask(__name__, template_folder='.', static_folder='static')
-app.secret_key = os.urandom(24)
+
+# Sessions. The cookie carries only a signed session id; the payload lives in a store every worker (and, with
+# REDIS_URL, every node) can read. Signing keys come from SECRET_KEY (+ SECRET_KEY_FALLBACKS) or, when that is
+# unset, from a keyring file shared by the workers on this host and rotated with `flask rotate-session-key`.
+SESSION_KEYRING_FILE = os.getenv('SESSION_KEYRING_FILE', 'session_keyring.json')
+SESSION_KEYRING_KEEP = int(os.getenv('SESSION_KEYRING_KEEP', '3'))
+SESSION_KEYRING_REFRESH_S = 30
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.db')
+SESSION_TTL_S = int(os.getenv('SESSION_TTL_S', str(12 * 3600)))
+SESSION_KEY_PREFIX = 'session:'
+REDIS_URL = os.getenv('REDIS_URL')
+PLACEHOLDER_SECRET_KEYS = {'', 'your-secret-key-here'}
+session_keyring_state = {'keys': [], 'mtime': None, 'checked_at': 0.0}
+session_keyring_lock = threading.Lock()
+
+@contextmanager
+def session_keyring_file_lock(keyring_path):
+    """Exclusive lock across processes (fcntl) while the keyring file is created or rotated"""
+    with open(f"{keyring_path}.lock", 'a') as f_lock:
+        if fcntl: fcntl.flock(f_lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl: fcntl.flock(f_lock, fcntl.LOCK_UN)
+
+def write_session_keyring(keyring_path, keys):
+    temp_path = f"{keyring_path}.{os.getpid()}.tmp"
+    with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f_keyring:
+        json.dump({'keys': keys, 'rotated_at': datetime.now().isoformat()}, f_keyring)
+    os.replace(temp_path, keyring_path)
+
+def read_session_keyring(keyring_path):
+    """Keys oldest-to-newest, creating the keyring with one random key if it does not exist yet"""
+    if not os.path.exists(keyring_path):
+        os.makedirs(os.path.dirname(keyring_path) or '.', exist_ok=True)
+        with session_keyring_file_lock(keyring_path):
+            if not os.path.exists(keyring_path):
+                write_session_keyring(keyring_path, [uuid.uuid4().hex + uuid.uuid4().hex])
+                logging.info(f"Session Keys: Created keyring {keyring_path}")
+    with open(keyring_path) as f_keyring:
+        return json.load(f_keyring)['keys']
+
+def rotate_session_keyring(keyring_path=None, keep=None):
+    """Adds a new signing key and drops the oldest beyond `keep`; cookies signed with a kept key stay valid"""
+    keyring_path = keyring_path or SESSION_KEYRING_FILE
+    read_session_keyring(keyring_path)
+    with session_keyring_file_lock(keyring_path):
+        with open(keyring_path) as f_keyring:
+            keys = json.load(f_keyring)['keys']
+        keys = (keys + [uuid.uuid4().hex + uuid.uuid4().hex])[-max(1, keep or SESSION_KEYRING_KEEP):]
+        write_session_keyring(keyring_path, keys)
+    return len(keys)
+
+def get_session_signing_keys():
+    """Verification keys oldest-to-newest (the last one signs); the keyring file is re-read when it changes"""
+    configured_key = os.getenv('SECRET_KEY', '')
+    if configured_key not in PLACEHOLDER_SECRET_KEYS:
+        fallbacks = [key.strip() for key in os.getenv('SECRET_KEY_FALLBACKS', '').split(',') if key.strip()]
+        return fallbacks + [configured_key]
+    with session_keyring_lock:
+        now = time.monotonic()
+        if session_keyring_state['keys'] and now - session_keyring_state['checked_at'] < SESSION_KEYRING_REFRESH_S:
+            return session_keyring_state['keys']
+        session_keyring_state['checked_at'] = now
+        try:
+            mtime = os.path.getmtime(SESSION_KEYRING_FILE) if os.path.exists(SESSION_KEYRING_FILE) else None
+            if mtime is None or mtime != session_keyring_state['mtime']:
+                session_keyring_state['keys'] = read_session_keyring(SESSION_KEYRING_FILE)
+                session_keyring_state['mtime'] = os.path.getmtime(SESSION_KEYRING_FILE)
+        except (OSError, ValueError, KeyError) as e_keyring:
+            logging.error(f"Session Keys: Cannot read keyring {SESSION_KEYRING_FILE}: {e_keyring}")
+            if not session_keyring_state['keys']:
+                # Last resort keeps this worker usable; its sessions will not validate on other workers
+                session_keyring_state['keys'] = [uuid.uuid4().hex + uuid.uuid4().hex]
+        return session_keyring_state['keys']
+
+class SQLiteSessionStore:
+    """The subset of the redis-py client used for sessions (get/set/setex/expire/ttl/delete) over a SQLite table,
+    so every worker on a host shares sessions without a Redis server"""
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.writes = 0
+        conn = self.connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS kv_store (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)')
+        conn.commit()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self.connection().execute('SELECT value FROM kv_store WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                                        (key, time.time())).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key, value, ex=None, nx=False):
+        """Like redis SET: with nx=True only an absent (or expired) key is written, returning None otherwise"""
+        if isinstance(value, str): value = value.encode()
+        conn = self.connection()
+        with metric_timer('sqlite_write', table='kv_store'):
+            with conn:
+                if nx:
+                    conn.execute('DELETE FROM kv_store WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?', (key, time.time()))
+                    if not conn.execute('INSERT OR IGNORE INTO kv_store (key, value, expires_at) VALUES (?, ?, ?)',
+                                        (key, value, time.time() + ex if ex else None)).rowcount:
+                        return None
+                    return True
+                conn.execute('INSERT OR REPLACE INTO kv_store (key, value, expires_at) VALUES (?, ?, ?)',
+                             (key, value, time.time() + ex if ex else None))
+                self.writes += 1
+                if self.writes % 500 == 0:
+                    conn.execute('DELETE FROM kv_store WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        return True
+
+    def setex(self, key, time_s, value):
+        return self.set(key, value, ex=time_s)
+
+    def expire(self, key, time_s):
+        conn = self.connection()
+        with conn:
+            return conn.execute('UPDATE kv_store SET expires_at = ? WHERE key = ?', (time.time() + time_s, key)).rowcount > 0
+
+    def ttl(self, key):
+        row = self.connection().execute('SELECT expires_at FROM kv_store WHERE key = ?', (key,)).fetchone()
+        if not row: return -2
+        return -1 if row[0] is None else max(0, int(row[0] - time.time()))
+
+    def delete(self, *keys):
+        conn = self.connection()
+        with conn:
+            return sum(conn.execute('DELETE FROM kv_store WHERE key = ?', (key,)).rowcount for key in keys)
+
+def create_session_store():
+    if REDIS_URL and redis:
+        return redis.Redis.from_url(REDIS_URL)
+    if REDIS_URL:
+        logging.warning("REDIS_URL is set but the redis package is not installed. Using the SQLite session store.")
+    return SQLiteSessionStore(SESSION_DB_PATH)
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session_dict):
+            session_dict.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class StoreSessionInterface(SessionInterface):
+    """Signed session-id cookie + payload in a shared store; keys rotate without logging anyone out"""
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store_factory):
+        self.store_factory = store_factory
+        self._store = None
+
+    @property
+    def store(self):
+        if self._store is None: self._store = self.store_factory()
+        return self._store
+
+    def signer(self):
+        return Signer(get_session_signing_keys(), salt='interview-session')
+
+    def open_session(self, app, request):
+        cookie_value = request.cookies.get(self.get_cookie_name(app))
+        if cookie_value:
+            try:
+                sid = self.signer().unsign(cookie_value).decode()
+                stored = self.store.get(SESSION_KEY_PREFIX + sid)
+                if stored is not None:
+                    return ServerSideSession(self.serializer.loads(stored.decode() if isinstance(stored, bytes) else stored), sid=sid)
+            except BadSignature:
+                logging.info("Session: Cookie signature not valid for any current key; starting a new session.")
+            except Exception as e_session_open:
+                logging.error(f"Session: Could not load session from store: {e_session_open}")
+        return ServerSideSession(sid=uuid.uuid4().hex, new=True)
+
+    def regenerate(self, session_obj):
+        """Moves the session to a new sid (at login), so a sid planted before authentication is worthless"""
+        if not session_obj.new:
+            try: self.store.delete(SESSION_KEY_PREFIX + session_obj.sid)
+            except Exception as e_session_regenerate: logging.error(f"Session: Could not delete old session: {e_session_regenerate}")
+        session_obj.sid = uuid.uuid4().hex
+        session_obj.new = True
+        session_obj.modified = True
+
+    def save_session(self, app, session_obj, response):
+        cookie_name, domain, path = self.get_cookie_name(app), self.get_cookie_domain(app), self.get_cookie_path(app)
+        if not session_obj:
+            if session_obj.modified:
+                try: self.store.delete(SESSION_KEY_PREFIX + session_obj.sid)
+                except Exception as e_session_delete: logging.error(f"Session: Could not delete session: {e_session_delete}")
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+        if not self.should_set_cookie(app, session_obj): return
+        try:
+            self.store.setex(SESSION_KEY_PREFIX + session_obj.sid, SESSION_TTL_S, self.serializer.dumps(dict(session_obj)))
+        except Exception as e_session_save:
+            logging.error(f"Session: Could not save session: {e_session_save}", exc_info=True)
+            return
+        response.set_cookie(
+            cookie_name, self.signer().sign(session_obj.sid).decode(), expires=self.get_expiration_time(app, session_obj),
+            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+        )
+
+# StoreSessionInterface signs with the keyring on first use, so importing main (tests, tools) never writes one
+if os.getenv('SECRET_KEY', '') not in PLACEHOLDER_SECRET_KEYS: app.secret_key = os.getenv('SECRET_KEY')
+app.session_interface = StoreSessionInterface(create_session_store)
+
+@app.cli.command('rotate-session-key')
+def rotate_session_key_command():
+    """Adds a new session signing key to SESSION_KEYRING_FILE; workers pick it up within 30 seconds"""
+    kept = rotate_session_keyring()
+    print(f"Rotated session signing key in {SESSION_KEYRING_FILE} ({kept} keys kept)")
 
 # Enable CORS for production deployment
 CORS(app, origins=['*'], supports_credentials=True)
 
+# WebSocket frame channel (optional; clients fall back to POST /analyze_visuals)
+sock = Sock(app) if Sock else None
+if not sock:
+    logging.warning("flask-sock not installed. WebSocket frame channel disabled; clients will use /analyze_visuals.")
+
 # Security headers for camera access
+@app.before_request
+def start_request_trace():
+    # nginx sets X-Request-ID ($request_id); direct requests get one generated here
+    g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+    current_trace_attributes.set({
+        'request.id': g.request_id,
+        'session.user': session.get('username'),
+        'interview.id': (interview_context or {}).get('interview_id'),
+        'interview.question_index': (interview_context or {}).get('current_q_idx'),
+    })
+    g.request_span_cm = None
+    if tracer is not None:
+        g.request_span_cm = trace_span(f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                                       **{'http.method': request.method, 'http.target': request.path})
+        g.request_span = g.request_span_cm.__enter__()
+
+@app.after_request
+def add_request_id_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    g.response_status = response.status_code
+    request_span = g.get('request_span')
+    if request_span is not None:
+        request_span.set_attribute('http.status_code', response.status_code)
+        response.headers['X-Trace-ID'] = format(request_span.get_span_context().trace_id, '032x')
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    if g.get('request_started') is not None:
+        record_request_duration(request.url_rule.rule if request.url_rule else request.path, request.method,
+                                500 if exc else g.get('response_status'), time.perf_counter() - g.request_started, g.get('request_id'))
+    request_span_cm = g.get('request_span_cm')
+    if request_span_cm is not None:
+        g.request_span_cm = None
+        request_span_cm.__exit__(type(exc) if exc else None, exc, exc.__traceback__ if exc else None)
+
 @app.after_request
 def add_security_headers(response):
     # Content Security Policy for camera access
@@ -81,10 +586,30 @@ qna_evaluations = []
 current_use_voice_mode = False
 listening_active = False
 interview_context = {}
-visual_analysis_thread = None
 visual_analyses = []
 visual_analyses_lock = threading.Lock()
 
+# Shared frame analysis pool. Frames are pushed by the browser (WebSocket or HTTP),
+# so there is no per-interview capture thread; the suggested client send interval
+# grows with the number of frames waiting in the pool.
+FRAME_ANALYSIS_WORKERS = int(os.environ.get('FRAME_ANALYSIS_WORKERS', 2))
+FRAME_INTERVAL_BASE_MS = int(os.environ.get('FRAME_INTERVAL_BASE_MS', 5000))
+FRAME_INTERVAL_MIN_MS = int(os.environ.get('FRAME_INTERVAL_MIN_MS', 1500))
+FRAME_INTERVAL_IDLE_MS = int(os.environ.get('FRAME_INTERVAL_IDLE_MS', 10000))
+FRAME_INTERVAL_MAX_MS = int(os.environ.get('FRAME_INTERVAL_MAX_MS', 20000))
+FRAME_SNAPSHOT_INTERVAL_S = 30
+# flask-sock holds one gthread thread for the whole life of a /ws/frames connection, so only part of a worker's
+# threads may serve streams; extra connections are closed and the browser posts frames to /analyze_visuals instead
+FRAME_STREAMS_PER_WORKER = int(os.environ.get('FRAME_STREAMS_PER_WORKER', int(os.environ.get('GUNICORN_THREADS', 8)) // 2))
+frame_stream_slots = threading.BoundedSemaphore(max(1, FRAME_STREAMS_PER_WORKER))
+frame_analysis_executor = ThreadPoolExecutor(max_workers=FRAME_ANALYSIS_WORKERS, thread_name_prefix='frame-analysis')
+frame_analysis_pending = 0
+frame_analysis_pending_lock = threading.Lock()
+
+# Deferred work (icebreaker vision calls, etc.) that must not hold up a request
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 4))
+background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background')
+
 interview_context_template = {
     'questions_list': [], 'current_q_idx': 0, 'previous_answers_list': [], 'scores_list': [],
     'question_depth_counter': 0, 'max_followup_depth': 2, 'current_interview_track': None,
@@ -92,7 +617,9 @@ interview_context_template = {
     'use_camera_feature': False,
     'generated_resume_questions_cache': [],
     'icebreaker_was_prepended': False,
-    'prepended_icebreaker_text': None
+    'prepended_icebreaker_text': None,
+    'resume_summary': '',
+    'interview_id': None
 }
 
 structure = {
@@ -110,6 +637,89 @@ def strip_numbering(text_input):
     if not text_input: return ""
     return re.sub(r'^\d+\.\s*', '', str(text_input)).strip()
 
+QUESTION_STOP_WORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'of', 'to', 'in', 'on', 'for', 'with', 'at', 'by', 'from', 'as', 'is', 'are', 'was',
+    'were', 'be', 'been', 'it', 'this', 'that', 'these', 'those', 'i', 'you', 'your', 'my', 'we', 'our', 'they', 'their',
+    'what', 'how', 'why', 'when', 'which', 'who', 'did', 'do', 'does', 'can', 'could', 'would', 'should', 'have', 'has', 'had'
+}
+# Interview phrasing that carries no topic ("tell me about", "walk me through", "describe")
+QUESTION_FILLER_WORDS = {'tell', 'describe', 'explain', 'share', 'walk', 'talk', 'give', 'through', 'about', 'please', 'some', 'any', 'example', 'time'}
+QUESTION_TERM_ALIASES = {'led': 'lead', 'leader': 'lead', 'leadership': 'lead', 'chose': 'choose', 'choice': 'choose', 'motivates': 'motivation'}
+QUESTION_MINHASH_PERMS = 64
+QUESTION_DUP_THRESHOLD = float(os.getenv('QUESTION_DUP_THRESHOLD', '0.6'))
+QUESTION_SIGNATURE_CACHE_SIZE = 4096
+_minhash_prime = (1 << 61) - 1
+_minhash_rng = np.random.default_rng(20240601)
+QUESTION_MINHASH_A = _minhash_rng.integers(1, 1 << 31, size=QUESTION_MINHASH_PERMS, dtype=np.uint64)
+QUESTION_MINHASH_B = _minhash_rng.integers(0, 1 << 31, size=QUESTION_MINHASH_PERMS, dtype=np.uint64)
+question_signature_cache = OrderedDict()
+question_signature_lock = threading.Lock()
+
+def content_words(text_input):
+    return {w for w in re.findall(r"[a-z0-9']+", normalize_text(text_input)) if w not in QUESTION_STOP_WORDS and len(w) > 2}
+
+def question_terms(text_input):
+    """Topic words of a question with filler removed and a light suffix trim, so paraphrases share terms"""
+    terms = set()
+    for word in content_words(text_input) - QUESTION_FILLER_WORDS:
+        word = QUESTION_TERM_ALIASES.get(word, word)
+        for suffix in ('ing', 'ed', 'es', 's'):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        terms.add(word)
+    return terms
+
+def question_signature(text_input):
+    """MinHash signature of a question's terms (cached by normalized text); None if it has no topic words"""
+    norm_text = normalize_text(text_input)
+    with question_signature_lock:
+        if norm_text in question_signature_cache:
+            question_signature_cache.move_to_end(norm_text)
+            return question_signature_cache[norm_text]
+    terms = question_terms(norm_text)
+    signature = None
+    if terms:
+        term_hashes = np.array([int.from_bytes(hashlib.blake2b(t.encode(), digest_size=4).digest(), 'little') for t in terms], dtype=np.uint64)
+        signature = ((np.outer(term_hashes, QUESTION_MINHASH_A) + QUESTION_MINHASH_B) % _minhash_prime).min(axis=0)
+    with question_signature_lock:
+        question_signature_cache[norm_text] = signature
+        while len(question_signature_cache) > QUESTION_SIGNATURE_CACHE_SIZE:
+            question_signature_cache.popitem(last=False)
+    return signature
+
+def question_similarities(text_input, normalized_questions):
+    """Estimated Jaccard similarity of text_input against each question; returns (questions, scores)"""
+    questions = list(normalized_questions)
+    signature = question_signature(text_input)
+    if signature is None or not questions:
+        return questions, np.zeros(len(questions))
+    scores = np.zeros(len(questions))
+    for i, q in enumerate(questions):
+        other = question_signature(q)
+        if other is not None:
+            scores[i] = np.count_nonzero(signature == other) / QUESTION_MINHASH_PERMS
+    return questions, scores
+
+def find_near_duplicate(text_input, normalized_questions, threshold=None):
+    """The asked question that text_input duplicates (exactly or as a paraphrase), or None"""
+    norm_text = normalize_text(text_input)
+    if norm_text in normalized_questions: return norm_text
+    questions, scores = question_similarities(norm_text, normalized_questions)
+    if not questions: return None
+    best = int(np.argmax(scores))
+    return questions[best] if scores[best] >= (QUESTION_DUP_THRESHOLD if threshold is None else threshold) else None
+
+def is_question_asked(text_input, *normalized_question_sets):
+    return any(find_near_duplicate(text_input, asked) is not None for asked in normalized_question_sets if asked)
+
+def nearest_asked_questions(query_text, normalized_questions, k=3):
+    """The k asked questions closest to query_text, used to steer generation away from them"""
+    questions, scores = question_similarities(query_text, normalized_questions)
+    if not questions: return []
+    order = sorted(range(len(questions)), key=lambda i: (-scores[i], questions[i]))
+    return [questions[i] for i in order[:k]]
+
 def load_questions_into_memory(pdf_path, section_type):
     if not os.path.exists(pdf_path):
         logging.error(f"PDF question file '{pdf_path}' not found.")
@@ -240,7 +850,9 @@ def load_questions_into_memory(pdf_path, section_type):
         logging.error(f"Error processing extracted text from {pdf_path} for {section_type}: {e_process}", exc_info=True)
         return False
 
-if not load_questions_into_memory(mba_pdf_path, 'mba'):
+with metric_timer('document_extract', kind='question_pdf'):
+    mba_questions_loaded = load_questions_into_memory(mba_pdf_path, 'mba')
+if not mba_questions_loaded:
     logging.warning(f"Could not load MBA questions from '{mba_pdf_path}'. Using comprehensive fallback.")
     # Comprehensive MBA fallback questions
     structure['mba']['resume_flow'] = [
@@ -271,7 +883,9 @@ if not load_questions_into_memory(mba_pdf_path, 'mba'):
         {'text': "What financial analysis skills do you possess?", 'type': 'standard'}
     ]
 
-if not load_questions_into_memory(bank_pdf_path, 'bank'):
+with metric_timer('document_extract', kind='question_pdf'):
+    bank_questions_loaded = load_questions_into_memory(bank_pdf_path, 'bank')
+if not bank_questions_loaded:
     logging.warning(f"Could not load Bank questions from '{bank_pdf_path}'. Using comprehensive fallback.")
     # Comprehensive Bank fallback questions
     structure['bank']['resume_flow'] = [
@@ -302,19 +916,702 @@ if not load_questions_into_memory(bank_pdf_path, 'bank'):
         {'text': "Can you think of a situation where you had to use logical reasoning at work?", 'type': 'standard'}
     ]
 
-def get_openai_response_generic(prompt_messages, temperature=0.7, max_tokens=500, model_override=None):
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+LOCAL_ROUTE_RESPONSE = "Error: Task routed to local generation."
+
+token_encoding_state = {'encoding': None, 'unavailable': tiktoken is None}
+token_encoding_lock = threading.Lock()
+
+def get_token_encoding():
+    """tiktoken encoding for the default model, loaded once; None when tiktoken or its data is unavailable"""
+    if token_encoding_state['unavailable']: return token_encoding_state['encoding']
+    with token_encoding_lock:
+        if token_encoding_state['encoding'] is None and not token_encoding_state['unavailable']:
+            try:
+                try: token_encoding_state['encoding'] = tiktoken.encoding_for_model(DEFAULT_CHAT_MODEL)
+                except KeyError: token_encoding_state['encoding'] = tiktoken.get_encoding("o200k_base")
+            except Exception as e_tiktoken:
+                logging.warning(f"Tokenizer unavailable, using character-based token estimates: {e_tiktoken}")
+                token_encoding_state['unavailable'] = True
+    return token_encoding_state['encoding']
+
+def estimate_tokens(text):
+    """Token count with the model tokenizer when available, else ~4 characters per token"""
+    text = str(text or '')
+    encoding = get_token_encoding()
+    if encoding is not None: return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+def count_message_tokens(prompt_messages):
+    """Prompt size of a chat request (text parts only; images are billed separately)"""
+    total_tokens = 0
+    for message in prompt_messages:
+        content = message.get('content', '')
+        if isinstance(content, list):
+            content = ' '.join(part.get('text', '') for part in content if isinstance(part, dict) and part.get('type') == 'text')
+        total_tokens += estimate_tokens(content) + 4  # per-message overhead
+    return total_tokens
+
+def truncate_to_tokens(text, max_tokens):
+    """Cuts text to max_tokens at the last line or sentence boundary that fits"""
+    text = str(text or '')
+    if estimate_tokens(text) <= max_tokens: return text
+    parts = re.split(r'(?<=[.\n])', text)
+    # Binary search for the longest prefix of whole parts that fits
+    low, high = 0, len(parts)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(''.join(parts[:middle])) <= max_tokens: low = middle
+        else: high = middle - 1
+    if low == 0:
+        # Not even the first line or sentence fits (e.g. text without punctuation): cut at the token level instead
+        encoding = get_token_encoding()
+        if encoding is not None: return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]).strip()
+        return text[:max(0, max_tokens) * 4].strip()
+    return ''.join(parts[:low]).strip()
+
+# Per-task routing policy. provider 'local' skips the API and lets the caller use its
+# templated fallback. deadline_s caps how long a request waits before the caller's local
+# fallback is used (the call keeps running and its result is cached); latency_budget_s is
+# the upstream request timeout; priority is the scheduler class (see LLMScheduler). Override any field with LLM_ROUTING, e.g. '{"ack": {"provider": "local"}}'.
+LLM_TASK_POLICIES = {
+    'ack': {'provider': 'openai', 'priority': 'interactive', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 45, 'latency_budget_s': 4, 'deadline_s': 3},
+    'scoring': {'provider': 'openai', 'priority': 'interactive', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 500, 'latency_budget_s': 15, 'deadline_s': 8},
+    'feedback': {'provider': 'openai', 'priority': 'interactive', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 160, 'latency_budget_s': 8, 'deadline_s': 5},
+    'followup': {'provider': 'openai', 'priority': 'interactive', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 240, 'latency_budget_s': 8, 'deadline_s': 5},
+    'resume_questions': {'provider': 'openai', 'priority': 'near_term', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 1000, 'latency_budget_s': 20, 'deadline_s': 10},
+    'icebreaker': {'provider': 'openai', 'priority': 'near_term', 'model': "gpt-4-vision-preview", 'max_tokens': 75, 'latency_budget_s': 10},
+    'resume_summary': {'provider': 'openai', 'priority': 'near_term', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 350, 'latency_budget_s': 15, 'deadline_s': 6},
+    'combined': {'provider': 'openai', 'priority': 'interactive', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 900, 'latency_budget_s': 20, 'deadline_s': 10},
+    'batch_eval': {'provider': 'openai', 'priority': 'batch', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 4000, 'latency_budget_s': 60},
+    'question_pool': {'provider': 'openai', 'priority': 'batch', 'model': DEFAULT_CHAT_MODEL, 'max_tokens': 800, 'latency_budget_s': 30},
+}
+try:
+    for task_name_override, policy_override in json.loads(os.getenv('LLM_ROUTING', '{}')).items():
+        LLM_TASK_POLICIES.setdefault(task_name_override, {}).update(policy_override)
+except (ValueError, AttributeError) as e_routing:
+    logging.error(f"Invalid LLM_ROUTING configuration, using defaults: {e_routing}")
+
+# USD per 1K tokens (input, output); used for cost estimates only
+MODEL_PRICING_PER_1K = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4-vision-preview": (0.01, 0.03),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+llm_task_stats = defaultdict(lambda: {'calls': 0, 'errors': 0, 'local': 0, 'deadline_misses': 0, 'late_results_cached': 0,
+                                      'latency_s_total': 0.0, 'latency_s_max': 0.0,
+                                      'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0})
+llm_task_stats_lock = threading.Lock()
+
+def record_llm_call(task, model, latency_s, usage=None, error=False, local=False):
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    price_in, price_out = MODEL_PRICING_PER_1K.get(model, (0.0, 0.0))
+    cost = prompt_tokens / 1000 * price_in + completion_tokens / 1000 * price_out
+    with llm_task_stats_lock:
+        stats = llm_task_stats[task or 'untagged']
+        stats['calls'] += 1
+        stats['errors'] += int(error)
+        stats['local'] += int(local)
+        stats['latency_s_total'] += latency_s
+        stats['latency_s_max'] = max(stats['latency_s_max'], latency_s)
+        stats['prompt_tokens'] += prompt_tokens
+        stats['completion_tokens'] += completion_tokens
+        stats['cost_usd'] += cost
+    if not local:
+        observe_metric('llm_latency', latency_s, task=task or 'untagged')
+        if error: increment_metric('openai_error', task=task or 'untagged')
+        logging.info(f"LLM task '{task or 'untagged'}' model={model} latency={latency_s:.2f}s tokens={prompt_tokens}/{completion_tokens} cost=${cost:.5f}")
+
+def get_llm_task_stats():
+    with llm_task_stats_lock:
+        snapshot = {}
+        for task, stats in llm_task_stats.items():
+            answered = stats['calls'] - stats['local']
+            snapshot[task] = dict(stats, latency_s_avg=round(stats['latency_s_total'] / answered, 3) if answered else 0.0)
+        return snapshot
+
+DEADLINE_EXCEEDED_RESPONSE = "Error: LLM deadline exceeded; using local fallback."
+LLM_HEDGE_WORKERS = int(os.getenv('LLM_HEDGE_WORKERS', 16))
+LATE_RESULT_CACHE_SIZE = 512
+LATE_RESULT_TTL_S = 900
+llm_hedge_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix='llm-hedge')
+late_llm_results = OrderedDict()
+late_llm_results_lock = threading.Lock()
+
+def run_with_deadline(primary_fn, fallback_fn, deadline_s, on_late_result=None, label='task'):
+    """Hedged execution: start primary_fn in the hedge pool and return its result if it finishes within
+    deadline_s, otherwise return fallback_fn(). A late primary result is handed to on_late_result."""
+    if not deadline_s:
+        return primary_fn()
+    future = submit_with_context(llm_hedge_executor, primary_fn)
+    try:
+        return future.result(timeout=deadline_s)
+    except FuturesTimeoutError:
+        logging.warning(f"Hedge: '{label}' exceeded its {deadline_s}s deadline; using fallback.")
+        if on_late_result:
+            def deliver_late_result(done_future):
+                if done_future.exception() is None: on_late_result(done_future.result())
+            future.add_done_callback(deliver_late_result)
+        return fallback_fn()
+
+def llm_request_key(task, model, prompt_messages, temperature, max_tokens, response_format):
+    payload = json.dumps([task, model, prompt_messages, temperature, max_tokens, response_format], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_late_llm_result(request_key):
+    with late_llm_results_lock:
+        entry = late_llm_results.get(request_key)
+        if not entry: return None
+        if time.time() - entry[0] > LATE_RESULT_TTL_S:
+            late_llm_results.pop(request_key, None)
+            return None
+        return entry[1]
+
+def store_late_llm_result(task, request_key, response_text):
+    if not response_text or response_text.startswith("Error"): return
+    with late_llm_results_lock:
+        late_llm_results[request_key] = (time.time(), response_text)
+        late_llm_results.move_to_end(request_key)
+        while len(late_llm_results) > LATE_RESULT_CACHE_SIZE:
+            late_llm_results.popitem(last=False)
+    with llm_task_stats_lock:
+        llm_task_stats[task or 'untagged']['late_results_cached'] += 1
+
+# Admission state shared by the workers on this host: interview slots, the waiting room and (optionally)
+# host-wide LLM leases. Connections are opened per call; writes use BEGIN IMMEDIATE so the checks are atomic.
+ADMISSION_DB_PATH = os.getenv('ADMISSION_DB_PATH', SESSION_DB_PATH)
+WORKER_MAX_INFLIGHT_LLM = int(os.getenv('WORKER_MAX_INFLIGHT_LLM', '16'))
+CLUSTER_MAX_INFLIGHT_LLM = int(os.getenv('CLUSTER_MAX_INFLIGHT_LLM', '0'))  # 0 = no host-wide cap
+LLM_SLOT_WAIT_S = float(os.getenv('LLM_SLOT_WAIT_S', '10'))
+LLM_LEASE_TTL_S = 120  # a lease left behind by a crashed worker frees itself after this
+LLM_CAPACITY_RESPONSE = "Error: LLM capacity exhausted; using local fallback."
+
+def open_admission_db():
+    conn = sqlite3.connect(ADMISSION_DB_PATH, timeout=10, isolation_level=None)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS admission_tickets (
+            username TEXT PRIMARY KEY,
+            state TEXT,
+            enqueued_at REAL,
+            admitted_at REAL,
+            last_seen REAL
+        )
+    ''')
+    conn.execute('CREATE TABLE IF NOT EXISTS admission_history (finished_at REAL, duration_s REAL)')
+    conn.execute('CREATE TABLE IF NOT EXISTS llm_leases (lease_id TEXT PRIMARY KEY, expires_at REAL)')
+    return conn
+
+def acquire_cluster_llm_lease(deadline):
+    """Lease id once fewer than CLUSTER_MAX_INFLIGHT_LLM calls are in flight host-wide; False on timeout, None if the DB fails"""
+    lease_id = uuid.uuid4().hex
+    try:
+        conn = open_admission_db()
+    except sqlite3.Error as e_lease_db:
+        logging.error(f"LLM Slots: Admission DB unavailable, not enforcing the host-wide cap: {e_lease_db}")
+        return None
+    try:
+        while True:
+            now = time.time()
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM llm_leases WHERE expires_at < ?', (now,))
+            if conn.execute('SELECT COUNT(*) FROM llm_leases').fetchone()[0] < CLUSTER_MAX_INFLIGHT_LLM:
+                conn.execute('INSERT INTO llm_leases (lease_id, expires_at) VALUES (?, ?)', (lease_id, now + LLM_LEASE_TTL_S))
+                conn.execute('COMMIT')
+                return lease_id
+            conn.execute('COMMIT')
+            if time.monotonic() >= deadline: return False
+            time.sleep(random.uniform(0.02, 0.1))
+    except sqlite3.Error as e_lease:
+        logging.error(f"LLM Slots: Lease acquisition failed, not enforcing the host-wide cap: {e_lease}")
+        return None
+    finally:
+        conn.close()
+
+def release_cluster_llm_lease(lease_id):
+    try:
+        conn = open_admission_db()
+        try: conn.execute('DELETE FROM llm_leases WHERE lease_id = ?', (lease_id,))
+        finally: conn.close()
+    except sqlite3.Error as e_lease_release:
+        logging.error(f"LLM Slots: Could not release lease {lease_id}: {e_lease_release}")
+
+# Priority classes for OpenAI calls within a worker. A candidate waiting on the next question (interactive) goes
+# ahead of work needed within minutes (near_term) and of deferred work (batch); per-class caps keep lower classes
+# from filling every slot, and a request that has waited LLM_STARVATION_AGE_S competes as interactive (FIFO).
+LLM_PRIORITY_RANKS = {'interactive': 0, 'near_term': 1, 'batch': 2}
+LLM_DEFAULT_PRIORITY = 'near_term'
+LLM_CLASS_LIMITS = {
+    'interactive': WORKER_MAX_INFLIGHT_LLM,
+    'near_term': int(os.getenv('LLM_NEAR_TERM_MAX_INFLIGHT', '8')),
+    'batch': int(os.getenv('LLM_BATCH_MAX_INFLIGHT', '4')),
+}
+LLM_CLASS_WAIT_S = {'interactive': LLM_SLOT_WAIT_S, 'near_term': max(LLM_SLOT_WAIT_S, 30.0), 'batch': max(LLM_SLOT_WAIT_S, 300.0)}
+LLM_STARVATION_AGE_S = float(os.getenv('LLM_STARVATION_AGE_S', '20'))
+llm_priority_override = contextvars.ContextVar('llm_priority_override', default=None)
+
+class LLMScheduler:
+    """Grants the worker's LLM slots by priority class with per-class caps and aging; tracks waits per class"""
+    def __init__(self, capacity, class_limits, starvation_age_s):
+        self.capacity = capacity
+        self.class_limits = class_limits
+        self.starvation_age_s = starvation_age_s
+        self.condition = threading.Condition()
+        self.inflight = defaultdict(int)
+        self.waiters = []  # [enqueued_at, seq, priority_class]
+        self.sequence = itertools.count()
+        self.stats = defaultdict(lambda: {'granted': 0, 'timed_out': 0, 'aged': 0, 'wait_s_total': 0.0, 'wait_s_max': 0.0})
+
+    def effective_rank(self, waiter, now):
+        enqueued_at, seq, priority_class = waiter
+        if now - enqueued_at >= self.starvation_age_s: return (0, seq)
+        return (LLM_PRIORITY_RANKS[priority_class], seq)
+
+    def next_waiter(self, now):
+        if sum(self.inflight.values()) >= self.capacity: return None
+        eligible = [waiter for waiter in self.waiters if self.inflight[waiter[2]] < self.class_limits.get(waiter[2], self.capacity)]
+        return min(eligible, key=lambda waiter: self.effective_rank(waiter, now)) if eligible else None
+
+    def acquire(self, priority_class, timeout_s):
+        """Blocks until this request is the best eligible waiter; returns (granted, wait_s)"""
+        waiter = [time.monotonic(), next(self.sequence), priority_class]
+        deadline = waiter[0] + timeout_s
+        with self.condition:
+            self.waiters.append(waiter)
+            try:
+                while self.next_waiter(time.monotonic()) is not waiter:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.record_wait(priority_class, time.monotonic() - waiter[0], granted=False)
+                        return False, time.monotonic() - waiter[0]
+                    # Periodic wake-ups let aging promote a waiter even when no slot is released
+                    self.condition.wait(min(remaining, 0.5))
+                self.inflight[priority_class] += 1
+                wait_s = time.monotonic() - waiter[0]
+                self.record_wait(priority_class, wait_s, granted=True, aged=wait_s >= self.starvation_age_s)
+                return True, wait_s
+            finally:
+                self.waiters.remove(waiter)
+                self.condition.notify_all()
+
+    def release(self, priority_class):
+        with self.condition:
+            self.inflight[priority_class] -= 1
+            self.condition.notify_all()
+
+    def record_wait(self, priority_class, wait_s, granted, aged=False):
+        stats = self.stats[priority_class]
+        stats['granted' if granted else 'timed_out'] += 1
+        if aged: stats['aged'] += 1
+        stats['wait_s_total'] += wait_s
+        stats['wait_s_max'] = max(stats['wait_s_max'], wait_s)
+        observe_metric('llm_queue_wait', wait_s, priority=priority_class)
+
+    def snapshot(self):
+        with self.condition:
+            waiting = defaultdict(int)
+            for waiter in self.waiters: waiting[waiter[2]] += 1
+            return {priority_class: {
+                'inflight': self.inflight[priority_class], 'waiting': waiting[priority_class],
+                'limit': self.class_limits.get(priority_class, self.capacity),
+                **{key: round(value, 3) if isinstance(value, float) else value for key, value in self.stats[priority_class].items()},
+            } for priority_class in LLM_PRIORITY_RANKS}
+
+llm_scheduler = LLMScheduler(WORKER_MAX_INFLIGHT_LLM, LLM_CLASS_LIMITS, LLM_STARVATION_AGE_S)
+
+@contextmanager
+def llm_priority(priority_class):
+    """Runs the enclosed LLM calls in priority_class regardless of their task's policy (e.g. offline re-scoring)"""
+    token = llm_priority_override.set(priority_class)
+    try:
+        yield
+    finally:
+        llm_priority_override.reset(token)
+
+def llm_task_priority(task):
+    priority_class = llm_priority_override.get() or LLM_TASK_POLICIES.get(task, {}).get('priority') or LLM_DEFAULT_PRIORITY
+    return priority_class if priority_class in LLM_PRIORITY_RANKS else LLM_DEFAULT_PRIORITY
+
+@contextmanager
+def llm_call_slot(priority_class, deadline=None):
+    """A scheduler slot in priority_class (and a host-wide lease when configured); yields False if none freed in time.
+    deadline (time.monotonic()) shortens the class's wait budget"""
+    deadline = min(time.monotonic() + LLM_CLASS_WAIT_S[priority_class], deadline or math.inf)
+    wait_s = max(0.0, deadline - time.monotonic())
+    granted, _ = llm_scheduler.acquire(priority_class, wait_s)
+    if not granted:
+        yield False
+        return
+    lease_id = None
+    try:
+        if CLUSTER_MAX_INFLIGHT_LLM > 0:
+            lease_id = acquire_cluster_llm_lease(deadline)
+            if lease_id is False:
+                yield False
+                return
+        yield True
+    finally:
+        if lease_id: release_cluster_llm_lease(lease_id)
+        llm_scheduler.release(priority_class)
+
+# OpenAI rate limiting shared by every worker. Each call takes one request plus its estimated tokens (prompt +
+# max_tokens, as OpenAI counts them) from a node bucket in shared memory and, when an org-wide limit is set, from a
+# cluster bucket (Redis with REDIS_URL, else a SQLite stand-in); the estimate is reconciled with the reported usage.
+# A 429 blocks the buckets for the Retry-After period so workers back off together instead of retrying in lockstep.
+OPENAI_RPM_LIMIT = int(os.getenv('OPENAI_RPM_LIMIT', '0'))  # org-wide limits, 0 = no cluster bucket
+OPENAI_TPM_LIMIT = int(os.getenv('OPENAI_TPM_LIMIT', '0'))
+OPENAI_NODE_RPM_LIMIT = int(os.getenv('OPENAI_NODE_RPM_LIMIT', '0'))  # this node's share, 0 = unlimited
+OPENAI_NODE_TPM_LIMIT = int(os.getenv('OPENAI_NODE_TPM_LIMIT', '0'))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+OPENAI_RATE_LIMIT_COOLDOWN_S = 2.0  # when a 429 carries no Retry-After
+RATE_LIMIT_SHM_DIR = os.getenv('RATE_LIMIT_SHM_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+RATE_LIMIT_KEY_PREFIX = 'ratelimit:openai:'
+LLM_RATE_LIMITED_RESPONSE = "Error: OpenAI rate limit reached; using local fallback."
+# Fallbacks already counted (with their own reason) where they were decided; the router must not count them again
+COUNTED_FALLBACK_RESPONSES = {DEADLINE_EXCEEDED_RESPONSE: 'deadline_fallback', LLM_CAPACITY_RESPONSE: 'capacity_fallback',
+                              LLM_RATE_LIMITED_RESPONSE: 'rate_limit_fallback'}
+rate_limit_state = {'buckets': None}
+rate_limit_lock = threading.Lock()
+
+def update_token_bucket(state, now, op, requests=0, tokens=0, rpm=0, tpm=0, seconds=0.0):
+    """One step of a bucket that refills to a minute's limit; returns (state, granted, retry_after_s).
+    state is (request_level, token_level, updated_at, blocked_until) or None for a full bucket. Mirrored in Lua below."""
+    request_level, token_level, updated_at, blocked_until = state or (rpm, tpm, now, 0.0)
+    elapsed = max(0.0, now - updated_at)
+    request_level = min(rpm, request_level + elapsed * rpm / 60)
+    token_level = min(tpm, token_level + elapsed * tpm / 60)
+    granted, retry_after = True, 0.0
+    if op == 'take':
+        needed_tokens = min(tokens, tpm)  # a request bigger than the bucket waits for a full bucket, then runs in debt
+        waits = [blocked_until - now] if now < blocked_until else []
+        if rpm > 0 and request_level < requests: waits.append((requests - request_level) * 60 / rpm)
+        if tpm > 0 and token_level < needed_tokens: waits.append((needed_tokens - token_level) * 60 / tpm)
+        if waits:
+            granted, retry_after = False, max(waits)
+        else:
+            request_level -= requests
+            token_level -= tokens
+    elif op == 'adjust':
+        request_level = min(rpm, request_level - requests)
+        token_level = min(tpm, token_level - tokens)
+    elif op == 'block':
+        blocked_until = max(blocked_until, now + seconds)
+    # An unlimited dimension (limit 0) is stored as full, so a limit configured later starts from a full bucket
+    # instead of the debt every call would otherwise have left behind
+    if rpm <= 0: request_level = math.inf
+    if tpm <= 0: token_level = math.inf
+    return (request_level, token_level, now, blocked_until), granted, retry_after
+
+TOKEN_BUCKET_LUA = '''
+if redis.replicate_commands then redis.replicate_commands() end
+local op = ARGV[1]
+local requests, tokens = tonumber(ARGV[2]), tonumber(ARGV[3])
+local rpm, tpm, seconds = tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'request_level', 'token_level', 'updated_at', 'blocked_until')
+local request_level, token_level = tonumber(state[1]) or rpm, tonumber(state[2]) or tpm
+local updated_at, blocked_until = tonumber(state[3]) or now, tonumber(state[4]) or 0
+local elapsed = math.max(0, now - updated_at)
+request_level = math.min(rpm, request_level + elapsed * rpm / 60)
+token_level = math.min(tpm, token_level + elapsed * tpm / 60)
+local granted, retry_after = 1, 0
+if op == 'take' then
+    local needed_tokens = math.min(tokens, tpm)
+    if now < blocked_until then retry_after = blocked_until - now; granted = 0 end
+    if rpm > 0 and request_level < requests then retry_after = math.max(retry_after, (requests - request_level) * 60 / rpm); granted = 0 end
+    if tpm > 0 and token_level < needed_tokens then retry_after = math.max(retry_after, (needed_tokens - token_level) * 60 / tpm); granted = 0 end
+    if granted == 1 then request_level = request_level - requests; token_level = token_level - tokens end
+elseif op == 'adjust' then
+    request_level = math.min(rpm, request_level - requests)
+    token_level = math.min(tpm, token_level - tokens)
+elseif op == 'block' then
+    blocked_until = math.max(blocked_until, now + seconds)
+end
+if rpm <= 0 then request_level = math.huge end
+if tpm <= 0 then token_level = math.huge end
+redis.call('HSET', KEYS[1], 'request_level', tostring(request_level), 'token_level', tostring(token_level),
+           'updated_at', tostring(now), 'blocked_until', tostring(blocked_until))
+redis.call('EXPIRE', KEYS[1], 3600)
+return {granted, tostring(retry_after)}
+'''
+
+class SharedMemoryBucketBackend:
+    """Node-local buckets in small mmap'd files (under /dev/shm when present), so every worker on the host draws
+    from the same budget; fcntl.flock orders processes and a thread lock the threads of one worker"""
+    STATE = struct.Struct('4d')
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.pid = None
+        self.maps = {}
+        self.lock = threading.Lock()
+
+    def bucket_map(self, key):
+        if self.pid != os.getpid():
+            # A forked worker opens its own descriptors; flock on an inherited one would not exclude the parent
+            self.pid, self.maps = os.getpid(), {}
+        if key not in self.maps:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"ai-interviewer-{key.replace(':', '-')}.bucket")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < self.STATE.size: os.ftruncate(fd, self.STATE.size)
+            self.maps[key] = (fd, mmap.mmap(fd, self.STATE.size))
+        return self.maps[key]
+
+    def apply(self, key, op, requests=0, tokens=0, rpm=0, tpm=0, seconds=0.0):
+        with self.lock:
+            fd, shared = self.bucket_map(key)
+            if fcntl: fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                state = self.STATE.unpack_from(shared)
+                state, granted, retry_after = update_token_bucket(state if state[2] else None, time.time(), op,
+                                                                  requests, tokens, rpm, tpm, seconds)
+                self.STATE.pack_into(shared, 0, *state)
+            finally:
+                if fcntl: fcntl.flock(fd, fcntl.LOCK_UN)
+        return granted, retry_after
+
+class SQLiteBucketBackend:
+    """Local stand-in for the distributed backend: the same buckets in a SQLite table, one transaction per step"""
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                    key TEXT PRIMARY KEY,
+                    request_level REAL,
+                    token_level REAL,
+                    updated_at REAL,
+                    blocked_until REAL
+                )
+            ''')
+            self.local.conn = conn
+        return conn
+
+    def apply(self, key, op, requests=0, tokens=0, rpm=0, tpm=0, seconds=0.0):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT request_level, token_level, updated_at, blocked_until FROM rate_limit_buckets WHERE key = ?',
+                               (key,)).fetchone()
+            state, granted, retry_after = update_token_bucket(row, time.time(), op, requests, tokens, rpm, tpm, seconds)
+            conn.execute('INSERT OR REPLACE INTO rate_limit_buckets (key, request_level, token_level, updated_at, blocked_until) '
+                         'VALUES (?, ?, ?, ?, ?)', (key, *state))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return granted, retry_after
+
+class RedisBucketBackend:
+    """Cluster-wide buckets in Redis; the Lua script makes each step atomic and uses the Redis clock"""
+    def __init__(self, redis_client):
+        self.script = redis_client.register_script(TOKEN_BUCKET_LUA)
+
+    def apply(self, key, op, requests=0, tokens=0, rpm=0, tpm=0, seconds=0.0):
+        granted, retry_after = self.script(keys=[key], args=[op, requests, tokens, rpm, tpm, seconds])
+        return int(granted) == 1, float(retry_after)
+
+def create_rate_limit_backend():
+    if REDIS_URL and redis:
+        return RedisBucketBackend(redis.Redis.from_url(REDIS_URL))
+    return SQLiteBucketBackend(ADMISSION_DB_PATH)
+
+def rate_limit_buckets():
+    """[(scope, backend, key, rpm, tpm)]; the node bucket always exists so 429 cool-downs are shared"""
+    with rate_limit_lock:
+        if rate_limit_state['buckets'] is None:
+            buckets = [('node', SharedMemoryBucketBackend(RATE_LIMIT_SHM_DIR), f"{RATE_LIMIT_KEY_PREFIX}node",
+                        OPENAI_NODE_RPM_LIMIT, OPENAI_NODE_TPM_LIMIT)]
+            if OPENAI_RPM_LIMIT or OPENAI_TPM_LIMIT:
+                buckets.append(('cluster', create_rate_limit_backend(), f"{RATE_LIMIT_KEY_PREFIX}cluster",
+                                OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT))
+            rate_limit_state['buckets'] = buckets
+        return rate_limit_state['buckets']
+
+def apply_rate_limit(bucket, op, requests=0, tokens=0, seconds=0.0):
+    scope, backend, key, rpm, tpm = bucket
+    try:
+        return backend.apply(key, op, requests, tokens, rpm, tpm, seconds)
+    except Exception as e_bucket:
+        logging.error(f"Rate Limit: {scope} bucket unavailable, not enforcing it: {e_bucket}")
+        return True, 0.0
+
+def reserve_openai_capacity(estimated_tokens, deadline):
+    """Takes one request and estimated_tokens from every bucket, waiting until all grant; the buckets taken, or
+    None when the wait would outlast the deadline"""
+    buckets = rate_limit_buckets()
+    while True:
+        taken, retry_after = [], 0.0
+        for bucket in buckets:
+            granted, retry_after = apply_rate_limit(bucket, 'take', 1, estimated_tokens)
+            if not granted: break
+            taken.append(bucket)
+        if len(taken) == len(buckets): return taken
+        for bucket in taken:
+            apply_rate_limit(bucket, 'adjust', -1, -estimated_tokens)
+        if time.monotonic() + retry_after > deadline: return None
+        # Jitter spreads the workers that were told the same retry time
+        time.sleep(retry_after * random.uniform(1.0, 1.2) + random.uniform(0, 0.05))
+
+def reconcile_openai_usage(reservation, estimated_tokens, actual_tokens):
+    """Charges (or refunds) the difference between the reserved estimate and the tokens OpenAI billed"""
+    if actual_tokens == estimated_tokens: return
+    for bucket in reservation:
+        apply_rate_limit(bucket, 'adjust', 0, actual_tokens - estimated_tokens)
+
+def start_openai_cooldown(e_rate_limit):
+    headers = getattr(getattr(e_rate_limit, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'): cooldown_s = float(headers['retry-after-ms']) / 1000
+        elif headers.get('retry-after'): cooldown_s = float(headers['retry-after'])
+        else: cooldown_s = OPENAI_RATE_LIMIT_COOLDOWN_S
+    except ValueError:
+        cooldown_s = OPENAI_RATE_LIMIT_COOLDOWN_S
+    logging.warning(f"Rate Limit: OpenAI returned 429; all workers pause for {cooldown_s:.1f}s")
+    for bucket in rate_limit_buckets():
+        apply_rate_limit(bucket, 'block', seconds=cooldown_s)
+
+def rate_limit_status():
+    return {'backend': {scope: type(backend).__name__ for scope, backend, _, _, _ in rate_limit_buckets()},
+            'limits': {'node': {'rpm': OPENAI_NODE_RPM_LIMIT, 'tpm': OPENAI_NODE_TPM_LIMIT},
+                       'cluster': {'rpm': OPENAI_RPM_LIMIT, 'tpm': OPENAI_TPM_LIMIT}}}
+
+def create_chat_completion(request_client, task, priority_class, estimated_tokens, deadline, **request_params):
+    """chat.completions.create behind the shared rate limiter, retrying 429s only after the shared cool-down.
+    Returns (response, sent_at), or (None, None) when no capacity frees up before the deadline"""
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        wait_started = time.monotonic()
+        reservation = reserve_openai_capacity(estimated_tokens, deadline)
+        observe_metric('openai_rate_limit_wait', time.monotonic() - wait_started, priority=priority_class)
+        if reservation is None: return None, None
+        sent_at = time.perf_counter()
+        try:
+            response = request_client.chat.completions.create(**request_params)
+        except RateLimitError as e_rate_limit:
+            reconcile_openai_usage(reservation, estimated_tokens, 0)
+            increment_metric('openai_rate_limited', task=task or 'untagged')
+            start_openai_cooldown(e_rate_limit)
+            if attempt == OPENAI_MAX_RETRIES: raise
+            continue
+        except (APIConnectionError, InternalServerError):
+            reconcile_openai_usage(reservation, estimated_tokens, 0)
+            if attempt == OPENAI_MAX_RETRIES or time.monotonic() >= deadline: raise
+            time.sleep(min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.75, 1.0))
+            continue
+        except Exception:
+            reconcile_openai_usage(reservation, estimated_tokens, 0)
+            raise
+        usage = getattr(response, 'usage', None)
+        actual_tokens = getattr(usage, 'total_tokens', None) or \
+            (getattr(usage, 'prompt_tokens', 0) or 0) + (getattr(usage, 'completion_tokens', 0) or 0)
+        reconcile_openai_usage(reservation, estimated_tokens, actual_tokens or estimated_tokens)
+        return response, sent_at
+
+def call_openai_chat(request_client, task, chosen_model, prompt_messages, temperature, max_tokens, response_format, deadline=None):
+    """deadline (time.monotonic()) is when the caller stops waiting; no slot or capacity wait runs past it"""
+    call_started = time.perf_counter()
+    priority_class = llm_task_priority(task)
+    wait_deadline = min(time.monotonic() + LLM_CLASS_WAIT_S[priority_class], deadline or math.inf)
+    with trace_span('openai.chat', **{'llm.task': task, 'llm.model': chosen_model, 'llm.max_tokens': max_tokens, 'llm.priority': priority_class}) as span:
+        try:
+            extra_params = {'response_format': response_format} if response_format else {}
+            with llm_call_slot(priority_class, wait_deadline) as slot_acquired:
+                if not slot_acquired:
+                    logging.warning(f"LLM Slots: No {priority_class} capacity for task '{task or 'untagged'}' before its wait deadline; using fallback.")
+                    increment_metric('fallback', task=task or 'untagged', reason='capacity')
+                    set_span_attributes(span, **{'llm.capacity_exhausted': True})
+                    return LLM_CAPACITY_RESPONSE
+                estimated_tokens = count_message_tokens(prompt_messages) + max_tokens
+                response, sent_at = create_chat_completion(
+                    request_client, task, priority_class, estimated_tokens, wait_deadline,
+                    model=chosen_model, messages=prompt_messages, temperature=temperature, max_tokens=max_tokens, **extra_params
+                )
+                if response is None:
+                    logging.warning(f"Rate Limit: No OpenAI capacity for task '{task or 'untagged'}' before its deadline; using fallback.")
+                    increment_metric('fallback', task=task or 'untagged', reason='rate_limit')
+                    set_span_attributes(span, **{'llm.rate_limited': True})
+                    return LLM_RATE_LIMITED_RESPONSE
+                # Latency is measured from the moment the request is sent; queue and rate-limit waits are recorded per class
+                call_started = sent_at
+            usage = getattr(response, 'usage', None)
+            record_llm_call(task, chosen_model, time.perf_counter() - call_started, usage)
+            set_span_attributes(span, **{'llm.prompt_tokens': getattr(usage, 'prompt_tokens', None),
+                                         'llm.completion_tokens': getattr(usage, 'completion_tokens', None)})
+            return response.choices[0].message.content.strip()
+        except Exception as e_openai:
+            record_llm_call(task, chosen_model, time.perf_counter() - call_started, error=True)
+            set_span_attributes(span, error=True, **{'error.type': type(e_openai).__name__})
+            logging.error(f"OpenAI API call error with model {chosen_model}: {e_openai}", exc_info=True)
+            return f"Error: OpenAI API Call Failed - {e_openai}"
+
+def get_openai_response_generic(prompt_messages, temperature=0.7, max_tokens=500, model_override=None, task=None, response_format=None):
+    with trace_span('llm.request', **{'llm.task': task or 'untagged'}) as span:
+        response_text = route_openai_request(prompt_messages, temperature, max_tokens, model_override, task, response_format)
+        if span is not None:
+            if response_text in COUNTED_FALLBACK_RESPONSES: outcome = COUNTED_FALLBACK_RESPONSES[response_text]
+            elif response_text == LOCAL_ROUTE_RESPONSE: outcome = 'local_route'
+            elif response_text.startswith("Error") or response_text == "OpenAI client not available.": outcome = 'error'
+            else: outcome = 'ok'
+            set_span_attributes(span, **{'llm.outcome': outcome, 'llm.prompt_tokens_estimate': count_message_tokens(prompt_messages)})
+        return response_text
+
+def route_openai_request(prompt_messages, temperature, max_tokens, model_override, task, response_format):
+    """Applies the task's routing policy: local route, deadline hedging and the late-result cache"""
+    policy = LLM_TASK_POLICIES.get(task, {})
+    if policy.get('provider') == 'local':
+        record_llm_call(task, 'local', 0.0, local=True)
+        increment_metric('fallback', task=task or 'untagged', reason='local_route')
+        return LOCAL_ROUTE_RESPONSE
     if not client:
         logging.error("OpenAI client not available for API call.")
+        increment_metric('fallback', task=task or 'untagged', reason='no_client')
         return "OpenAI client not available."
-    try:
-        chosen_model = model_override if model_override else "gpt-4o-mini"
-        response = client.chat.completions.create(
-            model=chosen_model, messages=prompt_messages, temperature=temperature, max_tokens=max_tokens
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e_openai:
-        logging.error(f"OpenAI API call error with model {chosen_model}: {e_openai}", exc_info=True)
-        return f"Error: OpenAI API Call Failed - {e_openai}"
+    chosen_model = model_override or policy.get('model') or DEFAULT_CHAT_MODEL
+    if policy.get('max_tokens'): max_tokens = min(max_tokens, policy['max_tokens'])
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("LLM task '%s' prompt: %d tokens (max output %d)", task or 'untagged', count_message_tokens(prompt_messages), max_tokens)
+    # Retries happen in create_chat_completion so that 429s respect the cool-down shared by all workers
+    request_client = client.with_options(max_retries=0, **({'timeout': policy['latency_budget_s']} if policy.get('latency_budget_s') else {}))
+    deadline_s = policy.get('deadline_s')
+    if not deadline_s:
+        response_text = call_openai_chat(request_client, task, chosen_model, prompt_messages, temperature, max_tokens, response_format)
+        if response_text.startswith("Error") and response_text not in COUNTED_FALLBACK_RESPONSES:
+            increment_metric('fallback', task=task or 'untagged', reason='error')
+        return response_text
+    # A result that arrived after an earlier request's deadline answers an identical request instantly
+    request_key = llm_request_key(task, chosen_model, prompt_messages, temperature, max_tokens, response_format)
+    late_result = get_late_llm_result(request_key)
+    record_cache_lookup('late_llm_result', late_result is not None)
+    if late_result is not None:
+        logging.info(f"LLM task '{task}': Served late result from cache.")
+        return late_result
+
+    def deadline_fallback():
+        with llm_task_stats_lock:
+            llm_task_stats[task or 'untagged']['deadline_misses'] += 1
+        increment_metric('fallback', task=task or 'untagged', reason='deadline')
+        return DEADLINE_EXCEEDED_RESPONSE
+
+    # The abandoned call gives up waiting for a slot or rate-limit capacity once the hedge has fallen back
+    call_deadline = time.monotonic() + deadline_s
+    response_text = run_with_deadline(
+        lambda: call_openai_chat(request_client, task, chosen_model, prompt_messages, temperature, max_tokens, response_format, call_deadline),
+        deadline_fallback, deadline_s,
+        on_late_result=lambda response_text: store_late_llm_result(task, request_key, response_text),
+        label=task or 'untagged'
+    )
+    if response_text.startswith("Error") and response_text not in COUNTED_FALLBACK_RESPONSES:
+        increment_metric('fallback', task=task or 'untagged', reason='error')
+    return response_text
 
 def capture_initial_frame_data_for_question():
     """This function is kept for backward compatibility but is no longer used"""
@@ -323,7 +1620,7 @@ def capture_initial_frame_data_for_question():
 def generate_environment_icebreaker_question(image_data_url):
     if not image_data_url:
         logging.warning("Icebreaker: No image data provided, using fallback")
-        return "I see you're ready for the interview. How are you feeling about this opportunity?"
+        return FALLBACK_ICEBREAKERS[0]
     
     # First try OpenAI
     if client:
@@ -345,7 +1642,7 @@ def generate_environment_icebreaker_question(image_data_url):
                 {"type": "image_url", "image_url": {"url": image_data_url, "detail": "low"}}
             ]}]
             
-            response_text = get_openai_response_generic(messages, temperature=0.6, max_tokens=75, model_override="gpt-4-vision-preview")
+            response_text = get_openai_response_generic(messages, temperature=0.6, max_tokens=75, task="icebreaker")
             
             if "Error" not in response_text and "OpenAI client not available" not in response_text:
                 question = response_text.strip()
@@ -363,17 +1660,19 @@ def generate_environment_icebreaker_question(image_data_url):
             logging.error(f"Icebreaker: Exception with OpenAI: {e_ice}")
             # Fall through to fallback
     
-    # Fallback icebreaker questions
-    fallback_icebreakers = [
-        "I see you're ready for the interview. How are you feeling about this opportunity?",
-        "Your setup looks very professional. Are you comfortable and ready to start?",
-        "I appreciate you taking the time for this interview. How are you feeling today?",
-        "Thank you for joining us. Are you ready to begin our discussion?",
-        "I can see you're well-prepared. How are you feeling about this opportunity?"
-    ]
-    
+    return select_fallback_icebreaker()
+
+FALLBACK_ICEBREAKERS = [
+    "I see you're ready for the interview. How are you feeling about this opportunity?",
+    "Your setup looks very professional. Are you comfortable and ready to start?",
+    "I appreciate you taking the time for this interview. How are you feeling today?",
+    "Thank you for joining us. Are you ready to begin our discussion?",
+    "I can see you're well-prepared. How are you feeling about this opportunity?"
+]
+
+def select_fallback_icebreaker():
     # Select a random fallback question
-    selected_icebreaker = random.choice(fallback_icebreakers)
+    selected_icebreaker = random.choice(FALLBACK_ICEBREAKERS)
     logging.info(f"Icebreaker: Using fallback question: {selected_icebreaker}")
     return selected_icebreaker
 
@@ -459,8 +1758,86 @@ def get_fallback_questions_from_pdf(job_type, track, sub_track=''):
             "What motivates you in your work?"
         ]
 
+EMPTY_RESUME_TEXT = "Resume content appears to be empty or could not be extracted."
+RESUME_SUMMARY_INPUT_TOKENS = int(os.getenv('RESUME_SUMMARY_INPUT_TOKENS', 3000))
+RESUME_SUMMARY_TOKENS = 350
+RESUME_CONTEXT_FOLLOWUP_TOKENS = 150
+RESUME_SUMMARY_CACHE_SIZE = 256
+RESUME_SUMMARY_KEYWORDS = ('experience', 'intern', 'led', 'managed', 'manager', 'analyst', 'project', 'achieved', 'improved', 'increased',
+                           'reduced', 'university', 'college', 'institute', 'degree', 'b.tech', 'b.com', 'mba', 'skills', 'certified', 'award', '%')
+resume_summary_cache = {}
+resume_summary_cache_lock = threading.Lock()
+
+def is_resume_text_usable(resume_text):
+    return bool(resume_text and resume_text.strip()) and resume_text != EMPTY_RESUME_TEXT
+
+def extract_resume_summary_locally(resume_text):
+    """Extractive fallback: the most informative lines, in original order, within the summary token budget"""
+    lines = [" ".join(line.split()) for line in resume_text.split('\n')]
+    lines = [line for line in lines if len(line) > 3]
+    scored_lines = []
+    for position, line in enumerate(lines):
+        lowered = line.lower()
+        score = sum(1 for keyword in RESUME_SUMMARY_KEYWORDS if keyword in lowered) + (1 if re.search(r'\d', line) else 0)
+        scored_lines.append((score, position, line))
+    selected, used_tokens = [], 0
+    for score, position, line in sorted(scored_lines, key=lambda item: (-item[0], item[1])):
+        line_tokens = estimate_tokens(line)
+        if used_tokens + line_tokens > RESUME_SUMMARY_TOKENS: continue
+        selected.append((position, line))
+        used_tokens += line_tokens
+    return "\n".join(line for _, line in sorted(selected))
+
+def summarize_resume_with_ai(resume_text):
+    prompt_summary = (
+        "Summarize this resume for an interviewer as compact JSON with keys "
+        "\"headline\" (one line), \"education\", \"experience\", \"skills\", \"achievements\" (each a list of short strings, "
+        "keeping concrete names, roles, numbers and dates). Return ONLY the JSON object.\n"
+        f"Resume Text: ```{truncate_to_tokens(resume_text, RESUME_SUMMARY_INPUT_TOKENS)}```"
+    )
+    response_text = get_openai_response_generic([{"role": "user", "content": prompt_summary}], temperature=0.2,
+                                                max_tokens=RESUME_SUMMARY_TOKENS, task="resume_summary", response_format={"type": "json_object"})
+    if "Error" in response_text[:40] or "OpenAI client not available" in response_text: return None
+    try:
+        summary_data = json.loads(response_text)
+    except ValueError:
+        return None
+    if not isinstance(summary_data, dict): return None
+    summary_lines = []
+    if isinstance(summary_data.get('headline'), str) and summary_data['headline'].strip():
+        summary_lines.append(summary_data['headline'].strip())
+    for section in ('education', 'experience', 'skills', 'achievements'):
+        entries = summary_data.get(section)
+        if isinstance(entries, list) and entries:
+            summary_lines.append(f"{section.capitalize()}: " + "; ".join(str(entry).strip() for entry in entries if str(entry).strip()))
+    return "\n".join(summary_lines) or None
+
+def get_resume_summary(resume_text):
+    """Compact structured resume summary, computed once per distinct resume and cached"""
+    if not is_resume_text_usable(resume_text): return ""
+    cache_key = hashlib.sha256(resume_text.encode('utf-8', 'ignore')).hexdigest()
+    with resume_summary_cache_lock:
+        cached_summary = resume_summary_cache.get(cache_key)
+    record_cache_lookup('resume_summary', cached_summary is not None)
+    if cached_summary is not None: return cached_summary
+    summary = None
+    if client:
+        try:
+            summary = summarize_resume_with_ai(resume_text)
+        except Exception as e_summary:
+            logging.error(f"Resume Summary: Exception with OpenAI: {e_summary}")
+    if not summary:
+        summary = extract_resume_summary_locally(resume_text)
+    summary = truncate_to_tokens(summary, RESUME_SUMMARY_TOKENS)
+    with resume_summary_cache_lock:
+        if len(resume_summary_cache) >= RESUME_SUMMARY_CACHE_SIZE:
+            resume_summary_cache.pop(next(iter(resume_summary_cache)))
+        resume_summary_cache[cache_key] = summary
+    logging.info(f"Resume Summary: {estimate_tokens(resume_text)} resume tokens summarized to {estimate_tokens(summary)} tokens")
+    return summary
+
 def generate_resume_questions(resume_text, job_type, asked_qs_set_normalized_global):
-    if not resume_text or resume_text == "Resume content appears to be empty or could not be extracted.":
+    if not is_resume_text_usable(resume_text):
         logging.warning("Resume Q Gen: No resume text provided, using fallback questions")
         return get_fallback_questions_from_pdf(job_type, 'resume')
     
@@ -468,26 +1845,28 @@ def generate_resume_questions(resume_text, job_type, asked_qs_set_normalized_glo
     if client:
         try:
             prompt_context = "an MBA program interview" if job_type == 'mba' else "a banking role interview"
+            resume_summary = get_resume_summary(resume_text)
             prompt = (
                 f"You are an expert interviewer preparing for {prompt_context}. "
-                f"Based only on the candidate's resume provided below, generate 10-12 unique, insightful questions. "
+                f"Based only on the candidate's resume summary provided below, generate 10-12 unique, insightful questions. "
                 f"Focus on their experiences, skills, achievements, and career progression as detailed in the resume. "
                 f"Each question must be a complete sentence, concise, and end with a question mark. Avoid truncating questions mid-sentence."
                 f"Do not ask generic questions not directly tied to the resume content. "
                 f"interview questions tailored to the candidate's experience and background." 
-                f"Avoid questions similar to these already considered (normalized sample): {list(asked_qs_set_normalized_global)[:3]}. "
-                f"Resume Text: ```{resume_text[:2500]}```"
+                f"Avoid questions similar to these already considered: {nearest_asked_questions(resume_summary, asked_qs_set_normalized_global)}. "
+                f"Resume Summary: ```{resume_summary}```"
             )
-            response_text = get_openai_response_generic([{"role": "user", "content": prompt}], max_tokens=1000, temperature=0.55)
+            response_text = get_openai_response_generic([{"role": "user", "content": prompt}], max_tokens=1000, temperature=0.55, task="resume_questions")
             
             if "Error" not in response_text and "OpenAI client not available" not in response_text:
                 generated_qs_raw_list = [strip_numbering(q.strip()) for q in response_text.split('\n') if q.strip()]
-                final_resume_qs = []
+                final_resume_qs, accepted_normalized = [], set()
                 for q_text_candidate in generated_qs_raw_list:
                     if not q_text_candidate.endswith('?'): q_text_candidate += '?'
                     if 3 <= len(q_text_candidate.split()) <= 30:
-                        if normalize_text(q_text_candidate) not in asked_qs_set_normalized_global:
+                        if not is_question_asked(q_text_candidate, asked_qs_set_normalized_global, accepted_normalized):
                             final_resume_qs.append(q_text_candidate)
+                            accepted_normalized.add(normalize_text(q_text_candidate))
                 
                 if len(final_resume_qs) >= 5:
                     logging.info(f"Resume Q Gen: Successfully generated {len(final_resume_qs)} questions from OpenAI")
@@ -497,8 +1876,9 @@ def generate_resume_questions(resume_text, job_type, asked_qs_set_normalized_glo
                     # Supplement with fallback questions
                     fallback_qs = get_fallback_questions_from_pdf(job_type, 'resume')
                     for f_q_text in fallback_qs:
-                        if normalize_text(f_q_text) not in {normalize_text(q) for q in final_resume_qs}:
+                        if not is_question_asked(f_q_text, accepted_normalized):
                             final_resume_qs.append(f_q_text)
+                            accepted_normalized.add(normalize_text(f_q_text))
                     return final_resume_qs[:10]
             else:
                 logging.warning(f"Resume Q Gen: OpenAI failed: {response_text}")
@@ -512,6 +1892,142 @@ def generate_resume_questions(resume_text, job_type, asked_qs_set_normalized_glo
     logging.info("Resume Q Gen: Using fallback questions from PDF")
     return get_fallback_questions_from_pdf(job_type, 'resume')
 
+QUESTION_POOL_TRACKS = {'mba': ('school_based', 'interest_areas'), 'bank': ('bank_type', 'technical_analytical')}
+QUESTION_POOL_DB_PATH = os.getenv('QUESTION_POOL_DB_PATH', 'interview_data.db')
+QUESTION_POOL_LOW_WATERMARK = int(os.getenv('QUESTION_POOL_LOW_WATERMARK', '8'))
+QUESTION_POOL_TARGET = int(os.getenv('QUESTION_POOL_TARGET', '24'))
+QUESTION_POOL_DRAW = int(os.getenv('QUESTION_POOL_DRAW', '3'))
+QUESTION_POOL_BATCH = 10
+question_pool_refills_inflight = set()
+question_pool_refills_lock = threading.Lock()
+
+def open_question_pool_db():
+    conn = sqlite3.connect(QUESTION_POOL_DB_PATH, timeout=10)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_pool (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_type TEXT,
+            track TEXT,
+            sub_track TEXT,
+            question TEXT,
+            normalized TEXT,
+            created_at TEXT,
+            UNIQUE (job_type, track, sub_track, normalized)
+        )
+    ''')
+    return conn
+
+def question_pool_size(job_type, track, sub_track=''):
+    conn = open_question_pool_db()
+    try:
+        return conn.execute('SELECT COUNT(*) FROM question_pool WHERE job_type = ? AND track = ? AND sub_track = ?',
+                            (job_type, track, sub_track or '')).fetchone()[0]
+    finally:
+        conn.close()
+
+def generate_pool_questions(job_type, track, sub_track, count, existing_normalized):
+    """Ask OpenAI for track questions and keep the valid ones that aren't paraphrases of the pool or the PDF set"""
+    if not client: return []
+    static_qs = get_fallback_questions_from_pdf(job_type, track, sub_track)
+    known_normalized = set(existing_normalized) | {normalize_text(q) for q in static_qs}
+    prompt_context = "an MBA program interview" if job_type == 'mba' else "a banking role interview"
+    focus_guidance = FOLLOWUP_FOCUS_MAP.get(track, FOLLOWUP_DEFAULT_FOCUS)
+    prompt = (
+        f"You are an expert interviewer preparing for {prompt_context}. "
+        f"Generate {count} unique interview questions for the '{track.replace('_', ' ')}' track"
+        f"{f' (focus area: {sub_track})' if sub_track else ''}, probing {focus_guidance}. "
+        f"Each question must be a complete sentence, concise, and end with a question mark. "
+        f"Example questions in this style: {static_qs[:3]}. "
+        f"Avoid questions similar to these: {nearest_asked_questions(f'{track} {sub_track}', known_normalized, k=5)}. "
+        f"Return a numbered list with one question per line and no other text."
+    )
+    response_text = get_openai_response_generic([{"role": "user", "content": prompt}], max_tokens=60 * count, temperature=0.8, task="question_pool")
+    if "Error" in response_text or "OpenAI client not available" in response_text:
+        logging.warning(f"Question Pool: Generation failed for {job_type}/{track}/{sub_track}: {response_text}")
+        return []
+    accepted, accepted_normalized = [], set()
+    for candidate in parse_followup_candidates(response_text):
+        if not 3 <= len(candidate.split()) <= 30: continue
+        if is_question_asked(candidate, known_normalized, accepted_normalized): continue
+        accepted.append(candidate)
+        accepted_normalized.add(normalize_text(candidate))
+    return accepted
+
+def refill_question_pool(job_type, track, sub_track=''):
+    """Top the pool for one (job_type, track, sub_track) back up to QUESTION_POOL_TARGET; returns rows added"""
+    sub_track = sub_track or ''
+    conn = open_question_pool_db()
+    added = 0
+    try:
+        existing_normalized = {row[0] for row in conn.execute(
+            'SELECT normalized FROM question_pool WHERE job_type = ? AND track = ? AND sub_track = ?', (job_type, track, sub_track))}
+        attempts = 0
+        while len(existing_normalized) < QUESTION_POOL_TARGET and attempts < 3:
+            attempts += 1
+            batch_size = min(QUESTION_POOL_BATCH, QUESTION_POOL_TARGET - len(existing_normalized))
+            new_qs = generate_pool_questions(job_type, track, sub_track, batch_size, existing_normalized)[:batch_size]
+            if not new_qs: break
+            now = datetime.now().isoformat()
+            with metric_timer('sqlite_write', table='question_pool'), trace_span('sqlite.write', **{'db.table': 'question_pool'}), conn:
+                for q_text in new_qs:
+                    cursor = conn.execute(
+                        'INSERT OR IGNORE INTO question_pool (job_type, track, sub_track, question, normalized, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                        (job_type, track, sub_track, q_text, normalize_text(q_text), now))
+                    added += cursor.rowcount
+                    existing_normalized.add(normalize_text(q_text))
+        logging.info(f"Question Pool: Added {added} questions to {job_type}/{track}/{sub_track} (size {len(existing_normalized)})")
+    except sqlite3.Error as e_pool_db:
+        logging.error(f"Question Pool: Refill failed for {job_type}/{track}/{sub_track}: {e_pool_db}")
+    finally:
+        conn.close()
+    return added
+
+def schedule_question_pool_refill(job_type, track, sub_track=''):
+    """Queue a background refill unless one is already running for this pool in this process"""
+    pool_key = (job_type, track, sub_track or '')
+    with question_pool_refills_lock:
+        if pool_key in question_pool_refills_inflight: return False
+        question_pool_refills_inflight.add(pool_key)
+
+    def run_refill():
+        try:
+            refill_question_pool(*pool_key)
+        finally:
+            with question_pool_refills_lock:
+                question_pool_refills_inflight.discard(pool_key)
+
+    background_executor.submit(run_refill)
+    return True
+
+def draw_pool_questions(job_type, track, sub_track, count, asked_qs_normalized_set):
+    """Take up to count pooled questions not already asked, removing them from the pool; refills in the background when low"""
+    sub_track = sub_track or ''
+    drawn, drawn_normalized = [], set()
+    conn = open_question_pool_db()
+    try:
+        with metric_timer('sqlite_write', table='question_pool'), trace_span('sqlite.write', **{'db.table': 'question_pool'}), conn:
+            rows = conn.execute(
+                'SELECT id, question FROM question_pool WHERE job_type = ? AND track = ? AND sub_track = ? ORDER BY RANDOM() LIMIT ?',
+                (job_type, track, sub_track, count * 3)).fetchall()
+            for row_id, q_text in rows:
+                if len(drawn) >= count: break
+                if is_question_asked(q_text, asked_qs_normalized_set, drawn_normalized): continue
+                # Another worker may have drawn the same row; only keep rows this delete actually removed
+                if conn.execute('DELETE FROM question_pool WHERE id = ?', (row_id,)).rowcount:
+                    drawn.append(q_text)
+                    drawn_normalized.add(normalize_text(q_text))
+            remaining = conn.execute('SELECT COUNT(*) FROM question_pool WHERE job_type = ? AND track = ? AND sub_track = ?',
+                                     (job_type, track, sub_track)).fetchone()[0]
+    except sqlite3.Error as e_pool_db:
+        logging.error(f"Question Pool: Draw failed for {job_type}/{track}/{sub_track}: {e_pool_db}")
+        return []
+    finally:
+        conn.close()
+    if remaining < QUESTION_POOL_LOW_WATERMARK and client:
+        schedule_question_pool_refill(job_type, track, sub_track)
+    logging.info(f"Question Pool: Drew {len(drawn)} questions from {job_type}/{track}/{sub_track} ({remaining} left)")
+    return drawn
+
 def generate_answer_feedback(question, answer, job_description):
     # First try OpenAI
     if client:
@@ -522,7 +2038,7 @@ The candidate was asked: "{question}"
 Candidate's Answer: "{answer}"
 provide concise, constructive feedback to help the candidate improve their interview performance. Focus on clarity, detail, relevance to the question, and communication skills. Provide 2-3 sentences of specific, actionable advice tailored to the answer's content and weaknesses. Avoid repeating the question or answer verbatim, and do not include scores or numerical ratings. Ensure the feedback is encouraging, professional, and unique for each response.
 Feedback:"""
-            feedback = get_openai_response_generic([{"role": "user", "content": prompt}], temperature=0.65, max_tokens=160)
+            feedback = get_openai_response_generic([{"role": "user", "content": prompt}], temperature=0.65, max_tokens=160, task="feedback")
             
             if "Error" not in feedback and "OpenAI client not available" not in feedback:
                 feedback_text = feedback.strip()
@@ -537,6 +2053,9 @@ Feedback:"""
             logging.error(f"Feedback: Exception with OpenAI: {e}")
             # Fall through to fallback
     
+    return fallback_answer_feedback(answer)
+
+def fallback_answer_feedback(answer):
     # Fallback feedback based on answer characteristics
     answer_length = len(answer.split())
     has_examples = any(keyword in answer.lower() for keyword in ['example', 'instance', 'specifically', 'when', 'project', 'team', 'result'])
@@ -576,6 +2095,7 @@ WEIGHTS_EVAL = {
     "Grammar Usage and Sentence Fluency": 0.05,
     "Stop words": 0.05
 }
+@traced('eval.parse_scores')
 def parse_evaluation_response(raw_response_text):
     parsed_eval = {}
     lines = [line.strip() for line in raw_response_text.split('\n') if line.strip()]
@@ -653,14 +2173,7 @@ def fallback_ai_evaluation(question_text, answer_text):
     feedback_fb = ("[Fallback Eval: Answer relevant and reasonably detailed.]" if score_fb >= 6 else "[Fallback Eval: Answer relevant. Consider more detail/structure.]")
     return f"{feedback_fb} Score: {score_fb}/10", score_fb
 
-def evaluate_response_with_ai_scoring(question_text, answer_text, job_description_context):
-    if not answer_text or answer_text.strip() == "" or answer_text.lower() == "no answer provided by candidate.":
-        return "[No effective answer provided for AI scoring.] Score: 0/10", 0
-    if bool(re.search(r'\d+,\s*\d+,\s*\d+.*,_', question_text)): return evaluate_sequence_response(question_text, answer_text)
-    prompt_eval = f"""
-You are an AI Interview Performance Analyzer for a {job_description_context} role.
-Evaluate the candidate's answer to the question below based on these exact six categories.
-Use a GENEROUS and REALISTIC scoring scale where:
+EVALUATION_RUBRIC_TEXT = """Use a GENEROUS and REALISTIC scoring scale where:
 - 8-10/10: Excellent to outstanding performance
 - 6-7/10: Good to very good performance  
 - 4-5/10: Average to satisfactory performance
@@ -692,7 +2205,40 @@ Score generously - only heavily penalize excessive filler words.
 
 IMPORTANT: Be GENEROUS in your scoring. A well-structured, relevant answer should score 7-9/10. Only give very low scores (1-3/10) for truly poor or irrelevant answers.
 
-Provide a score (1-10, 1 lowest, 10 highest) for each category with a one-line justification.
+"""
+
+@traced('eval.finalize_scores')
+def finalize_ai_scoring(parsed_scores, answer_text):
+    """Weighted score plus answer-quality bonuses, and the evaluation string stored per answer"""
+    final_weighted_score = calculate_weighted_evaluation_score(parsed_scores)
+    
+    # Apply bonus scoring for exceptional answers
+    answer_length = len(answer_text.split())
+    has_specific_examples = any(keyword in answer_text.lower() for keyword in ['example', 'instance', 'specifically', 'when', 'project', 'team', 'result'])
+    has_quantifiable_results = any(keyword in answer_text.lower() for keyword in ['increased', 'decreased', 'improved', 'achieved', 'resulted in', 'led to', 'percentage', '%'])
+    
+    # Bonus for comprehensive answers with examples
+    if answer_length > 80 and has_specific_examples:
+        final_weighted_score = min(10.0, final_weighted_score + 0.5)
+    
+    # Additional bonus for quantifiable results
+    if has_quantifiable_results:
+        final_weighted_score = min(10.0, final_weighted_score + 0.3)
+    
+    eval_details_for_record = ["[AI Detailed Scoring Complete]"]
+    for cat_name_record, data_record in parsed_scores.items():
+        eval_details_for_record.append(f"{cat_name_record}: {data_record.get('score', 'N/A')}/10 ({data_record.get('justification', 'N/J')})")
+    full_eval_details_str = " | ".join(eval_details_for_record) + f" | Final Weighted Score: {final_weighted_score}/10"
+    return full_eval_details_str, final_weighted_score
+
+def evaluate_response_with_ai_scoring(question_text, answer_text, job_description_context):
+    if not answer_text or answer_text.strip() == "" or answer_text.lower() == "no answer provided by candidate.":
+        return "[No effective answer provided for AI scoring.] Score: 0/10", 0
+    if bool(re.search(r'\d+,\s*\d+,\s*\d+.*,_', question_text)): return evaluate_sequence_response(question_text, answer_text)
+    prompt_eval = f"""
+You are an AI Interview Performance Analyzer for a {job_description_context} role.
+Evaluate the candidate's answer to the question below based on these exact six categories.
+{EVALUATION_RUBRIC_TEXT}Provide a score (1-10, 1 lowest, 10 highest) for each category with a one-line justification.
 
 Format the response exactly as:
 Category: <category> (<score>/10)
@@ -703,92 +2249,96 @@ Question: {question_text}
 Candidate's Answer: {answer_text}
 """
     try:
-        ai_eval_text = get_openai_response_generic([{"role": "user", "content": prompt_eval}], temperature=0.5, max_tokens=500)
+        ai_eval_text = get_openai_response_generic([{"role": "user", "content": prompt_eval}], temperature=0.5, max_tokens=500, task="scoring")
         if "Error:" in ai_eval_text or "OpenAI client not available" in ai_eval_text:
             logging.warning(f"AI Scoring: API/Client error. Using fallback. Error: {ai_eval_text}"); return fallback_ai_evaluation(question_text, answer_text)
         parsed_scores_from_ai = parse_evaluation_response(ai_eval_text)
         if not parsed_scores_from_ai or len(parsed_scores_from_ai) < 6:
             logging.warning(f"AI Scoring: Failed to parse categories. Response: '{ai_eval_text}'. Parsed: {parsed_scores_from_ai}. Using fallback."); return fallback_ai_evaluation(question_text, answer_text)
-        final_weighted_score = calculate_weighted_evaluation_score(parsed_scores_from_ai)
-        
-        # Apply bonus scoring for exceptional answers
-        answer_length = len(answer_text.split())
-        has_specific_examples = any(keyword in answer_text.lower() for keyword in ['example', 'instance', 'specifically', 'when', 'project', 'team', 'result'])
-        has_quantifiable_results = any(keyword in answer_text.lower() for keyword in ['increased', 'decreased', 'improved', 'achieved', 'resulted in', 'led to', 'percentage', '%'])
-        
-        # Bonus for comprehensive answers with examples
-        if answer_length > 80 and has_specific_examples:
-            final_weighted_score = min(10.0, final_weighted_score + 0.5)
-        
-        # Additional bonus for quantifiable results
-        if has_quantifiable_results:
-            final_weighted_score = min(10.0, final_weighted_score + 0.3)
-        
-        eval_details_for_record = ["[AI Detailed Scoring Complete]"]
-        for cat_name_record, data_record in parsed_scores_from_ai.items():
-            eval_details_for_record.append(f"{cat_name_record}: {data_record.get('score', 'N/A')}/10 ({data_record.get('justification', 'N/J')})")
-        full_eval_details_str = " | ".join(eval_details_for_record) + f" | Final Weighted Score: {final_weighted_score}/10"
-        return full_eval_details_str, final_weighted_score
+        return finalize_ai_scoring(parsed_scores_from_ai, answer_text)
     except Exception as e_ai_score:
         logging.error(f"AI Scoring: Exception: {e_ai_score}", exc_info=True); return fallback_ai_evaluation(question_text, answer_text)
 
-def generate_next_question(prev_q_text, prev_ans_text, prev_score, interview_track_context, job_type_context, asked_qs_normalized_set_global, attempt_num=1):
+FOLLOWUP_FOCUS_MAP = {
+    'resume': 'candidate specific experiences, skills, or career goals mentioned in their resume or previous answer',
+    'school_based': 'their academic motivations, reasons for choosing a particular school, or how their studies relate to career goals',
+    'interest_areas': 'their passion for the chosen interest area, depth of knowledge, or practical application of their interests',
+    'bank_type': 'their understanding of the specific bank type, customer service approaches, or relevant operational aspects',
+    'technical_analytical': 'their technical banking knowledge, problem-solving abilities, or logical reasoning based on the previous answer'
+}
+FOLLOWUP_DEFAULT_FOCUS = 'general relevance, impact, or lessons learned from their previous answer'
+
+FOLLOWUP_CANDIDATE_COUNT = int(os.getenv('FOLLOWUP_CANDIDATE_COUNT', '4'))
+FOLLOWUP_MIN_WORDS, FOLLOWUP_MAX_WORDS = 3, 30
+def parse_followup_candidates(response_text):
+    """Split a numbered/bulleted list reply into cleaned question candidates"""
+    candidates = []
+    for line in (response_text or '').splitlines():
+        candidate = strip_numbering(line.strip().lstrip('-*• ').strip()).strip('"').strip()
+        if not candidate: continue
+        if not candidate.endswith('?'):
+            candidate += '?'
+        candidates.append(candidate)
+    return candidates
+
+def rank_followup_candidates(candidates, prev_q_text, prev_ans_text, asked_qs_normalized_set):
+    """Drop invalid or already-asked candidates, then order by how closely each one builds on the answer"""
+    answer_words, prev_q_words = content_words(prev_ans_text), content_words(prev_q_text)
+    ranked, seen = [], set()
+    for position, candidate in enumerate(candidates):
+        if not FOLLOWUP_MIN_WORDS <= len(candidate.split()) <= FOLLOWUP_MAX_WORDS: continue
+        if is_question_asked(candidate, asked_qs_normalized_set, seen): continue
+        seen.add(normalize_text(candidate))
+        words = content_words(candidate)
+        if not words: continue
+        answer_overlap = len(words & answer_words) / len(words)
+        # Candidates that mostly restate the previous question are weak follow-ups
+        prev_q_overlap = len(words & prev_q_words) / len(words)
+        ranked.append((answer_overlap - 0.5 * prev_q_overlap, -position, candidate))
+    ranked.sort(reverse=True)
+    return [candidate for _, _, candidate in ranked]
+
+def generate_next_question(prev_q_text, prev_ans_text, prev_score, interview_track_context, job_type_context, asked_qs_normalized_set_global, resume_summary=''):
     # If the answer is too short, skip OpenAI and use fallback questions.
     if len(prev_ans_text.split()) < 3:
         logging.info("Follow-up Gen: Answer too short. Using fallback question from PDF/resume.")
-    else:
-        # If answer is substantive, try OpenAI for a contextual follow-up.
-        if attempt_num > 2: 
-            logging.info("Follow-up Gen: Max attempts reached. No follow-up question will be generated.")
-            return None
-        
-        if client:
-            try:
-                focus_map = {
-                    'resume': 'candidate specific experiences, skills, or career goals mentioned in their resume or previous answer',
-                    'school_based': 'their academic motivations, reasons for choosing a particular school, or how their studies relate to career goals',
-                    'interest_areas': 'their passion for the chosen interest area, depth of knowledge, or practical application of their interests',
-                    'bank_type': 'their understanding of the specific bank type, customer service approaches, or relevant operational aspects',
-                    'technical_analytical': 'their technical banking knowledge, problem-solving abilities, or logical reasoning based on the previous answer'
-                }
-                focus_guidance = focus_map.get(interview_track_context, 'general relevance, impact, or lessons learned from their previous answer')
-                
-                prompt_fu = (
-                    f"You are an interviewer for a {job_type_context} candidate. They just answered a question. "
-                    f"Previous Question: \"{prev_q_text}\"\nCandidate's Answer: \"{prev_ans_text}\"\nThis answer was scored {prev_score}/10.\n"
-                    f"Based on this, generate ONE insightful follow-up question that delves deeper into their response, focusing on {focus_guidance}. "
-                    f"The follow-up should be natural, concise, a complete sentence, and end with a question mark. "
-                    f"Do NOT repeat the previous question or ask something generic if a specific follow-up is possible. "
-                    f"Avoid questions similar to these already considered (normalized sample): {list(asked_qs_normalized_set_global)[:3]}. Follow-up Question:"
-                )
-                
-                fu_resp_text = get_openai_response_generic([{"role": "user", "content": prompt_fu}], max_tokens=110, temperature=0.6)
+    elif client:
+        # If answer is substantive, ask OpenAI for several candidates in one call and pick locally.
+        try:
+            focus_guidance = FOLLOWUP_FOCUS_MAP.get(interview_track_context, FOLLOWUP_DEFAULT_FOCUS)
+            
+            resume_context_fu = (f"Candidate background (resume summary): {truncate_to_tokens(resume_summary, RESUME_CONTEXT_FOLLOWUP_TOKENS)}\n"
+                                 if resume_summary else "")
+            prompt_fu = (
+                f"You are an interviewer for a {job_type_context} candidate. They just answered a question. "
+                f"{resume_context_fu}"
+                f"Previous Question: \"{prev_q_text}\"\nCandidate's Answer: \"{prev_ans_text}\"\nThis answer was scored {prev_score}/10.\n"
+                f"Based on this, generate {FOLLOWUP_CANDIDATE_COUNT} distinct, insightful follow-up questions that delve deeper into their response, focusing on {focus_guidance}. "
+                f"Each follow-up should be natural, concise, a complete sentence, and end with a question mark. "
+                f"Do NOT repeat the previous question or ask something generic if a specific follow-up is possible. "
+                f"Avoid questions similar to these already considered: {nearest_asked_questions(f'{prev_q_text} {prev_ans_text}', asked_qs_normalized_set_global)}. "
+                f"Return a numbered list with one question per line and no other text."
+            )
+            
+            fu_resp_text = get_openai_response_generic([{"role": "user", "content": prompt_fu}], max_tokens=60 * FOLLOWUP_CANDIDATE_COUNT, temperature=0.7, task="followup")
+            
+            if "Error" not in fu_resp_text and "OpenAI client not available" not in fu_resp_text:
+                fu_candidates = parse_followup_candidates(fu_resp_text)
+                ranked_candidates = rank_followup_candidates(fu_candidates, prev_q_text, prev_ans_text, asked_qs_normalized_set_global)
+                if ranked_candidates:
+                    logging.info(f"Follow-up Gen: Selected 1 of {len(ranked_candidates)} valid candidates ({len(fu_candidates)} generated): {ranked_candidates[0]}")
+                    return ranked_candidates[0]
+                logging.info(f"Follow-up Gen: None of {len(fu_candidates)} generated candidates passed validation.")
+            else:
+                logging.warning(f"Follow-up Gen: OpenAI failed: {fu_resp_text}")
                 
-                if "Error" not in fu_resp_text and "OpenAI client not available" not in fu_resp_text:
-                    fu_q_candidate = strip_numbering(fu_resp_text.strip())
-                    if not fu_q_candidate.endswith('?'): 
-                        fu_q_candidate += '?'
-                    
-                    if 3 <= len(fu_q_candidate.split()) <= 30:
-                        norm_fu_q_candidate = normalize_text(fu_q_candidate)
-                        if norm_fu_q_candidate not in asked_qs_normalized_set_global:
-                            logging.info(f"Follow-up Gen: Generated question from OpenAI: {fu_q_candidate}")
-                            return fu_q_candidate
-                        else:
-                            logging.info(f"Follow-up Gen: Generated question already asked, retrying...")
-                            if attempt_num < 2:
-                                return generate_next_question(prev_q_text, prev_ans_text, prev_score, interview_track_context, job_type_context, asked_qs_normalized_set_global, attempt_num + 1)
-                    else:
-                        logging.info(f"Follow-up Gen: Generated question failed validation, retrying...")
-                        if attempt_num < 2:
-                            return generate_next_question(prev_q_text, prev_ans_text, prev_score, interview_track_context, job_type_context, asked_qs_normalized_set_global, attempt_num + 1)
-                else:
-                    logging.warning(f"Follow-up Gen: OpenAI failed: {fu_resp_text}")
-                    
-            except Exception as e:
-                logging.error(f"Follow-up Gen: Exception with OpenAI: {e}")
+        except Exception as e:
+            logging.error(f"Follow-up Gen: Exception with OpenAI: {e}")
+
+    return fallback_follow_up_question(job_type_context, interview_track_context, asked_qs_normalized_set_global)
 
-    # Fallback to PDF questions if OpenAI fails or is skipped.
+def fallback_follow_up_question(job_type_context, interview_track_context, asked_qs_normalized_set_global):
+    """First not-yet-asked PDF question for the track; no LLM call"""
     logging.info("Follow-up Gen: Using fallback questions from PDF")
     try:
         # Get relevant questions from PDF based on track
@@ -797,7 +2347,7 @@ def generate_next_question(prev_q_text, prev_ans_text, prev_score, interview_tra
         # Filter out already asked questions
         available_questions = []
         for q in fallback_questions:
-            if normalize_text(q) not in asked_qs_normalized_set_global:
+            if not is_question_asked(q, asked_qs_normalized_set_global):
                 available_questions.append(q)
         
         if available_questions:
@@ -813,6 +2363,18 @@ def generate_next_question(prev_q_text, prev_ans_text, prev_score, interview_tra
         logging.error(f"Follow-up Gen: Error with fallback: {e}")
         return None
 
+def clean_conversational_reply(reply_text):
+    """The acknowledgement must be a statement: no question marks, ends with punctuation"""
+    ack_reply = (reply_text or '').strip()
+    if not ack_reply: return ''
+    if ack_reply.endswith('?'):
+        ack_reply = ack_reply[:-1] + '.'
+    if not re.search(r'[.!?]$', ack_reply):
+        ack_reply += '.'
+    if '?' in ack_reply:
+        ack_reply = ack_reply.replace('?', '.')
+    return ack_reply
+
 def generate_conversational_reply(answer_text, job_type_context):
     # First try OpenAI
     if client:
@@ -825,18 +2387,12 @@ def generate_conversational_reply(answer_text, job_type_context):
             ans_summary_for_prompt = answer_text[:100] + ("..." if len(answer_text) > 100 else "")
             ack_resp_text = get_openai_response_generic(
                 [{"role": "system", "content": sys_prompt_ack}, {"role": "user", "content": f"Candidate's answer (summary): {ans_summary_for_prompt}"}],
-                temperature=0.75, max_tokens=45
+                temperature=0.75, max_tokens=45, task="ack"
             )
             
             if "Error" not in ack_resp_text and "OpenAI client not available" not in ack_resp_text:
-                ack_reply = ack_resp_text.strip()
+                ack_reply = clean_conversational_reply(ack_resp_text)
                 if ack_reply:
-                    if ack_reply.endswith('?'):
-                        ack_reply = ack_reply[:-1] + '.'
-                    if not re.search(r'[.!?]$', ack_reply):
-                        ack_reply += '.'
-                    if '?' in ack_reply:
-                        ack_reply = ack_reply.replace('?', '.')
                     logging.info(f"Conversational Reply: Generated from OpenAI: {ack_reply}")
                     return ack_reply
             else:
@@ -847,6 +2403,9 @@ def generate_conversational_reply(answer_text, job_type_context):
             logging.error(f"Conversational Reply: Exception with OpenAI: {e}")
             # Fall through to fallback
     
+    return fallback_conversational_reply(answer_text)
+
+def fallback_conversational_reply(answer_text):
     # Fallback conversational replies
     fallback_replies = [
         "Thank you for that detailed response.",
@@ -872,19 +2431,345 @@ def generate_conversational_reply(answer_text, job_type_context):
     logging.info(f"Conversational Reply: Using fallback: {selected_reply}")
     return selected_reply
 
-def authenticate_user_db_old(username_auth, password_auth):
+COMBINED_LLM_MODE = os.getenv('COMBINED_LLM_MODE', 'true').lower() == 'true'
+
+def normalize_rubric_scores(raw_scores):
+    """Maps JSON rubric scores onto the canonical six categories; None unless all six are valid 1-10 scores"""
+    if not isinstance(raw_scores, dict): return None
+    scores = {}
+    for category_raw, entry in raw_scores.items():
+        canonical = CATEGORY_ALIASES_EVAL.get(str(category_raw).strip().lower(), str(category_raw).strip())
+        if not isinstance(entry, dict): return None
+        score_value = entry.get('score')
+        if isinstance(score_value, bool) or not isinstance(score_value, (int, float)) or not 1 <= score_value <= 10: return None
+        scores[canonical] = {'score': int(round(score_value)), 'justification': str(entry.get('justification', '')).strip()}
+    if set(scores) != set(WEIGHTS_EVAL): return None
+    return scores
+
+@traced('eval.validate_combined')
+def validate_combined_artifacts(payload, include_followup):
+    """Schema check for the combined completion. Returns the normalized artifacts or None"""
+    if not isinstance(payload, dict): return None
+    reply = clean_conversational_reply(payload.get('reply') if isinstance(payload.get('reply'), str) else '')
+    feedback = payload.get('feedback').strip() if isinstance(payload.get('feedback'), str) else ''
+    scores = normalize_rubric_scores(payload.get('scores'))
+    if not reply or len(feedback.split()) <= 5 or not scores: return None
+    follow_up = None
+    if include_followup and isinstance(payload.get('follow_up'), str):
+        follow_up = strip_numbering(payload['follow_up'].strip())
+        if follow_up and not follow_up.endswith('?'): follow_up += '?'
+    return {'reply': reply, 'scores': scores, 'feedback': feedback, 'follow_up': follow_up or None}
+
+def local_answer_artifacts(question_text, answer_text):
+    """Per-answer artifacts from the local fallbacks only. 'local' tells the caller to take the follow-up from
+    fallback_follow_up_question too, so a turn that already missed its deadline makes no further LLM call"""
+    evaluation, score = fallback_ai_evaluation(question_text, answer_text)
+    return {'reply': fallback_conversational_reply(answer_text), 'evaluation': evaluation, 'score': score,
+            'feedback': fallback_answer_feedback(answer_text), 'follow_up': None, 'local': True}
+
+def generate_combined_answer_artifacts(question_text, answer_text, job_description, job_type_context, interview_track_context, include_followup, resume_summary=''):
+    """One JSON completion returning the acknowledgement, rubric scores, feedback and (optionally) a follow-up.
+    Returns None on any failure so callers fall back to the individual generators."""
+    if not client or not COMBINED_LLM_MODE: return None
+    interviewer_role = 'HR' if job_type_context == 'mba' else 'banking HR'
+    follow_up_instruction = (
+        f'"follow_up": ONE insightful follow-up question that delves deeper into the answer, focusing on '
+        f'{FOLLOWUP_FOCUS_MAP.get(interview_track_context, FOLLOWUP_DEFAULT_FOCUS)}. Natural, concise, a complete sentence ending with a question mark, '
+        f'not a repeat of the question.'
+        if include_followup else '"follow_up": null.'
+    )
+    resume_context = (f"Candidate background (resume summary): {truncate_to_tokens(resume_summary, RESUME_CONTEXT_FOLLOWUP_TOKENS)}\n"
+                      if resume_summary and include_followup else "")
+    prompt_combined = f"""
+You are an engaging and human-like {interviewer_role} interviewer and an AI Interview Performance Analyzer for a {job_description} role.
+{resume_context}Question: {question_text}
+Candidate's Answer: {answer_text}
+
+Evaluate the answer on these exact six categories.
+{EVALUATION_RUBRIC_TEXT}Return ONLY a JSON object with these keys:
+"reply": a short, complete, human-like statement acknowledging the answer (no questions, ends with a period or exclamation mark).
+"scores": an object with keys "Ideas", "Organization", "Accuracy", "Voice", "Grammar Usage and Sentence Fluency", "Stop words"; each value is {{"score": <integer 1-10>, "justification": "<one line>"}}.
+"feedback": 2-3 sentences of concise, constructive, actionable feedback on clarity, detail, relevance and communication. No scores, do not repeat the question or answer verbatim.
+{follow_up_instruction}
+"""
     try:
-        with sqlite3.connect('users.db') as conn_auth:
-            cursor_auth = conn_auth.cursor()
-            cursor_auth.execute('SELECT Allowed FROM users WHERE Username = ? AND Password = ?', (username_auth, password_auth))
-            result_auth = cursor_auth.fetchone()
-        return result_auth[0] if result_auth else None
+        response_text = get_openai_response_generic([{"role": "user", "content": prompt_combined}], temperature=0.5, max_tokens=900,
+                                                    task="combined", response_format={"type": "json_object"})
+        if response_text == DEADLINE_EXCEEDED_RESPONSE:
+            # Past the deadline: answer locally rather than starting four more upstream calls
+            return local_answer_artifacts(question_text, answer_text)
+        if "Error" in response_text[:40] or "OpenAI client not available" in response_text:
+            logging.warning(f"Combined Eval: OpenAI failed: {response_text}")
+            return None
+        artifacts = validate_combined_artifacts(json.loads(response_text), include_followup)
+        if not artifacts:
+            logging.warning(f"Combined Eval: Response failed schema validation: '{response_text[:200]}'")
+            return None
+        return artifacts
+    except ValueError as e_json:
+        logging.warning(f"Combined Eval: Response was not valid JSON: {e_json}")
+        return None
+    except Exception as e_combined:
+        logging.error(f"Combined Eval: Exception: {e_combined}", exc_info=True)
+        return None
+
+BATCH_EVAL_CHUNK_TOKENS = int(os.getenv('BATCH_EVAL_CHUNK_TOKENS', 3000))
+BATCH_EVAL_FEEDBACK_TOKENS = 120  # output allowance per item
+BATCH_EVAL_SCORES_TOKENS = 260
+
+def is_llm_scorable(question_text, answer_text):
+    """Empty answers and sequence puzzles are scored locally by evaluate_response_with_ai_scoring"""
+    if not answer_text or not answer_text.strip() or answer_text.lower() == "no answer provided by candidate.": return False
+    return not re.search(r'\d+,\s*\d+,\s*\d+.*,_', question_text or '')
+
+def chunk_qna_items(items, include_scores, token_budget=BATCH_EVAL_CHUNK_TOKENS):
+    """Groups (index, item) pairs so each chunk's prompt plus expected output stays under token_budget"""
+    chunk, chunk_tokens = [], 0
+    for index, item in enumerate(items):
+        item_tokens = estimate_tokens(item.get('question', '')) + estimate_tokens(item.get('answer', '')) + BATCH_EVAL_FEEDBACK_TOKENS
+        if include_scores: item_tokens += BATCH_EVAL_SCORES_TOKENS
+        if chunk and chunk_tokens + item_tokens > token_budget:
+            yield chunk
+            chunk, chunk_tokens = [], 0
+        chunk.append((index, item))
+        chunk_tokens += item_tokens
+    if chunk: yield chunk
+
+def request_batch_evaluation_chunk(chunk, job_description, include_scores):
+    """One JSON completion for a chunk of Q&A pairs. Returns {index: raw result dict}"""
+    items_text = "\n\n".join(
+        f"ID {index}\nQuestion: {item.get('question', 'Unknown')}\nCandidate's Answer: {item.get('answer', '')}" for index, item in chunk
+    )
+    scores_instruction = (
+        f'"scores": an object with keys "Ideas", "Organization", "Accuracy", "Voice", "Grammar Usage and Sentence Fluency", "Stop words"; '
+        f'each value is {{"score": <integer 1-10>, "justification": "<one line>"}}.\n'
+        if include_scores else ''
+    )
+    prompt_batch = f"""
+You are an expert interviewer and AI Interview Performance Analyzer for a {job_description} role.
+Evaluate each of the candidate's answers below independently.
+{EVALUATION_RUBRIC_TEXT if include_scores else ''}Return ONLY a JSON object of the form {{"results": [...]}} with one entry per ID, each containing:
+"id": the ID number.
+{scores_instruction}"feedback": 2-3 sentences of concise, constructive, actionable feedback on clarity, detail, relevance and communication. No scores, do not repeat the question or answer verbatim.
+
+{items_text}
+"""
+    per_item_tokens = BATCH_EVAL_FEEDBACK_TOKENS + (BATCH_EVAL_SCORES_TOKENS if include_scores else 0)
+    response_text = get_openai_response_generic([{"role": "user", "content": prompt_batch}], temperature=0.5,
+                                                max_tokens=per_item_tokens * len(chunk) + 50,
+                                                task="batch_eval", response_format={"type": "json_object"})
+    if "Error" in response_text[:40] or "OpenAI client not available" in response_text:
+        logging.warning(f"Batch Eval: OpenAI failed for chunk of {len(chunk)}: {response_text}")
+        return {}
+    try:
+        raw_results = json.loads(response_text).get('results', [])
+    except (ValueError, AttributeError) as e_batch_json:
+        logging.warning(f"Batch Eval: Invalid JSON for chunk of {len(chunk)}: {e_batch_json}")
+        return {}
+    chunk_indices = {index for index, _ in chunk}
+    parsed = {}
+    for raw in raw_results if isinstance(raw_results, list) else []:
+        if isinstance(raw, dict) and isinstance(raw.get('id'), int) and raw['id'] in chunk_indices:
+            parsed[raw['id']] = raw
+    return parsed
+
+def batch_evaluate_answers(items, job_description, include_scores=True, token_budget=BATCH_EVAL_CHUNK_TOKENS):
+    """Scores and/or critiques many Q&A pairs with one request per token-budgeted chunk.
+    Returns a list aligned with items of {'feedback', 'evaluation', 'score'} ('evaluation'/'score' only when include_scores).
+    Items the model omits or gets wrong fall back to the single-item functions."""
+    results = [None] * len(items)
+    raw_by_index = {}
+    if client and items:
+        for chunk in chunk_qna_items(items, include_scores, token_budget):
+            try:
+                raw_by_index.update(request_batch_evaluation_chunk(chunk, job_description, include_scores))
+            except Exception as e_batch_chunk:
+                logging.error(f"Batch Eval: Exception for chunk of {len(chunk)}: {e_batch_chunk}", exc_info=True)
+    fallback_count = 0
+    for index, item in enumerate(items):
+        question_text, answer_text = item.get('question', 'Unknown'), item.get('answer', '')
+        raw = raw_by_index.get(index, {})
+        feedback = raw.get('feedback').strip() if isinstance(raw.get('feedback'), str) else ''
+        if len(feedback.split()) <= 5:
+            feedback = generate_answer_feedback(question_text, answer_text, job_description)
+            fallback_count += 1
+        result = {'feedback': feedback}
+        if include_scores:
+            scores = normalize_rubric_scores(raw.get('scores')) if is_llm_scorable(question_text, answer_text) else None
+            if scores:
+                result['evaluation'], result['score'] = finalize_ai_scoring(scores, answer_text)
+            else:
+                result['evaluation'], result['score'] = evaluate_response_with_ai_scoring(question_text, answer_text, job_description)
+        results[index] = result
+    logging.info(f"Batch Eval: Evaluated {len(items)} answers ({fallback_count} feedback fallbacks)")
+    return results
+
+def fill_missing_feedback(evaluations, job_description):
+    """Final report: critiques every evaluation that has no feedback yet in batched requests"""
+    missing = [item for item in evaluations if not item.get('feedback')]
+    if not missing: return
+    for item, result in zip(missing, batch_evaluate_answers(missing, job_description, include_scores=False)):
+        item['feedback'] = result['feedback']
+
+# Authentication. Migrated users.db rows carry a salted password_hash (werkzeug format, see manage_users.py);
+# unmigrated rows still verify against the legacy plaintext column and are hashed on their next login once the
+# column exists. Successful logins are cached per worker for AUTH_CACHE_TTL_S, so a repeat login skips SQLite and
+# the deliberately slow hash check; a role or password change therefore applies within the TTL.
+USERS_DB_PATH = os.getenv('USERS_DB_PATH', 'users.db')
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+AUTH_CACHE_TTL_S = int(os.getenv('AUTH_CACHE_TTL_S', '300'))
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', '20000'))
+AUTH_HASH_CONCURRENCY = int(os.getenv('AUTH_HASH_CONCURRENCY', '4'))  # concurrent hash checks per worker
+auth_cache = OrderedDict()  # username -> (allowed, credential_digest, expires_at)
+auth_cache_lock = threading.Lock()
+auth_cache_key = os.urandom(32)  # per process: cached digests are meaningless outside this worker's memory
+password_hash_slots = threading.BoundedSemaphore(AUTH_HASH_CONCURRENCY)
+dummy_password_hash = None
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+def check_password_slot(password_hash, password):
+    """Hash check bounded per worker, so a login storm cannot take every CPU from interviews in progress"""
+    with password_hash_slots:
+        return check_password_hash(password_hash, password)
+
+def credential_digest(username, password):
+    return hmac.new(auth_cache_key, f"{username}\0{password}".encode(), hashlib.sha256).digest()
+
+def cached_user_role(username, password):
+    with auth_cache_lock:
+        entry = auth_cache.get(username)
+        if entry and entry[2] <= time.monotonic():
+            del auth_cache[username]
+            entry = None
+        if entry: auth_cache.move_to_end(username)
+    record_cache_lookup('auth', entry is not None)
+    if entry and hmac.compare_digest(entry[1], credential_digest(username, password)): return entry[0]
+    return None
+
+def cache_user_role(username, password, allowed):
+    with auth_cache_lock:
+        auth_cache[username] = (allowed, credential_digest(username, password), time.monotonic() + AUTH_CACHE_TTL_S)
+        auth_cache.move_to_end(username)
+        while len(auth_cache) > AUTH_CACHE_SIZE: auth_cache.popitem(last=False)
+
+def invalidate_auth_cache(username=None):
+    with auth_cache_lock:
+        if username is None: auth_cache.clear()
+        else: auth_cache.pop(username, None)
+
+def verify_user_credentials(username_auth, password_auth):
+    """Allowed role for valid credentials, else None; always does one hash check so unknown users take as long"""
+    global dummy_password_hash
+    with sqlite3.connect(USERS_DB_PATH) as conn_auth:
+        has_hash_column = any(row[1].lower() == 'password_hash' for row in conn_auth.execute('PRAGMA table_info(users)'))
+        row = conn_auth.execute(f"SELECT {'password_hash' if has_hash_column else 'NULL'}, password, allowed FROM users WHERE username = ?",
+                                (username_auth,)).fetchone()
+    if row and row[0]:
+        return row[2] if check_password_slot(row[0], password_auth) else None
+    if dummy_password_hash is None: dummy_password_hash = hash_password(uuid.uuid4().hex)
+    check_password_slot(dummy_password_hash, password_auth)
+    if not row or not row[1] or not hmac.compare_digest(str(row[1]).encode(), password_auth.encode()): return None
+    if has_hash_column:
+        try:
+            with sqlite3.connect(USERS_DB_PATH) as conn_upgrade:
+                conn_upgrade.execute("UPDATE users SET password_hash = ?, password = '' WHERE username = ? AND password = ?",
+                                     (hash_password(password_auth), username_auth, row[1]))
+            logging.info(f"Auth: Upgraded legacy plaintext password of '{username_auth}' to a salted hash.")
+        except sqlite3.Error as e_auth_upgrade:
+            logging.error(f"Auth: Could not upgrade password hash for '{username_auth}': {e_auth_upgrade}")
+    return row[2]
+
+def authenticate_user(username_auth, password_auth):
+    cached_role = cached_user_role(username_auth, password_auth)
+    if cached_role: return cached_role
+    try:
+        allowed = verify_user_credentials(username_auth, password_auth)
     except sqlite3.Error as e_auth_db:
         logging.error(f"Authentication DB error for user '{username_auth}': {e_auth_db}", exc_info=True); return None
     except Exception as e_auth_generic:
         logging.error(f"Generic authentication error for user '{username_auth}': {e_auth_generic}", exc_info=True); return None
+    if allowed: cache_user_role(username_auth, password_auth, allowed)
+    return allowed
+
+FRAME_HASH_SIZE = 8
+FRAME_CHANGE_THRESHOLD = int(os.environ.get('FRAME_CHANGE_THRESHOLD', 6))  # differing bits out of 64
+FRAME_SCENE_CACHE_USERS = 1000
+face_cascade_local = threading.local()
+# Scene caches are per stream: one per WebSocket connection, and one per user for the HTTP /analyze_visuals path
+frame_scene_caches = OrderedDict()
+frame_scene_caches_lock = threading.Lock()
 
-def analyze_frame_for_visuals(cv_frame):
+def new_frame_scene_cache():
+    return {'signature': None, 'analysis': None}
+
+def get_user_frame_scene_cache(username):
+    with frame_scene_caches_lock:
+        scene_cache = frame_scene_caches.get(username)
+        if scene_cache is None:
+            scene_cache = frame_scene_caches[username] = new_frame_scene_cache()
+            while len(frame_scene_caches) > FRAME_SCENE_CACHE_USERS:
+                frame_scene_caches.popitem(last=False)
+        frame_scene_caches.move_to_end(username)
+        return scene_cache
+
+def get_face_cascade():
+    """Loads the Haar cascade once per analysis thread (detectMultiScale is not shared across threads)"""
+    face_cascade = getattr(face_cascade_local, 'cascade', None)
+    if face_cascade is None:
+        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        face_cascade_local.cascade = face_cascade
+    return face_cascade
+
+FRAME_STATS_TARGET_PIXELS = int(os.environ.get('FRAME_STATS_TARGET_PIXELS', 160 * 120))
+FRAME_BUFFER_SHAPES = 4  # per thread; clients pick their upload size, so the cache must not grow with it
+frame_buffers_local = threading.local()
+
+def get_frame_buffer(name, shape):
+    """Per-thread scratch buffers reused across frames of the same size, least recently used evicted first"""
+    buffers = getattr(frame_buffers_local, 'buffers', None)
+    if buffers is None:
+        buffers = frame_buffers_local.buffers = OrderedDict()
+    key = (name, shape)
+    buf = buffers.get(key)
+    if buf is None:
+        buf = buffers[key] = np.empty(shape, dtype=np.uint8)
+        while len(buffers) > FRAME_BUFFER_SHAPES: buffers.popitem(last=False)
+    else:
+        buffers.move_to_end(key)
+    return buf
+
+def to_grayscale(cv_frame):
+    gray = get_frame_buffer('gray', cv_frame.shape[:2])
+    cv2.cvtColor(cv_frame, cv2.COLOR_BGR2GRAY, dst=gray)
+    return gray
+
+def compute_frame_statistics(gray):
+    """Brightness/contrast from a nearest-neighbour subsample in a single meanStdDev pass"""
+    height, width = gray.shape[:2]
+    step = max(1, int((height * width / FRAME_STATS_TARGET_PIXELS) ** 0.5))
+    if step > 1:
+        sample_shape = (max(1, height // step), max(1, width // step))
+        sample = get_frame_buffer('stats', sample_shape)
+        cv2.resize(gray, (sample_shape[1], sample_shape[0]), dst=sample, interpolation=cv2.INTER_NEAREST)
+    else:
+        sample = gray
+    mean, stddev = cv2.meanStdDev(sample)
+    return float(mean[0][0]), float(stddev[0][0])
+
+def compute_frame_signature(gray):
+    """64-bit difference hash: cheap perceptual fingerprint used to detect scene changes"""
+    small = cv2.resize(gray, (FRAME_HASH_SIZE + 1, FRAME_HASH_SIZE), interpolation=cv2.INTER_AREA)
+    return small[:, 1:] > small[:, :-1]
+
+def frame_signature_distance(sig_a, sig_b):
+    if sig_a is None or sig_b is None: return FRAME_HASH_SIZE * FRAME_HASH_SIZE
+    return int(np.count_nonzero(sig_a != sig_b))
+
+@traced('frame.analyze')
+def analyze_frame_for_visuals(cv_frame, scene_cache=None):
+    """Face/brightness analysis; with a scene_cache (the caller's stream), an unchanged scene reuses its last detection"""
     try:
         if cv_frame is None or cv_frame.size == 0:
             logging.warning("Visual Analysis: Empty frame received")
@@ -897,15 +2782,39 @@ def analyze_frame_for_visuals(cv_frame):
                 'error': 'Empty frame'
             }
 
-        # Convert frame to grayscale
-        gray = cv2.cvtColor(cv_frame, cv2.COLOR_BGR2GRAY)
+        # Convert frame to grayscale (reused per-thread buffer)
+        gray = to_grayscale(cv_frame)
         
         # Calculate brightness and contrast
-        brightness = float(np.mean(gray))
-        contrast = float(np.std(gray))
+        brightness, contrast = compute_frame_statistics(gray)
+
+        # Skip face detection when the scene is effectively unchanged since the last analyzed frame
+        signature = compute_frame_signature(gray)
+        previous_analysis = None
+        scene_distance = FRAME_HASH_SIZE * FRAME_HASH_SIZE
+        if scene_cache is not None:
+            scene_distance = frame_signature_distance(signature, scene_cache['signature'])
+            previous_analysis = scene_cache['analysis']
+        scene_changed = scene_distance > FRAME_CHANGE_THRESHOLD
+        if scene_cache is not None:
+            record_cache_lookup('frame_detection', not scene_changed and bool(previous_analysis) and not previous_analysis.get('error'))
+        if not scene_changed and previous_analysis and not previous_analysis.get('error'):
+            analysis = {
+                'timestamp': datetime.now().isoformat(),
+                'face_detected': previous_analysis['face_detected'],
+                'face_count': previous_analysis['face_count'],
+                'face_locations': previous_analysis['face_locations'],
+                'brightness': brightness,
+                'contrast': contrast,
+                'scene_changed': False,
+                'face_lost': False,
+                'detection_reused': True
+            }
+            if should_log_frame(): logging.debug("Visual Analysis: Scene unchanged (distance %d), reusing face detection", scene_distance)
+            return analysis
         
         # Detect faces
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        face_cascade = get_face_cascade()
         if face_cascade.empty():
             logging.error("Visual Analysis: Failed to load face cascade classifier")
             return {
@@ -917,12 +2826,13 @@ def analyze_frame_for_visuals(cv_frame):
                 'error': 'Failed to load face detector'
             }
         
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
-        )
+        with metric_timer('face_detect'):
+            faces = face_cascade.detectMultiScale(
+                gray,
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(30, 30)
+            )
         
         # Initialize analysis result
         analysis = {
@@ -931,10 +2841,15 @@ def analyze_frame_for_visuals(cv_frame):
             'face_count': len(faces),
             'face_locations': faces.tolist() if len(faces) > 0 else [],
             'brightness': brightness,
-            'contrast': contrast
+            'contrast': contrast,
+            'scene_changed': scene_changed,
+            'face_lost': bool(previous_analysis and previous_analysis.get('face_detected')) and len(faces) == 0,
+            'detection_reused': False
         }
+        if scene_cache is not None:
+            scene_cache.update(signature=signature, analysis=analysis)
         
-        logging.debug(f"Visual Analysis: Processed frame - Faces: {len(faces)}, Brightness: {brightness:.2f}, Contrast: {contrast:.2f}")
+        if should_log_frame(): logging.debug("Visual Analysis: Processed frame - Faces: %d, Brightness: %.2f, Contrast: %.2f", len(faces), brightness, contrast)
         return analysis
 
     except Exception as e:
@@ -948,6 +2863,55 @@ def analyze_frame_for_visuals(cv_frame):
             'error': str(e)
         }
 
+def decode_frame_bytes(image_bytes):
+    if not image_bytes: return None
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    with metric_timer('frame_decode'):
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+def store_visual_analysis(analysis_result):
+    with visual_analyses_lock:
+        visual_analyses.append(analysis_result)
+        # Keep only last 10 analyses
+        if len(visual_analyses) > 10:
+            visual_analyses.pop(0)
+
+def suggest_frame_interval_ms(last_analysis=None):
+    """Client send interval: faster on motion or face loss, slower on a static scene, stretched while the pool is backed up"""
+    if not last_analysis or last_analysis.get('error'):
+        activity_interval = FRAME_INTERVAL_BASE_MS
+    elif last_analysis.get('scene_changed') or last_analysis.get('face_lost') or not last_analysis.get('face_detected'):
+        activity_interval = FRAME_INTERVAL_MIN_MS
+    else:
+        activity_interval = FRAME_INTERVAL_IDLE_MS
+    with frame_analysis_pending_lock:
+        pending = frame_analysis_pending
+    load_factor = 1.0 + pending / max(1, FRAME_ANALYSIS_WORKERS)
+    return int(min(FRAME_INTERVAL_MAX_MS, activity_interval * load_factor))
+
+def _run_frame_analysis(cv_frame, scene_cache):
+    global frame_analysis_pending
+    try:
+        return analyze_frame_for_visuals(cv_frame, scene_cache)
+    finally:
+        with frame_analysis_pending_lock:
+            frame_analysis_pending -= 1
+
+def analyze_frame_in_pool(cv_frame, scene_cache=None, timeout=10):
+    global frame_analysis_pending
+    submitted = False
+    with frame_analysis_pending_lock:
+        frame_analysis_pending += 1
+    try:
+        future = submit_with_context(frame_analysis_executor, _run_frame_analysis, cv_frame, scene_cache)
+        submitted = True
+    finally:
+        # Once submitted, _run_frame_analysis decrements; a failed submit must not leave the interval throttled
+        if not submitted:
+            with frame_analysis_pending_lock:
+                frame_analysis_pending -= 1
+    return future.result(timeout=timeout)
+
 def calculate_visual_score():
     if not visual_analyses: return 0.0, "No visual data was captured for scoring."
     try:
@@ -1008,8 +2972,9 @@ def login_post_route():
     try:
         username_form = request.form.get('username'); password_form = request.form.get('password')
         if not username_form or not password_form: return jsonify({'success': False, 'error': 'Username and password are required.'}), 400
-        allowed_user_type_from_db = authenticate_user_db_old(username_form, password_form)
+        allowed_user_type_from_db = authenticate_user(username_form, password_form)
         if allowed_user_type_from_db:
+            app.session_interface.regenerate(session)
             session['allowed_user_type'] = allowed_user_type_from_db; session['username'] = username_form
             logging.info(f"User '{username_form}' logged in as type '{allowed_user_type_from_db}'.")
             return jsonify({'success': True, 'allowed': allowed_user_type_from_db})
@@ -1022,18 +2987,11 @@ def login_post_route():
 
 @app.route('/logout')
 def logout_route():
-    global visual_analysis_thread, visual_analyses, interview_context, qna_evaluations
+    global visual_analyses, interview_context, qna_evaluations
     username_logout = session.get('username', 'User')
     logging.info(f"Logout initiated for user {username_logout}.")
+    if 'username' in session: release_interview_admission(session['username'])
     try:
-        current_ic_ref = interview_context
-        if current_ic_ref and current_ic_ref.get('use_camera_feature', False) and visual_analysis_thread and visual_analysis_thread.is_alive():
-            logging.info(f"Logout: Signaling visual analysis thread to stop for {username_logout}.")
-            current_ic_ref['use_camera_feature'] = False
-            visual_analysis_thread.join(timeout=1.5)
-            if visual_analysis_thread.is_alive():
-                 logging.warning(f"Logout: Visual analysis thread for {username_logout} did not terminate gracefully.")
-            visual_analysis_thread = None
         session.clear()
         visual_analyses = []
         qna_evaluations = []
@@ -1043,7 +3001,7 @@ def logout_route():
     except Exception as e_logout:
         logging.error(f"Error during logout for {username_logout}: {e_logout}", exc_info=True)
         session.clear()
-        visual_analysis_thread = None; visual_analyses = []; interview_context = {}; qna_evaluations = []
+        visual_analyses = []; interview_context = {}; qna_evaluations = []
         return redirect(url_for('login_html_route'))
 
 @app.route('/capture_snapshot', methods=['POST'])
@@ -1058,17 +3016,18 @@ def capture_snapshot_route():
             snap_ts = datetime.now().strftime("%Y%m%d_%H%M%S_frontend_snap"); snap_fname_fe = f"fe_snapshot_{snap_ts}.jpg"
             snap_fpath_fe = os.path.join('uploads', 'snapshots', snap_fname_fe)
             with open(snap_fpath_fe, "wb") as f_snap: f_snap.write(img_bytes)
-            conn = sqlite3.connect('interview_data.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO snapshots (username, timestamp, image_path)
-                VALUES (?, ?, ?)
-            ''', (
-                session.get('username', 'anonymous'),
-                datetime.now().isoformat(),
-                snap_fpath_fe
-            ))
-            conn.commit()
+            with metric_timer('sqlite_write', table='snapshots'), trace_span('sqlite.write', **{'db.table': 'snapshots'}):
+                conn = sqlite3.connect('interview_data.db')
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO snapshots (username, timestamp, image_path)
+                    VALUES (?, ?, ?)
+                ''', (
+                    session.get('username', 'anonymous'),
+                    datetime.now().isoformat(),
+                    snap_fpath_fe
+                ))
+                conn.commit()
             conn.close()
             logging.info(f"Frontend snapshot saved successfully: {snap_fpath_fe}")
             return jsonify({"message": f"Snapshot captured from frontend and saved as {snap_fname_fe}."}), 200
@@ -1091,36 +3050,336 @@ def analyze_visuals_route():
             return jsonify({'error': 'No image file selected'}), 400
 
         # Read image file
-        image_bytes = image_file.read()
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        frame = decode_frame_bytes(image_file.read())
         
         if frame is None:
             return jsonify({'error': 'Failed to decode image'}), 400
 
-        # Analyze frame
-        analysis_result = analyze_frame_for_visuals(frame)
-        
-        # Store analysis result
-        with visual_analyses_lock:
-            visual_analyses.append(analysis_result)
-            # Keep only last 10 analyses
-            if len(visual_analyses) > 10:
-                visual_analyses.pop(0)
+        # Analyze frame in the shared pool and store the result
+        analysis_result = analyze_frame_in_pool(frame, get_user_frame_scene_cache(session.get('username', 'anonymous')))
+        store_visual_analysis(analysis_result)
 
-        return jsonify({'success': True, 'analysis': analysis_result})
+        return jsonify({'success': True, 'analysis': analysis_result, 'next_interval_ms': suggest_frame_interval_ms(analysis_result)})
 
     except Exception as e:
         logging.error(f"Error in analyze_visuals_route: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def frame_stream_handler(ws):
+    """Receives downscaled JPEG frames pushed by the browser and replies with the analysis and the next send interval"""
+    if 'allowed_user_type' not in session:
+        ws.send(json.dumps({'error': 'Unauthorized'}))
+        return
+    if FRAME_STREAMS_PER_WORKER <= 0 or not frame_stream_slots.acquire(blocking=False):
+        logging.info("Frame Stream: Worker at its stream limit; client will fall back to HTTP.")
+        ws.send(json.dumps({'error': 'Frame streams busy', 'fallback': 'http'}))
+        return
+    try:
+        stream_frames(ws)
+    finally:
+        frame_stream_slots.release()
+
+def stream_frames(ws):
+    username_ws = session.get('username', 'anonymous')
+    scene_cache = new_frame_scene_cache()
+    last_snapshot_taken_time = 0
+    logging.info(f"Frame Stream: Opened for {username_ws}.")
+    ws.send(json.dumps({'next_interval_ms': suggest_frame_interval_ms()}))
+    while True:
+        message = ws.receive()
+        if message is None: break
+        if isinstance(message, str):
+            try: control = json.loads(message)
+            except ValueError: control = {}
+            if control.get('type') == 'stop': break
+            continue
+        frame = decode_frame_bytes(message)
+        if frame is None:
+            ws.send(json.dumps({'error': 'Failed to decode image', 'next_interval_ms': suggest_frame_interval_ms()}))
+            continue
+        try:
+            analysis_result = analyze_frame_in_pool(frame, scene_cache)
+        except Exception as e_ws_frame:
+            logging.error(f"Frame Stream: Analysis failed: {e_ws_frame}")
+            ws.send(json.dumps({'error': 'Frame analysis failed', 'next_interval_ms': suggest_frame_interval_ms()}))
+            continue
+        store_visual_analysis(analysis_result)
+        current_ts = time.time()
+        if current_ts - last_snapshot_taken_time >= FRAME_SNAPSHOT_INTERVAL_S:
+            snap_filename_va = f"va_snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+            snap_filepath_va = os.path.join('uploads', 'snapshots', snap_filename_va)
+            try: cv2.imwrite(snap_filepath_va, frame); logging.info(f"Frame Stream: Snapshot saved: {snap_filepath_va}"); last_snapshot_taken_time = current_ts
+            except Exception as e_snap_va: logging.error(f"Frame Stream: Failed to save snapshot: {e_snap_va}")
+        ws.send(json.dumps({'success': True, 'analysis': analysis_result, 'next_interval_ms': suggest_frame_interval_ms(analysis_result)}))
+    logging.info(f"Frame Stream: Closed for {username_ws}.")
+
+if sock:
+    sock.route('/ws/frames')(frame_stream_handler)
+
+RESUME_PREP_JOB_TTL_S = 1800
+RESUME_PREP_WAIT_S = float(os.getenv('RESUME_PREP_WAIT_S', '30'))
+RESUME_PREP_KEY_PREFIX = 'resume_prep:'
+RESUME_PREP_POLL_S = 0.25
+# Futures of the jobs this worker runs; the prepared result is also in the session store so /start_interview can be
+# served by any worker
+resume_prep_jobs = {}
+resume_prep_jobs_lock = threading.Lock()
+
+def extract_resume_text(resume_path):
+    """Plain text of a PDF or DOCX resume; raises ValueError for other file types"""
+    if resume_path.lower().endswith('.pdf'):
+        with metric_timer('document_extract', kind='resume_pdf'), pdfplumber.open(resume_path) as pdf_doc:
+            resume_text_content = ''.join(p.extract_text() or '' for p in pdf_doc.pages if p.extract_text())
+    elif resume_path.lower().endswith('.docx'):
+        with metric_timer('document_extract', kind='resume_docx'): resume_text_content = docx2txt.process(resume_path)
+    else: raise ValueError("Unsupported resume file type (PDF or DOCX only).")
+    return resume_text_content if resume_text_content.strip() else EMPTY_RESUME_TEXT
+
+def prepare_resume_questions(resume_path, job_type):
+    """Background half of /upload_resume: extract, summarize and generate resume questions, then drop the file"""
+    try:
+        resume_text_content = extract_resume_text(resume_path)
+    finally:
+        if os.path.exists(resume_path):
+            try: os.remove(resume_path)
+            except OSError as e_del_res: logging.warning(f"Could not delete uploaded resume file '{resume_path}': {e_del_res}")
+    resume_summary = get_resume_summary(resume_text_content)
+    questions = generate_resume_questions(resume_text_content, job_type, set())
+    logging.info(f"Resume Prep: Prepared {len(questions)} resume questions for {job_type}")
+    return {'resume_text': resume_text_content, 'resume_summary': resume_summary, 'questions': questions}
+
+def save_resume_prep_record(job_id, username, job_type, state, prepared=None):
+    """state is 'pending', 'done' or 'failed'; prepared holds resume_text, resume_summary and questions once done"""
+    try:
+        app.session_interface.store.setex(f"{RESUME_PREP_KEY_PREFIX}{username}:{job_id}", RESUME_PREP_JOB_TTL_S,
+                                          json.dumps({'username': username, 'job_type': job_type, 'state': state, 'prepared': prepared}))
+    except Exception as e_prep_save:
+        logging.error(f"Resume Prep: Could not store job {job_id}: {e_prep_save}")
+
+def load_resume_prep_record(job_id, username):
+    try:
+        stored = app.session_interface.store.get(f"{RESUME_PREP_KEY_PREFIX}{username}:{job_id}")
+    except Exception as e_prep_load:
+        logging.error(f"Resume Prep: Could not read job {job_id}: {e_prep_load}")
+        return None
+    if stored is None: return None
+    record = json.loads(stored.decode() if isinstance(stored, bytes) else stored)
+    return record if record.get('username') == username else None
+
+def run_resume_prep_job(job_id, username, job_type, resume_path):
+    try:
+        prepared = prepare_resume_questions(resume_path, job_type)
+    except Exception:
+        save_resume_prep_record(job_id, username, job_type, 'failed')
+        raise
+    save_resume_prep_record(job_id, username, job_type, 'done', prepared)
+    return prepared
+
+def start_resume_prep_job(resume_file, username, job_type):
+    """Saves the upload and queues preparation; returns the job id used as the resume handle"""
+    job_id = uuid.uuid4().hex
+    extension = os.path.splitext(resume_file.filename or '')[1].lower()
+    resume_path = os.path.join('uploads', f"resume_{job_id}{extension}")
+    resume_file.save(resume_path)
+    now = time.time()
+    save_resume_prep_record(job_id, username, job_type, 'pending')
+    with resume_prep_jobs_lock:
+        for stale_id in [j for j, job in resume_prep_jobs.items() if now - job['created'] > RESUME_PREP_JOB_TTL_S]:
+            resume_prep_jobs.pop(stale_id, None)
+        resume_prep_jobs[job_id] = {'created': now, 'username': username, 'job_type': job_type,
+                                    'future': background_executor.submit(run_resume_prep_job, job_id, username, job_type, resume_path)}
+    return job_id
+
+def get_resume_prep_result(job_id, username, job_type, wait_seconds=0):
+    """Returns (prepared, known). prepared is None while the job is still running or if it failed"""
+    with resume_prep_jobs_lock:
+        job = resume_prep_jobs.get(job_id)
+    if job and job['username'] == username and job['job_type'] == job_type:
+        try:
+            return job['future'].result(timeout=wait_seconds), True
+        except FuturesTimeoutError:
+            return None, True
+        except Exception as e_prep_job:
+            logging.error(f"Resume Prep: Background job failed: {e_prep_job}")
+            return None, True
+    # Uploaded through another worker (or already expired here): poll the shared record
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        record = load_resume_prep_record(job_id, username)
+        if record is None or record.get('job_type') != job_type: return None, False
+        remaining = deadline - time.monotonic()
+        if record['state'] != 'pending' or remaining <= 0: return record.get('prepared'), True
+        time.sleep(min(RESUME_PREP_POLL_S, remaining))
+
+@app.route('/upload_resume', methods=['POST'])
+def upload_resume_route():
+    """Accepts the resume as soon as it is selected and prepares its questions before the interview starts"""
+    if 'allowed_user_type' not in session: return jsonify({"error": "Unauthorized"}), 401
+    resume_file_form = request.files.get('resume')
+    if not resume_file_form or not resume_file_form.filename:
+        return jsonify({"error": "No resume file provided"}), 400
+    if not resume_file_form.filename.lower().endswith(('.pdf', '.docx')):
+        return jsonify({"error": "Unsupported resume file type (PDF or DOCX only)."}), 400
+    try:
+        job_key_map = 'mba' if session.get('allowed_user_type', 'MBA') == 'MBA' else 'bank'
+        resume_id = start_resume_prep_job(resume_file_form, session.get('username', 'default'), job_key_map)
+        return jsonify({"resume_id": resume_id})
+    except Exception as e_upload:
+        logging.error(f"Error in upload_resume_route: {e_upload}", exc_info=True)
+        return jsonify({"error": f"Could not upload resume: {str(e_upload)}"}), 500
+
+@app.route('/upload_resume/<resume_id>')
+def upload_resume_status_route(resume_id):
+    if 'allowed_user_type' not in session: return jsonify({"error": "Unauthorized"}), 401
+    job_key_map = 'mba' if session.get('allowed_user_type', 'MBA') == 'MBA' else 'bank'
+    prepared, known = get_resume_prep_result(resume_id, session.get('username', 'default'), job_key_map)
+    if not known: return jsonify({"error": "Unknown resume id"}), 404
+    return jsonify({"ready": prepared is not None, "question_count": len(prepared['questions']) if prepared else 0})
+
+# Admission control for interviews. At most MAX_ACTIVE_INTERVIEWS candidates hold a slot across the workers on this
+# host; the rest wait in a FIFO waiting room and index.html polls /waiting_room for their position and ETA. A slot
+# is released when the interview finishes or the candidate logs out, and reclaimed when its holder goes quiet.
+MAX_ACTIVE_INTERVIEWS = int(os.getenv('MAX_ACTIVE_INTERVIEWS', '50'))  # 0 disables the waiting room
+ADMISSION_ACTIVE_IDLE_S = int(os.getenv('ADMISSION_ACTIVE_IDLE_S', '900'))
+ADMISSION_ADMITTED_GRACE_S = 60  # an admitted candidate must (re)submit the start form within this
+ADMISSION_WAITING_TIMEOUT_S = 45  # a waiting ticket is dropped once its page stops polling
+ADMISSION_POLL_MS = 3000
+ADMISSION_DEFAULT_INTERVIEW_S = int(os.getenv('ADMISSION_DEFAULT_INTERVIEW_S', '900'))
+ADMISSION_HISTORY_SIZE = 100
+WORKER_MAX_CONCURRENT_STARTS = int(os.getenv('WORKER_MAX_CONCURRENT_STARTS', '2'))
+WORKER_START_WAIT_S = 15
+interview_start_slots = threading.BoundedSemaphore(WORKER_MAX_CONCURRENT_STARTS)
+
+def expire_and_promote_tickets(conn, now):
+    conn.execute('''
+        DELETE FROM admission_tickets
+        WHERE (state = 'active' AND last_seen < ?) OR (state = 'admitted' AND last_seen < ?) OR (state = 'waiting' AND last_seen < ?)
+    ''', (now - ADMISSION_ACTIVE_IDLE_S, now - ADMISSION_ADMITTED_GRACE_S, now - ADMISSION_WAITING_TIMEOUT_S))
+    held = conn.execute("SELECT COUNT(*) FROM admission_tickets WHERE state != 'waiting'").fetchone()[0]
+    if held < MAX_ACTIVE_INTERVIEWS:
+        conn.execute('''
+            UPDATE admission_tickets SET state = 'admitted', admitted_at = ?, last_seen = ?
+            WHERE username IN (SELECT username FROM admission_tickets WHERE state = 'waiting' ORDER BY enqueued_at LIMIT ?)
+        ''', (now, now, MAX_ACTIVE_INTERVIEWS - held))
+
+def estimate_wait_seconds(conn, position):
+    """Slots free up at about MAX_ACTIVE_INTERVIEWS per average interview length (from recent completions)"""
+    durations = [row[0] for row in conn.execute('SELECT duration_s FROM admission_history ORDER BY finished_at DESC LIMIT 50')]
+    average_s = sum(durations) / len(durations) if durations else ADMISSION_DEFAULT_INTERVIEW_S
+    return int(position * average_s / max(1, MAX_ACTIVE_INTERVIEWS))
+
+def waiting_room_status(conn, username):
+    row = conn.execute('SELECT state, enqueued_at FROM admission_tickets WHERE username = ?', (username,)).fetchone()
+    if not row: return {'waiting': False, 'admitted': False}
+    if row[0] != 'waiting': return {'waiting': False, 'admitted': True}
+    position = conn.execute("SELECT COUNT(*) FROM admission_tickets WHERE state = 'waiting' AND enqueued_at <= ?", (row[1],)).fetchone()[0]
+    return {'waiting': True, 'admitted': False, 'position': position, 'eta_seconds': estimate_wait_seconds(conn, position),
+            'poll_after_ms': ADMISSION_POLL_MS}
+
+def request_interview_admission(username):
+    """Claims an interview slot for username, or queues them; returns None once admitted, else the waiting-room status"""
+    if MAX_ACTIVE_INTERVIEWS <= 0: return None
+    now = time.time()
+    try:
+        conn = open_admission_db()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if not conn.execute('SELECT 1 FROM admission_tickets WHERE username = ?', (username,)).fetchone():
+                conn.execute("INSERT INTO admission_tickets (username, state, enqueued_at, last_seen) VALUES (?, 'waiting', ?, ?)",
+                             (username, now, now))
+            else:
+                conn.execute('UPDATE admission_tickets SET last_seen = ? WHERE username = ?', (now, username))
+            expire_and_promote_tickets(conn, now)
+            status = waiting_room_status(conn, username)
+            if status['admitted']:
+                conn.execute("UPDATE admission_tickets SET state = 'active', admitted_at = ?, last_seen = ? WHERE username = ?",
+                             (now, now, username))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+    except sqlite3.Error as e_admission:
+        # Failing open keeps interviews running if the admission DB is unavailable
+        logging.error(f"Admission: DB error for '{username}', admitting without a slot: {e_admission}")
+        return None
+    if status['admitted']: return None
+    logging.info(f"Admission: '{username}' waiting at position {status['position']} (ETA {status['eta_seconds']}s)")
+    return status
+
+def poll_waiting_room(username):
+    now = time.time()
+    conn = open_admission_db()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute("UPDATE admission_tickets SET last_seen = ? WHERE username = ? AND state = 'waiting'", (now, username))
+        expire_and_promote_tickets(conn, now)
+        status = waiting_room_status(conn, username)
+        conn.execute('COMMIT')
+        return status
+    finally:
+        conn.close()
+
+def touch_interview_admission(username):
+    """Keeps an active interview's slot from being reclaimed as idle"""
+    if MAX_ACTIVE_INTERVIEWS <= 0: return
+    try:
+        conn = open_admission_db()
+        try: conn.execute("UPDATE admission_tickets SET last_seen = ? WHERE username = ? AND state = 'active'", (time.time(), username))
+        finally: conn.close()
+    except sqlite3.Error as e_admission_touch:
+        logging.error(f"Admission: Could not refresh slot for '{username}': {e_admission_touch}")
+
+def release_interview_admission(username, completed=False):
+    if MAX_ACTIVE_INTERVIEWS <= 0: return
+    now = time.time()
+    try:
+        conn = open_admission_db()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT admitted_at FROM admission_tickets WHERE username = ? AND state = 'active'", (username,)).fetchone()
+            conn.execute('DELETE FROM admission_tickets WHERE username = ?', (username,))
+            if completed and row and row[0]:
+                conn.execute('INSERT INTO admission_history (finished_at, duration_s) VALUES (?, ?)', (now, now - row[0]))
+                conn.execute('DELETE FROM admission_history WHERE finished_at NOT IN (SELECT finished_at FROM admission_history ORDER BY finished_at DESC LIMIT ?)',
+                             (ADMISSION_HISTORY_SIZE,))
+            expire_and_promote_tickets(conn, now)
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+    except sqlite3.Error as e_admission_release:
+        logging.error(f"Admission: Could not release slot for '{username}': {e_admission_release}")
+
+@app.route('/waiting_room')
+def waiting_room_route():
+    if 'allowed_user_type' not in session: return jsonify({"error": "Unauthorized"}), 401
+    try:
+        return jsonify(poll_waiting_room(session.get('username', 'default')))
+    except sqlite3.Error as e_waiting_room:
+        logging.error(f"Admission: Waiting room poll failed: {e_waiting_room}")
+        return jsonify({'waiting': False, 'admitted': True})
+
 @app.route('/start_interview', methods=['POST'])
 def start_interview_route():
-    global qna_evaluations, current_use_voice_mode, interview_context, listening_active, visual_analysis_thread, visual_analyses
+    if 'allowed_user_type' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    waiting_status = request_interview_admission(session.get('username', 'default'))
+    if waiting_status:
+        return jsonify(waiting_status), 202
+    # Resume parsing and question generation are heavy; each worker runs only a few starts at once
+    if not interview_start_slots.acquire(timeout=WORKER_START_WAIT_S):
+        logging.warning("Admission: Worker start slots busy; asking the admitted candidate to retry.")
+        return jsonify({'waiting': True, 'admitted': True, 'position': 0, 'eta_seconds': WORKER_START_WAIT_S,
+                        'poll_after_ms': ADMISSION_POLL_MS}), 202
+    try:
+        response = app.make_response(start_admitted_interview())
+    finally:
+        interview_start_slots.release()
+    # A start that failed after admission must not keep the slot until it idles out
+    if response.status_code >= 400: release_interview_admission(session.get('username', 'default'))
+    return response
+
+def start_admitted_interview():
+    global qna_evaluations, current_use_voice_mode, interview_context, listening_active, visual_analyses
     try:
-        if 'allowed_user_type' not in session:
-            return jsonify({"error": "Unauthorized"}), 401
-            
         qna_evaluations = []
         visual_analyses = []
         current_use_voice_mode = request.form.get('mode') == 'voice'
@@ -1129,24 +3388,16 @@ def start_interview_route():
         track_form = request.form.get('interview_track', 'resume')
         sub_track_form = request.form.get('sub_track', '')
         resume_file_form = request.files.get('resume')
+        resume_id_form = request.form.get('resume_id')
         use_camera_feature = request.form.get('use_camera') == 'true'
 
-        if not resume_file_form:
+        if not resume_file_form and not resume_id_form:
             return jsonify({"error": "No resume file provided"}), 400
 
         interview_context = interview_context_template.copy()
+        interview_context['interview_id'] = uuid.uuid4().hex
         interview_context['questions_already_asked'] = set()
         interview_context['generated_resume_questions_cache'] = []
-        if visual_analysis_thread and visual_analysis_thread.is_alive():
-            logging.warning("Start Interview: Previous visual analysis thread was active. Signaling it to stop.")
-            old_thread = visual_analysis_thread
-            visual_analysis_thread = None
-            if old_thread and old_thread.is_alive():
-                old_thread.join(timeout=0.5)
-                if old_thread.is_alive():
-                    logging.warning("Start Interview: Old visual thread did not stop quickly.")
-            visual_analysis_thread = None
-        visual_analysis_thread = None
         interview_context.update({
             'current_interview_track': track_form, 'current_sub_track': sub_track_form,
             'use_camera_feature': use_camera_feature,
@@ -1154,22 +3405,33 @@ def start_interview_route():
         })
         job_key_map = 'mba' if allowed_user_type_sess == 'MBA' else 'bank'
         resume_text_content = ""
-        temp_resume_path_start = os.path.join('uploads', f"temp_resume_{session.get('username','default')}_{resume_file_form.filename}")
-        try:
-            resume_file_form.save(temp_resume_path_start)
-            if temp_resume_path_start.lower().endswith('.pdf'):
-                with pdfplumber.open(temp_resume_path_start) as pdf_doc: resume_text_content = ''.join(p.extract_text() or '' for p in pdf_doc.pages if p.extract_text())
-            elif temp_resume_path_start.lower().endswith('.docx'): resume_text_content = docx2txt.process(temp_resume_path_start)
-            else: return jsonify({"error": "Unsupported resume file type (PDF or DOCX only)."}), 400
-            if not resume_text_content.strip(): resume_text_content = "Resume content seems empty or could not be extracted."
-        except Exception as e_res_proc:
-            logging.error(f"Error processing resume '{resume_file_form.filename}': {e_res_proc}", exc_info=True); return jsonify({"error": f"Could not process resume: {str(e_res_proc)}"}), 500
-        finally:
-            if os.path.exists(temp_resume_path_start):
-                try: os.remove(temp_resume_path_start)
-                except OSError as e_del_res: logging.warning(f"Could not delete temp resume file '{temp_resume_path_start}': {e_del_res}")
-        if not interview_context['generated_resume_questions_cache']:
-             interview_context['generated_resume_questions_cache'] = generate_resume_questions(resume_text_content, job_key_map, interview_context['questions_already_asked'])
+        # A resume uploaded ahead of time via /upload_resume has its questions ready (or in flight) already
+        prepared_resume = None
+        if resume_id_form:
+            prepared_resume, _ = get_resume_prep_result(resume_id_form, session.get('username', 'default'), job_key_map, RESUME_PREP_WAIT_S)
+            if not prepared_resume: logging.warning(f"Prepared resume '{resume_id_form}' unavailable; processing the uploaded file instead.")
+        if prepared_resume:
+            resume_text_content = prepared_resume['resume_text']
+            interview_context['resume_summary'] = prepared_resume['resume_summary']
+            interview_context['generated_resume_questions_cache'] = list(prepared_resume['questions'])
+        else:
+            if not resume_file_form:
+                return jsonify({"error": "Prepared resume not found. Please upload your resume again."}), 400
+            temp_resume_path_start = os.path.join('uploads', f"temp_resume_{session.get('username','default')}_{resume_file_form.filename}")
+            try:
+                resume_file_form.save(temp_resume_path_start)
+                resume_text_content = extract_resume_text(temp_resume_path_start)
+            except ValueError as e_res_type:
+                return jsonify({"error": str(e_res_type)}), 400
+            except Exception as e_res_proc:
+                logging.error(f"Error processing resume '{resume_file_form.filename}': {e_res_proc}", exc_info=True); return jsonify({"error": f"Could not process resume: {str(e_res_proc)}"}), 500
+            finally:
+                if os.path.exists(temp_resume_path_start):
+                    try: os.remove(temp_resume_path_start)
+                    except OSError as e_del_res: logging.warning(f"Could not delete temp resume file '{temp_resume_path_start}': {e_del_res}")
+            # Summarized once per resume; reused by question generation and follow-ups for the whole session
+            interview_context['resume_summary'] = get_resume_summary(resume_text_content)
+            interview_context['generated_resume_questions_cache'] = generate_resume_questions(resume_text_content, job_key_map, interview_context['questions_already_asked'])
         for q_res_gen in interview_context['generated_resume_questions_cache']:
             interview_context['questions_already_asked'].add(normalize_text(q_res_gen))
         current_q_list_intermediate = []
@@ -1179,48 +3441,52 @@ def start_interview_route():
                 predef_qs = [q_obj['text'] for q_obj in job_specific_pdf_structure.get('resume_flow', [])[:3]]
                 current_q_list_intermediate = list(interview_context['generated_resume_questions_cache'])
                 for q_pd in predef_qs:
-                    if normalize_text(q_pd) not in interview_context['questions_already_asked']: current_q_list_intermediate.append(q_pd)
+                    if not is_question_asked(q_pd, interview_context['questions_already_asked']): current_q_list_intermediate.append(q_pd)
             elif track_form == "school_based":
                 school_data = job_specific_pdf_structure.get('school_based', defaultdict(list))
                 school_qs_track = [q_obj['text'] for q_obj in school_data.get(sub_track_form, [])]
                 if not school_qs_track: school_qs_track = [q_obj['text'] for sub_list in school_data.values() for q_obj in sub_list]
                 current_q_list_intermediate = list(interview_context['generated_resume_questions_cache'][:5])
                 for q_school in school_qs_track:
-                    if normalize_text(q_school) not in interview_context['questions_already_asked']: current_q_list_intermediate.append(q_school)
+                    if not is_question_asked(q_school, interview_context['questions_already_asked']): current_q_list_intermediate.append(q_school)
             elif track_form == "interest_areas":
                 interest_data = job_specific_pdf_structure.get('interest_areas', defaultdict(list))
                 interest_qs_track = [q_obj['text'] for q_obj in interest_data.get(sub_track_form, [])]
                 if not interest_qs_track: interest_qs_track = [q_obj['text'] for sub_list in interest_data.values() for q_obj in sub_list]
                 current_q_list_intermediate = list(interview_context['generated_resume_questions_cache'][:5])
                 for q_interest in interest_qs_track:
-                     if normalize_text(q_interest) not in interview_context['questions_already_asked']: current_q_list_intermediate.append(q_interest)
+                     if not is_question_asked(q_interest, interview_context['questions_already_asked']): current_q_list_intermediate.append(q_interest)
         elif job_key_map == 'bank':
             if track_form == "resume":
                 predef_qs_bank = [q_obj['text'] for q_obj in job_specific_pdf_structure.get('resume_flow', [])[:3]]
                 current_q_list_intermediate = list(interview_context['generated_resume_questions_cache'])
                 for q_pd_bank in predef_qs_bank:
-                    if normalize_text(q_pd_bank) not in interview_context['questions_already_asked']: current_q_list_intermediate.append(q_pd_bank)
+                    if not is_question_asked(q_pd_bank, interview_context['questions_already_asked']): current_q_list_intermediate.append(q_pd_bank)
             elif track_form == "bank_type":
                 bank_type_data = job_specific_pdf_structure.get('bank_type', defaultdict(list))
                 bank_qs_track = [q_obj['text'] for q_obj in bank_type_data.get(sub_track_form, [])]
                 if not bank_qs_track: bank_qs_track = [q_obj['text'] for sub_list in bank_type_data.values() for q_obj in sub_list]
                 current_q_list_intermediate = list(interview_context['generated_resume_questions_cache'][:5])
                 for q_bank_type in bank_qs_track:
-                    if normalize_text(q_bank_type) not in interview_context['questions_already_asked']: current_q_list_intermediate.append(q_bank_type)
+                    if not is_question_asked(q_bank_type, interview_context['questions_already_asked']): current_q_list_intermediate.append(q_bank_type)
             elif track_form == "technical_analytical":
                 tech_ana_data = job_specific_pdf_structure.get('technical_analytical', defaultdict(list))
                 tech_qs_track = [q_obj['text'] for q_obj in tech_ana_data.get(sub_track_form, [])]
                 if not tech_qs_track: tech_qs_track = [q_obj['text'] for sub_list in tech_ana_data.values() for q_obj in sub_list]
                 current_q_list_intermediate = list(interview_context['generated_resume_questions_cache'][:5])
                 for q_tech in tech_qs_track:
-                    if normalize_text(q_tech) not in interview_context['questions_already_asked']: current_q_list_intermediate.append(q_tech)
+                    if not is_question_asked(q_tech, interview_context['questions_already_asked']): current_q_list_intermediate.append(q_tech)
+        if track_form in QUESTION_POOL_TRACKS.get(job_key_map, ()):
+            # Pre-generated track questions add variety without an LLM call on the start path
+            current_q_list_intermediate.extend(draw_pool_questions(
+                job_key_map, track_form, sub_track_form, QUESTION_POOL_DRAW,
+                interview_context['questions_already_asked'] | {normalize_text(q) for q in current_q_list_intermediate}))
         final_interview_questions_for_session = []
         temp_asked_this_specific_list_build = set()
         for q_text_final_candidate in current_q_list_intermediate:
             stripped_q_final = strip_numbering(q_text_final_candidate)
             norm_stripped_q_final = normalize_text(stripped_q_final)
-            if norm_stripped_q_final not in interview_context['questions_already_asked'] and \
-               norm_stripped_q_final not in temp_asked_this_specific_list_build:
+            if not is_question_asked(stripped_q_final, interview_context['questions_already_asked'], temp_asked_this_specific_list_build):
                 final_interview_questions_for_session.append(stripped_q_final)
                 temp_asked_this_specific_list_build.add(norm_stripped_q_final)
         interview_context['questions_list'] = final_interview_questions_for_session
@@ -1231,7 +3497,7 @@ def start_interview_route():
             
             # Try to generate questions from OpenAI first
             try:
-                if resume_text_content and resume_text_content != "Resume content appears to be empty or could not be extracted.":
+                if is_resume_text_usable(resume_text_content):
                     # Try to generate more resume-based questions
                     additional_resume_qs = generate_resume_questions(resume_text_content, job_key_map, interview_context['questions_already_asked'])
                     if additional_resume_qs and len(additional_resume_qs) > 0:
@@ -1268,9 +3534,7 @@ def start_interview_route():
         
         if interview_context['use_camera_feature']:
             visual_analyses = []
-            visual_analysis_thread = threading.Thread(target=capture_and_analyze_visuals_thread_func, daemon=True)
-            visual_analysis_thread.start()
-            logging.info("Visual analysis background thread started.")
+            logging.info("Camera enabled. Awaiting client-pushed frames.")
             
         logging.info(f"Interview starting for {allowed_user_type_sess}, track '{track_form}'. Total questions in list: {len(interview_context['questions_list'])}")
         return jsonify({
@@ -1305,24 +3569,115 @@ def calculate_final_overall_score(current_qna_evaluations, visual_score_0_to_10_
     except Exception as e_calc_score:
         logging.error(f"Error calculating final overall score: {e_calc_score}", exc_info=True); return 0.0
 
+# Idempotent answer submission. The client sends an Idempotency-Key per question; the first request with a key claims
+# it in the session store (SET NX, so every worker sees the claim), duplicates arriving meanwhile wait for its result,
+# and later retries replay the stored response, so a retry never re-runs the LLM calls or advances current_q_idx.
+IDEMPOTENCY_KEY_PREFIX = 'idempotency:'
+IDEMPOTENCY_TTL_S = int(os.getenv('IDEMPOTENCY_TTL_S', '900'))
+IDEMPOTENCY_PENDING_TTL_S = 180  # a claim left behind by a crashed worker frees itself after this
+IDEMPOTENCY_WAIT_S = float(os.getenv('IDEMPOTENCY_WAIT_S', '60'))
+IDEMPOTENCY_POLL_S = 0.1
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{8,128}$')
+idempotency_inflight = {}
+idempotency_lock = threading.Lock()
+
+def load_idempotent_record(cache_key):
+    stored = app.session_interface.store.get(cache_key)
+    if stored is None: return None
+    return json.loads(stored.decode() if isinstance(stored, bytes) else stored)
+
+def replay_idempotent_response(record):
+    response = Response(record['body'], status=record['status'], mimetype=record['mimetype'])
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def run_claimed_request(cache_key, request_digest, handler):
+    finished = threading.Event()
+    with idempotency_lock:
+        idempotency_inflight[cache_key] = finished
+    try:
+        response = app.make_response(handler())
+        try:
+            if response.status_code < 500:
+                app.session_interface.store.setex(cache_key, IDEMPOTENCY_TTL_S, json.dumps({
+                    'state': 'done', 'digest': request_digest, 'status': response.status_code,
+                    'mimetype': response.mimetype, 'body': response.get_data(as_text=True),
+                }))
+            else:
+                # Server errors are not replayed; the client's retry runs the request again
+                app.session_interface.store.delete(cache_key)
+        except Exception as e_idempotency_save:
+            logging.error(f"Idempotency: Could not store response for {cache_key}: {e_idempotency_save}")
+        return response
+    except Exception:
+        app.session_interface.store.delete(cache_key)
+        raise
+    finally:
+        with idempotency_lock:
+            idempotency_inflight.pop(cache_key, None)
+        finished.set()
+
+def run_idempotent(cache_key, request_digest, handler):
+    """handler()'s response for the first request with cache_key; duplicates get that same response without running it"""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_S
+    while True:
+        try:
+            record = load_idempotent_record(cache_key)
+            if record is None:
+                pending = json.dumps({'state': 'pending', 'digest': request_digest})
+                if app.session_interface.store.set(cache_key, pending, ex=IDEMPOTENCY_PENDING_TTL_S, nx=True):
+                    record_cache_lookup('idempotent_response', False)
+                    return run_claimed_request(cache_key, request_digest, handler)
+                continue  # claimed by a concurrent duplicate; read its record
+        except Exception as e_idempotency:
+            logging.error(f"Idempotency: Store unavailable, processing {cache_key} without replay protection: {e_idempotency}")
+            return handler()
+        if record['digest'] != request_digest:
+            return jsonify({"error": "This Idempotency-Key was already used for a different answer."}), 422
+        if record['state'] == 'done':
+            record_cache_lookup('idempotent_response', True)
+            logging.info(f"Idempotency: Replayed stored response for {cache_key}")
+            return replay_idempotent_response(record)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            response = jsonify({"error": "The original submission is still being processed. Retry shortly."})
+            response.headers['Retry-After'] = '2'
+            return response, 409
+        # Coalesce onto the in-flight request: wake with it when it is in this worker, else poll the store
+        with idempotency_lock:
+            in_flight = idempotency_inflight.get(cache_key)
+        if in_flight: in_flight.wait(remaining)
+        else: time.sleep(min(IDEMPOTENCY_POLL_S, remaining))
+
 @app.route('/submit_answer', methods=['POST'])
 def submit_answer_route():
-    global qna_evaluations, current_use_voice_mode, interview_context, listening_active, visual_analysis_thread
+    if 'allowed_user_type' not in session:
+        return jsonify({"error": "Unauthorized. Session may have expired."}), 401
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+    if not idempotency_key:
+        return process_submitted_answer()
+    if not IDEMPOTENCY_KEY_PATTERN.match(idempotency_key):
+        return jsonify({"error": "Invalid Idempotency-Key."}), 400
+    cache_key = f"{IDEMPOTENCY_KEY_PREFIX}{session.get('username', 'default')}:{idempotency_key}"
+    return run_idempotent(cache_key, hashlib.sha256(request.get_data()).hexdigest(), process_submitted_answer)
+
+def process_submitted_answer():
+    global qna_evaluations, current_use_voice_mode, interview_context, listening_active
     try:
         if 'allowed_user_type' not in session:
             return jsonify({"error": "Unauthorized. Session may have expired."}), 401
+        touch_interview_admission(session.get('username', 'default'))
         if not interview_context or 'questions_list' not in interview_context or \
            not isinstance(interview_context.get('questions_list'), list) or \
            'current_q_idx' not in interview_context:
             logging.error("Submit Answer: Interview context corrupted or not initialized.")
+            release_interview_admission(session.get('username', 'default'), completed=True)
             visual_score_result = calculate_visual_score()
             calculated_final_visual_score = visual_score_result[0]
             visual_feedback_on_error = visual_score_result[1]
             overall_score_on_error = calculate_final_overall_score(qna_evaluations, calculated_final_visual_score)
-            if interview_context.get('use_camera_feature', False) and visual_analysis_thread and visual_analysis_thread.is_alive():
+            if interview_context.get('use_camera_feature', False):
                 interview_context['use_camera_feature'] = False
-                visual_analysis_thread.join(timeout=0.7)
-                visual_analysis_thread = None
             return jsonify({
                 "reply": "Critical error with session. Interview ending.",
                 "finished": True,
@@ -1344,23 +3699,16 @@ def submit_answer_route():
         if user_wants_to_stop:
             user_name_log = session.get('username', 'N/A_User')
             logging.info(f"User '{user_name_log}' requested to stop/end interview. Answer: '{answer_text_from_user}'.")
+            release_interview_admission(session.get('username', 'default'), completed=True)
             visual_score_result = calculate_visual_score()
             calculated_final_visual_score = visual_score_result[0]
             visual_feedback_on_stop = visual_score_result[1]
             overall_score_on_stop = calculate_final_overall_score(qna_evaluations, calculated_final_visual_score)
             job_description_for_feedback_gen = interview_context.get("current_job_description", f"{session.get('allowed_user_type', 'Candidate')} Profile")
-            for eval_item_on_stop in qna_evaluations:
-                if not eval_item_on_stop.get('feedback'):
-                    eval_item_on_stop['feedback'] = generate_answer_feedback(
-                        eval_item_on_stop.get('question', 'Unknown'),
-                        eval_item_on_stop.get('answer', ''),
-                        job_description_for_feedback_gen
-                    )
+            fill_missing_feedback(qna_evaluations, job_description_for_feedback_gen)
             listening_active = False
-            if interview_context.get('use_camera_feature', False) and visual_analysis_thread and visual_analysis_thread.is_alive():
+            if interview_context.get('use_camera_feature', False):
                 interview_context['use_camera_feature'] = False
-                visual_analysis_thread.join(timeout=0.7)
-                visual_analysis_thread = None
             return jsonify({
                 "reply": "Interview stopped as per your request.",
                 "finished": True,
@@ -1375,12 +3723,11 @@ def submit_answer_route():
         current_question_idx_val = interview_context.get('current_q_idx', -1)
         if not (0 <= current_question_idx_val < len(interview_context['questions_list'])):
             logging.error(f"Submit Answer: Invalid current_q_idx ({current_question_idx_val}). List len ({len(interview_context.get('questions_list',[]))}). Ending.")
+            release_interview_admission(session.get('username', 'default'), completed=True)
             vis_score_idx_err, vis_feed_idx_err = calculate_visual_score()
             overall_score_idx_err = calculate_final_overall_score(qna_evaluations, vis_score_idx_err)
-            if interview_context.get('use_camera_feature', False) and visual_analysis_thread and visual_analysis_thread.is_alive():
+            if interview_context.get('use_camera_feature', False):
                 interview_context['use_camera_feature'] = False
-                visual_analysis_thread.join(timeout=0.7)
-                visual_analysis_thread = None
             return jsonify({
                 "reply": "Issue with question sequence. Interview concluding.",
                 "finished": True,
@@ -1398,13 +3745,33 @@ def submit_answer_route():
             is_current_question_the_icebreaker = True
         job_key_for_ai = 'mba' if session.get('allowed_user_type') == 'MBA' else 'bank'
         job_desc_for_ai = interview_context.get("current_job_description", f"{session.get('allowed_user_type', 'Candidate')} Profile")
-        conversational_ack_reply = generate_conversational_reply(answer_text_to_process, job_key_for_ai)
-        ai_detailed_eval_str, ai_weighted_score_val = evaluate_response_with_ai_scoring(
-            question_text_being_answered, answer_text_to_process, job_desc_for_ai
-        )
-        user_summary_feedback_str = generate_answer_feedback(
-            question_text_being_answered, answer_text_to_process, job_desc_for_ai
-        )
+        current_depth = interview_context.get("question_depth_counter", 0)
+        wants_follow_up = not is_current_question_the_icebreaker and current_depth < interview_context.get("max_followup_depth", 2)
+        # Single structured completion for all per-answer artifacts; individual generators are the fallback.
+        # Sequence questions and empty answers are scored locally, so they skip the combined call.
+        combined_artifacts = None
+        if answer_text_from_user and is_llm_scorable(question_text_being_answered, answer_text_to_process):
+            combined_artifacts = generate_combined_answer_artifacts(
+                question_text_being_answered, answer_text_to_process, job_desc_for_ai, job_key_for_ai,
+                interview_context.get("current_interview_track", "unknown"),
+                wants_follow_up and len(answer_text_to_process.split()) >= 3,
+                interview_context.get('resume_summary', '')
+            )
+        if combined_artifacts:
+            conversational_ack_reply = combined_artifacts['reply']
+            if 'scores' in combined_artifacts:
+                ai_detailed_eval_str, ai_weighted_score_val = finalize_ai_scoring(combined_artifacts['scores'], answer_text_to_process)
+            else:
+                ai_detailed_eval_str, ai_weighted_score_val = combined_artifacts['evaluation'], combined_artifacts['score']
+            user_summary_feedback_str = combined_artifacts['feedback']
+        else:
+            conversational_ack_reply = generate_conversational_reply(answer_text_to_process, job_key_for_ai)
+            ai_detailed_eval_str, ai_weighted_score_val = evaluate_response_with_ai_scoring(
+                question_text_being_answered, answer_text_to_process, job_desc_for_ai
+            )
+            user_summary_feedback_str = generate_answer_feedback(
+                question_text_being_answered, answer_text_to_process, job_desc_for_ai
+            )
         qna_evaluations.append({
             "question": question_text_being_answered,
             "answer": answer_text_to_process,
@@ -1419,14 +3786,24 @@ def submit_answer_route():
             logging.info("Answer to icebreaker received. Skipping follow-up for it. Resetting depth counter.")
             interview_context["question_depth_counter"] = 0
         else:
-            current_depth = interview_context.get("question_depth_counter", 0)
-            max_depth = interview_context.get("max_followup_depth", 2)
-            if current_depth < max_depth:
-                follow_up_q_generated_text = generate_next_question(
-                    question_text_being_answered, answer_text_to_process, ai_weighted_score_val,
-                    interview_context.get("current_interview_track", "unknown"), job_key_for_ai,
-                    interview_context.get('questions_already_asked', set())
-                )
+            if wants_follow_up:
+                follow_up_q_generated_text = None
+                if combined_artifacts and combined_artifacts.get('follow_up'):
+                    combined_follow_up = combined_artifacts['follow_up']
+                    if FOLLOWUP_MIN_WORDS <= len(combined_follow_up.split()) <= FOLLOWUP_MAX_WORDS and not is_question_asked(combined_follow_up, interview_context['questions_already_asked']):
+                        follow_up_q_generated_text = combined_follow_up
+                if not follow_up_q_generated_text and combined_artifacts and combined_artifacts.get('local'):
+                    follow_up_q_generated_text = fallback_follow_up_question(
+                        job_key_for_ai, interview_context.get("current_interview_track", "unknown"),
+                        interview_context.get('questions_already_asked', set())
+                    )
+                elif not follow_up_q_generated_text:
+                    follow_up_q_generated_text = generate_next_question(
+                        question_text_being_answered, answer_text_to_process, ai_weighted_score_val,
+                        interview_context.get("current_interview_track", "unknown"), job_key_for_ai,
+                        interview_context.get('questions_already_asked', set()),
+                        resume_summary=interview_context.get('resume_summary', '')
+                    )
                 if follow_up_q_generated_text:
                     interview_context['questions_list'].insert(current_question_idx_val + 1, follow_up_q_generated_text)
                     interview_context['questions_already_asked'].add(normalize_text(follow_up_q_generated_text))
@@ -1453,22 +3830,15 @@ def submit_answer_route():
             })
         else:
             logging.info("All questions asked. Interview concluding normally.")
+            release_interview_admission(session.get('username', 'default'), completed=True)
             visual_score_result = calculate_visual_score()
             final_visual_score_val_norm = visual_score_result[0]
             visual_feedback_text_norm = visual_score_result[1]
             overall_score_val_norm = calculate_final_overall_score(qna_evaluations, final_visual_score_val_norm)
-            for eval_item_norm in qna_evaluations:
-                if not eval_item_norm.get('feedback'):
-                    eval_item_norm['feedback'] = generate_answer_feedback(
-                        eval_item_norm.get('question', 'Unknown'),
-                        eval_item_norm.get('answer', 'N/A'),
-                        job_desc_for_ai
-                    )
+            fill_missing_feedback(qna_evaluations, job_desc_for_ai)
             listening_active = False
-            if interview_context.get('use_camera_feature', False) and visual_analysis_thread and visual_analysis_thread.is_alive():
+            if interview_context.get('use_camera_feature', False):
                 interview_context['use_camera_feature'] = False
-                visual_analysis_thread.join(timeout=0.7)
-                visual_analysis_thread = None
             logging.debug(f"Interview End: Voice mode: {current_use_voice_mode}, Listening active: {listening_active}, Overall score: {overall_score_val_norm}")
             return jsonify({
                 "reply": "Thank you for completing the interview.",
@@ -1483,12 +3853,11 @@ def submit_answer_route():
             })
     except Exception as e_submit_ans:
         logging.error(f"Critical error in /submit_answer: {e_submit_ans}", exc_info=True)
+        release_interview_admission(session.get('username', 'default'), completed=True)
         vis_score_exc, vis_feed_exc = calculate_visual_score()
         overall_score_exc = calculate_final_overall_score(qna_evaluations, vis_score_exc)
-        if interview_context and interview_context.get('use_camera_feature', False) and visual_analysis_thread and visual_analysis_thread.is_alive():
+        if interview_context and interview_context.get('use_camera_feature', False):
             interview_context['use_camera_feature'] = False
-            visual_analysis_thread.join(timeout=0.7)
-            visual_analysis_thread = None
         logging.debug(f"Submit Answer Error: Voice mode: {current_use_voice_mode}, Listening active: {listening_active}")
         return jsonify({
             "error": f"Critical server error: {str(e_submit_ans)}.",
@@ -1542,8 +3911,7 @@ def generate_speech_route():
             return jsonify({"error": "TTS service unavailable."}), 503
         if not request.is_json:
             return jsonify({"error": "Invalid request: JSON expected."}), 400
-        # Log request details
-        logging.debug(f"TTS Request: Content-Type: {request.content_type}, Headers: {dict(request.headers)}, JSON: {request.get_json()}")
+        logging.debug("TTS Request: Content-Type: %s, %s bytes", request.content_type, request.content_length)
         data_tts = request.get_json()
         text_for_speech = data_tts.get('text', '').strip()
         voice_model_selection = data_tts.get('voice', 'alloy')
@@ -1552,14 +3920,20 @@ def generate_speech_route():
             return jsonify({"error": "Text for speech required."}), 400
         supported_openai_voices = ['alloy', 'echo', 'fable', 'onyx', 'nova', 'shimmer', 'sage']
         final_voice_model = voice_model_selection if voice_model_selection in supported_openai_voices else 'alloy'
-        logging.info(f"TTS Request: Generating speech for text '{text_for_speech[:50]}...' with voice '{final_voice_model}'.")
-        openai_tts_response = client.audio.speech.create(
-            model="tts-1",
-            voice=final_voice_model,
-            input=text_for_speech,
-            response_format="mp3"
-        )
-        logging.info(f"TTS Response: Successfully generated audio for '{text_for_speech[:50]}...'.")
+        logging.debug("TTS Request: Generating speech for %d chars with voice '%s'.", len(text_for_speech), final_voice_model)
+        tts_started = time.perf_counter()
+        try:
+            openai_tts_response = client.audio.speech.create(
+                model="tts-1",
+                voice=final_voice_model,
+                input=text_for_speech,
+                response_format="mp3"
+            )
+        except Exception:
+            record_llm_call('tts', 'tts-1', time.perf_counter() - tts_started, error=True)
+            raise
+        record_llm_call('tts', 'tts-1', time.perf_counter() - tts_started)
+        logging.info("TTS Response: Generated %d chars of audio with voice '%s'.", len(text_for_speech), final_voice_model)
         return Response(openai_tts_response.content, mimetype='audio/mp3')
     except Exception as e_tts_route:
         logging.error(f"TTS Generation Error: {e_tts_route}", exc_info=True)
@@ -1603,31 +3977,125 @@ def submit_evaluations():
     try:
         data = request.get_json()
         evaluations = data.get('evaluations', [])
-        conn = sqlite3.connect('interview_data.db')
-        cursor = conn.cursor()
-        for eval in evaluations:
-            cursor.execute('''
-                INSERT INTO evaluations (username, question, answer, evaluation, score, feedback, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                session.get('username', 'anonymous'),
-                eval.get('question'),
-                eval.get('answer'),
-                eval.get('evaluation'),
-                eval.get('score'),
-                eval.get('feedback', ''),
-                datetime.now().isoformat()
-            ))
-        conn.commit()
+        with metric_timer('sqlite_write', table='evaluations'), trace_span('sqlite.write', **{'db.table': 'evaluations'}):
+            conn = sqlite3.connect('interview_data.db')
+            cursor = conn.cursor()
+            for eval in evaluations:
+                cursor.execute('''
+                    INSERT INTO evaluations (username, question, answer, evaluation, score, feedback, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    session.get('username', 'anonymous'),
+                    eval.get('question'),
+                    eval.get('answer'),
+                    eval.get('evaluation'),
+                    eval.get('score'),
+                    eval.get('feedback', ''),
+                    datetime.now().isoformat()
+                ))
+            conn.commit()
         conn.close()
         return jsonify({'success': True})
     except Exception as e:
         logging.error(f"Error saving evaluations: {e}", exc_info=True)
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
+ICEBREAKER_MIN_BRIGHTNESS = 40
+ICEBREAKER_MIN_CONTRAST = 12
+ICEBREAKER_MAX_SIDE = 512  # OpenAI low-detail images are processed at 512x512
+ICEBREAKER_JOB_TTL_S = 600
+ICEBREAKER_KEY_PREFIX = 'icebreaker:'
+ICEBREAKER_POLL_S = 0.2
+# Futures of the jobs this worker runs; every job's state is also in the session store so any worker can answer a poll
+icebreaker_jobs = {}
+icebreaker_jobs_lock = threading.Lock()
+
+def icebreaker_precheck(cv_frame):
+    """Local quality/face check so dark or empty frames never reach the vision model"""
+    analysis = analyze_frame_for_visuals(cv_frame)
+    if analysis.get('error'): return False, analysis['error']
+    if analysis['brightness'] < ICEBREAKER_MIN_BRIGHTNESS: return False, 'Frame too dark'
+    if analysis['contrast'] < ICEBREAKER_MIN_CONTRAST: return False, 'Frame too flat'
+    if not analysis['face_detected']: return False, 'No face detected'
+    return True, None
+
+def encode_icebreaker_image(cv_frame):
+    height, width = cv_frame.shape[:2]
+    scale = min(1.0, ICEBREAKER_MAX_SIDE / max(height, width))
+    if scale < 1.0:
+        cv_frame = cv2.resize(cv_frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    _, buffer = cv2.imencode('.jpg', cv_frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+    return f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
+
+def save_icebreaker_record(job_id, username, question):
+    """question None marks a job that is still running"""
+    try:
+        app.session_interface.store.setex(f"{ICEBREAKER_KEY_PREFIX}{username}:{job_id}", ICEBREAKER_JOB_TTL_S,
+                                          json.dumps({'username': username, 'question': question}))
+    except Exception as e_ice_save:
+        logging.error(f"Icebreaker: Could not store job {job_id}: {e_ice_save}")
+
+def load_icebreaker_record(job_id, username):
+    try:
+        stored = app.session_interface.store.get(f"{ICEBREAKER_KEY_PREFIX}{username}:{job_id}")
+    except Exception as e_ice_load:
+        logging.error(f"Icebreaker: Could not read job {job_id}: {e_ice_load}")
+        return None
+    if stored is None: return None
+    record = json.loads(stored.decode() if isinstance(stored, bytes) else stored)
+    return record if record.get('username') == username else None
+
+def run_icebreaker_job(job_id, username, image_data_url):
+    try:
+        question = generate_environment_icebreaker_question(image_data_url) or select_fallback_icebreaker()
+    except Exception as e_ice_job:
+        logging.error(f"Icebreaker: Background job failed: {e_ice_job}")
+        question = select_fallback_icebreaker()
+    save_icebreaker_record(job_id, username, question)
+    return question
+
+def start_icebreaker_job(cv_frame, username):
+    """Returns (job_id, question). question is set immediately when the pre-check rules out the vision call"""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    ok, reason = icebreaker_precheck(cv_frame)
+    with icebreaker_jobs_lock:
+        for stale_id in [j for j, job in icebreaker_jobs.items() if now - job['created'] > ICEBREAKER_JOB_TTL_S]:
+            icebreaker_jobs.pop(stale_id, None)
+    if not ok:
+        logging.info(f"Icebreaker: Skipping vision call ({reason})")
+        question = select_fallback_icebreaker()
+        save_icebreaker_record(job_id, username, question)
+        return job_id, question
+    save_icebreaker_record(job_id, username, None)
+    future = background_executor.submit(run_icebreaker_job, job_id, username, encode_icebreaker_image(cv_frame))
+    with icebreaker_jobs_lock:
+        icebreaker_jobs[job_id] = {'created': now, 'username': username, 'future': future}
+    return job_id, None
+
+def get_icebreaker_result(job_id, username, wait_seconds=0):
+    """Returns (question, known); question is None while the job is still running"""
+    with icebreaker_jobs_lock:
+        job = icebreaker_jobs.get(job_id)
+    if job and job['username'] == username:
+        try:
+            return job['future'].result(timeout=wait_seconds), True
+        except FuturesTimeoutError:
+            return None, True
+    # Queued by another worker (or already expired here): poll the shared record
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        record = load_icebreaker_record(job_id, username)
+        if record is None: return None, False
+        remaining = deadline - time.monotonic()
+        if record['question'] is not None or remaining <= 0: return record['question'], True
+        time.sleep(min(ICEBREAKER_POLL_S, remaining))
+
 @app.route('/capture_initial_frame', methods=['POST'])
 def capture_initial_frame_route():
     try:
+        if 'allowed_user_type' not in session:
+            return jsonify({"error": "Unauthorized. Session may have expired."}), 401
         if 'image' not in request.files:
             return jsonify({'error': 'No image file provided'}), 400
 
@@ -1636,9 +4104,7 @@ def capture_initial_frame_route():
             return jsonify({'error': 'No image file selected'}), 400
 
         # Read and process the image
-        image_bytes = image_file.read()
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        frame = decode_frame_bytes(image_file.read())
         
         if frame is None:
             return jsonify({'error': 'Failed to decode image'}), 400
@@ -1649,20 +4115,13 @@ def capture_initial_frame_route():
         frame_path = os.path.join('uploads', 'snapshots', frame_filename)
         cv2.imwrite(frame_path, frame)
 
-        # Convert frame to base64 for OpenAI
-        _, buffer = cv2.imencode('.jpg', frame)
-        image_data_url = f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
-
-        # Generate icebreaker question
-        icebreaker_question = generate_environment_icebreaker_question(image_data_url)
-        if not icebreaker_question:
-            logging.warning("Failed to generate icebreaker question, using fallback")
-            icebreaker_question = "I see you're ready for the interview. How are you feeling about this opportunity?"
-
-        logging.info(f"Generated icebreaker question: {icebreaker_question}")
+        # Pre-check locally, then run the vision call in the background
+        icebreaker_id, icebreaker_question = start_icebreaker_job(frame, session.get('username', 'default'))
         
         return jsonify({
             'success': True,
+            'icebreaker_id': icebreaker_id,
+            'icebreaker_ready': icebreaker_question is not None,
             'icebreaker_question': icebreaker_question,
             'frame_saved': frame_filename
         })
@@ -1671,41 +4130,21 @@ def capture_initial_frame_route():
         logging.error(f"Error in capture_initial_frame_route: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-def capture_and_analyze_visuals_thread_func():
-    global visual_analyses, visual_analysis_thread, interview_context
-    cap_visual = None; logging.info("Visual Analysis Thread: Started.")
+@app.route('/icebreaker/<icebreaker_id>')
+def icebreaker_result_route(icebreaker_id):
     try:
-        cap_visual = cv2.VideoCapture(0)
-        if not cap_visual.isOpened(): logging.error("Visual Analysis Thread: Failed to open webcam."); return
-        last_snapshot_taken_time = 0; snapshot_capture_interval = 30
-        while True:
-            current_context_active = interview_context
-            use_camera_in_context = current_context_active.get('use_camera_feature', False) if current_context_active else False
-            if not use_camera_in_context or visual_analysis_thread != threading.current_thread():
-                logging.info(f"Visual Analysis Thread: Stopping. use_camera_in_context: {use_camera_in_context}, thread_match: {visual_analysis_thread == threading.current_thread()}.")
-                break
-            ret_frame, cv_frame_cap = cap_visual.read()
-            if not ret_frame or cv_frame_cap is None:
-                logging.warning("Visual Analysis Thread: Failed to capture frame."); time.sleep(0.25); continue
-            analysis_data = analyze_frame_for_visuals(cv_frame_cap)
-            with visual_analyses_lock:
-                visual_analyses.append(analysis_data)
-                # Keep only last 10 analyses
-                if len(visual_analyses) > 10:
-                    visual_analyses.pop(0)
-            current_ts = time.time()
-            if current_context_active.get('use_camera_feature', False) and (current_ts - last_snapshot_taken_time >= snapshot_capture_interval):
-                dt_str_snap = datetime.now().strftime("%Y%m%d_%H%M%S")
-                snap_filename_va = f"va_snapshot_{dt_str_snap}.jpg"
-                snap_filepath_va = os.path.join('uploads', 'snapshots', snap_filename_va)
-                try: cv2.imwrite(snap_filepath_va, cv_frame_cap); logging.info(f"Visual Analysis Thread: Snapshot saved: {snap_filepath_va}"); last_snapshot_taken_time = current_ts
-                except Exception as e_snap_va: logging.error(f"Visual Analysis Thread: Failed to save snapshot: {e_snap_va}")
-            time.sleep(0.3)
-    except Exception as e_thread_va:
-        logging.error(f"Visual Analysis Thread: Exception in main loop: {e_thread_va}", exc_info=True)
-    finally:
-        if cap_visual: cap_visual.release()
-        logging.info("Visual Analysis Thread: Terminated and camera released.")
+        if 'allowed_user_type' not in session:
+            return jsonify({"error": "Unauthorized. Session may have expired."}), 401
+        wait_seconds = max(0.0, min(float(request.args.get('wait', 0)), 10.0))
+        question, known = get_icebreaker_result(icebreaker_id, session.get('username', 'default'), wait_seconds)
+        if not known:
+            return jsonify({'error': 'Unknown icebreaker id'}), 404
+        return jsonify({'ready': question is not None, 'icebreaker_question': question})
+    except ValueError:
+        return jsonify({'error': 'Invalid wait parameter'}), 400
+    except Exception as e:
+        logging.error(f"Error in icebreaker_result_route: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/health')
 def health_check():
@@ -1728,6 +4167,254 @@ def health_check():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/llm_stats')
+def llm_stats_route():
+    """Per-task LLM call counts, latency, token usage and estimated cost for tuning LLM_ROUTING (admin only)"""
+    if 'allowed_user_type' not in session: return jsonify({"error": "Unauthorized"}), 401
+    if not is_admin_session(): return jsonify({"error": "Admin access required"}), 403
+    return jsonify({'policies': LLM_TASK_POLICIES, 'tasks': get_llm_task_stats(), 'scheduler': llm_scheduler.snapshot(),
+                    'rate_limit': rate_limit_status()})
+
+def is_internal_request():
+    """Direct request from loopback; anything relayed by the proxy (X-Forwarded-For) is external. Private addresses are
+    not trusted: a published port or another container on the bridge network reaches the app without the proxy"""
+    if request.headers.get('X-Forwarded-For') or request.headers.get('X-Real-IP'): return False
+    try:
+        remote_address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return remote_address.is_loopback
+
+@app.route('/metrics')
+def metrics_route():
+    """Prometheus exposition; aggregated across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    if not METRICS:
+        return jsonify({"error": "prometheus_client not installed"}), 503
+    if METRICS_TOKEN:
+        if request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+            return jsonify({"error": "Unauthorized"}), 401
+    elif not is_internal_request():
+        # Without a token only a scraper on the same host may read labels and error counters
+        return jsonify({"error": "Not found"}), 404
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+# On-demand diagnostics for live workers (admin only). Requests for another gunicorn worker are written to
+# DIAGNOSTICS_DIR and that worker is sent DIAGNOSTICS_SIGNAL; the handler is installed by gunicorn.conf.py's
+# post_worker_init, and results are written back to the directory so any worker can serve them.
+ADMIN_USERS = {name.strip() for name in os.getenv('ADMIN_USERS', '').split(',') if name.strip()}
+ADMIN_USER_TYPE = 'Admin'
+DIAGNOSTICS_DIR = os.getenv('DIAGNOSTICS_DIR', '/tmp/ai-interviewer-diagnostics')
+DIAGNOSTICS_SIGNAL = signal.SIGUSR2
+DIAGNOSTICS_RESULT_TTL_S = 3600
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', '60'))
+PROFILE_DEFAULT_INTERVAL_MS = 5
+TRACEMALLOC_FRAMES = int(os.getenv('TRACEMALLOC_FRAMES', '10'))
+SLOW_REQUEST_LOG_SIZE = int(os.getenv('SLOW_REQUEST_LOG_SIZE', '10'))  # slowest requests kept per route
+SLOW_REQUEST_EXCLUDED_PREFIXES = ('/ws/', '/static/')
+# Leaf functions of threads that are parked, not working; their samples are dropped unless include_idle is set
+PROFILE_IDLE_FUNCTIONS = {'wait', 'dequeue', 'select', 'poll', 'epoll', 'accept', 'get', 'sleep', '_wait_for_tstate_lock', 'readinto', 'recv_into'}
+DIAGNOSTIC_ACTIONS = ('profile', 'slow_requests', 'memory', 'memory_start', 'memory_stop')
+DIAGNOSTIC_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+slow_requests = defaultdict(list)  # route -> min-heap of (duration_s, timestamp, request_id, method, status)
+slow_requests_lock = threading.Lock()
+
+def is_admin_session():
+    return 'allowed_user_type' in session and (session.get('allowed_user_type') == ADMIN_USER_TYPE or session.get('username') in ADMIN_USERS)
+
+def record_request_duration(route, method, status, duration_s, request_id):
+    if route.startswith(SLOW_REQUEST_EXCLUDED_PREFIXES): return
+    entry = (duration_s, datetime.now().isoformat(), request_id or '', method, status or 0)
+    with slow_requests_lock:
+        heap = slow_requests[route]
+        if len(heap) < SLOW_REQUEST_LOG_SIZE: heapq.heappush(heap, entry)
+        elif duration_s > heap[0][0]: heapq.heapreplace(heap, entry)
+
+def slow_request_report():
+    with slow_requests_lock:
+        snapshot = {route: sorted(heap, reverse=True) for route, heap in slow_requests.items()}
+    report = {route: [{'duration_ms': round(duration_s * 1000, 1), 'timestamp': ts, 'request_id': request_id, 'method': method, 'status': status}
+                      for duration_s, ts, request_id, method, status in entries] for route, entries in snapshot.items()}
+    return dict(sorted(report.items(), key=lambda item: -item[1][0]['duration_ms']))
+
+def sample_thread_stacks(seconds, interval_s, include_idle=False):
+    """Wall-clock sampling of every other thread's Python stack; returns {collapsed_stack: sample_count}"""
+    counts = defaultdict(int)
+    own_thread_id = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id: continue
+            if not include_idle and frame.f_code.co_name in PROFILE_IDLE_FUNCTIONS: continue
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})")
+                frame = frame.f_back
+            thread_name = re.sub(r'[_-]\d+$', '', thread_names.get(thread_id, 'thread'))
+            counts[';'.join([thread_name] + stack[::-1])] += 1
+        time.sleep(interval_s)
+    return counts
+
+def run_sampling_profile(seconds, interval_ms=PROFILE_DEFAULT_INTERVAL_MS, include_idle=False):
+    """Collapsed-stack text ("frame;frame;frame count" per line), the input format of flamegraph.pl and speedscope"""
+    seconds = min(max(float(seconds), 0.1), PROFILE_MAX_SECONDS)
+    logging.info(f"Profiling: Sampling worker {os.getpid()} for {seconds:.1f}s every {interval_ms}ms")
+    counts = sample_thread_stacks(seconds, max(1, int(interval_ms)) / 1000, include_idle)
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+def tracemalloc_report(limit=20):
+    if not tracemalloc.is_tracing():
+        return {'pid': os.getpid(), 'tracing': False, 'message': "tracemalloc is off; run the memory_start action first."}
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(), 'tracing': True, 'current_bytes': current_bytes, 'peak_bytes': peak_bytes,
+        'top': [{'location': str(stat.traceback[0]), 'size_bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:max(1, int(limit))]],
+    }
+
+def run_diagnostic(action, params):
+    """Runs one diagnostic in this worker; returns collapsed-stack text for 'profile', a dict otherwise"""
+    if action == 'profile':
+        return run_sampling_profile(params.get('seconds', 10), params.get('interval_ms', PROFILE_DEFAULT_INTERVAL_MS), str(params.get('include_idle', '')).lower() in ('1', 'true', 'yes'))
+    if action == 'slow_requests':
+        return {'pid': os.getpid(), 'routes': slow_request_report()}
+    if action == 'memory_start':
+        if not tracemalloc.is_tracing(): tracemalloc.start(TRACEMALLOC_FRAMES)
+        return {'pid': os.getpid(), 'tracing': True}
+    if action == 'memory_stop':
+        tracemalloc.stop()
+        return {'pid': os.getpid(), 'tracing': False}
+    return tracemalloc_report(params.get('limit', 20))
+
+def diagnostics_path(name):
+    return os.path.join(DIAGNOSTICS_DIR, name)
+
+def registered_diagnostic_workers():
+    """Worker pids that installed the diagnostics handler and are still alive"""
+    try: names = os.listdir(DIAGNOSTICS_DIR)
+    except OSError: return []
+    pids = []
+    for name in names:
+        if not name.startswith('worker-') or not name[len('worker-'):].isdigit(): continue
+        pid = int(name[len('worker-'):])
+        try: os.kill(pid, 0)
+        except OSError:
+            try: os.remove(diagnostics_path(name))
+            except OSError: pass
+            continue
+        pids.append(pid)
+    return sorted(pids)
+
+def write_diagnostic_file(name, content):
+    temp_path = diagnostics_path(f".{name}.{os.getpid()}.tmp")
+    with open(temp_path, 'w') as f_diag: f_diag.write(content)
+    os.replace(temp_path, diagnostics_path(name))
+
+def process_pending_diagnostics():
+    """Claims and runs the diagnostic requests addressed to this worker"""
+    try: names = os.listdir(DIAGNOSTICS_DIR)
+    except OSError: return
+    for name in names:
+        if not name.endswith('.request.json'): continue
+        job_id = name[:-len('.request.json')]
+        try:
+            with open(diagnostics_path(name)) as f_req: job = json.load(f_req)
+            if job.get('pid') != os.getpid(): continue
+            os.replace(diagnostics_path(name), diagnostics_path(f"{job_id}.running"))
+        except (OSError, ValueError):
+            continue
+        try:
+            result = run_diagnostic(job['action'], job.get('params', {}))
+            if isinstance(result, str): write_diagnostic_file(f"{job_id}.collapsed", result)
+            else: write_diagnostic_file(f"{job_id}.json", json.dumps(result))
+        except Exception as e_diag:
+            logging.error(f"Diagnostics: Job {job_id} ({job.get('action')}) failed: {e_diag}", exc_info=True)
+            write_diagnostic_file(f"{job_id}.json", json.dumps({'pid': os.getpid(), 'error': str(e_diag)}))
+        finally:
+            try: os.remove(diagnostics_path(f"{job_id}.running"))
+            except OSError: pass
+
+def handle_diagnostics_signal(signum, frame):
+    # Signal handlers run on the main thread between bytecodes; the work itself happens on a helper thread
+    threading.Thread(target=process_pending_diagnostics, name='diagnostics', daemon=True).start()
+
+def install_diagnostics_signal_handler():
+    """Called from gunicorn's post_worker_init: registers this worker as a diagnostics target"""
+    os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+    signal.signal(DIAGNOSTICS_SIGNAL, handle_diagnostics_signal)
+    signal.siginterrupt(DIAGNOSTICS_SIGNAL, False)
+    write_diagnostic_file(f"worker-{os.getpid()}", str(time.time()))
+
+def dispatch_diagnostic(pid, action, params):
+    """Queues a diagnostic for another worker and signals it; returns the job id"""
+    cutoff = time.time() - DIAGNOSTICS_RESULT_TTL_S
+    for name in os.listdir(DIAGNOSTICS_DIR):
+        if name.endswith(('.json', '.collapsed')) and not name.endswith('.request.json'):
+            try:
+                if os.path.getmtime(diagnostics_path(name)) < cutoff: os.remove(diagnostics_path(name))
+            except OSError: pass
+    job_id = uuid.uuid4().hex
+    write_diagnostic_file(f"{job_id}.request.json", json.dumps({'pid': pid, 'action': action, 'params': params}))
+    os.kill(pid, DIAGNOSTICS_SIGNAL)
+    return job_id
+
+@app.route('/admin/workers')
+def admin_workers_route():
+    if 'allowed_user_type' not in session: return jsonify({"error": "Unauthorized"}), 401
+    if not is_admin_session(): return jsonify({"error": "Admin access required"}), 403
+    return jsonify({'pid': os.getpid(), 'workers': registered_diagnostic_workers(), 'actions': list(DIAGNOSTIC_ACTIONS)})
+
+@app.route('/admin/diagnostics/<action>', methods=['POST'])
+def admin_diagnostics_route(action):
+    """Runs profile / slow_requests / memory[_start|_stop] here, or queues it for the worker given as pid"""
+    if 'allowed_user_type' not in session: return jsonify({"error": "Unauthorized"}), 401
+    if not is_admin_session(): return jsonify({"error": "Admin access required"}), 403
+    if action not in DIAGNOSTIC_ACTIONS:
+        return jsonify({"error": f"Unknown action '{action}'", "actions": list(DIAGNOSTIC_ACTIONS)}), 400
+    params = {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
+    try:
+        target_pid = int(params.pop('pid', 0) or 0)
+        for key in ('seconds', 'interval_ms', 'limit'):
+            if key in params: params[key] = float(params[key])
+    except (TypeError, ValueError):
+        return jsonify({"error": "pid, seconds, interval_ms and limit must be numbers"}), 400
+    if target_pid and target_pid != os.getpid():
+        if target_pid not in registered_diagnostic_workers():
+            return jsonify({"error": f"No diagnostics-enabled worker with pid {target_pid}", "workers": registered_diagnostic_workers()}), 404
+        job_id = dispatch_diagnostic(target_pid, action, params)
+        logging.info(f"Diagnostics: Queued {action} for worker {target_pid} as job {job_id} by '{session.get('username')}'")
+        return jsonify({'job_id': job_id, 'pid': target_pid, 'status_url': url_for('admin_diagnostic_job_route', job_id=job_id)}), 202
+    result = run_diagnostic(action, params)
+    if isinstance(result, str):
+        return Response(result, mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename=profile-{os.getpid()}.collapsed'})
+    return jsonify(result)
+
+@app.route('/admin/diagnostics/jobs/<job_id>')
+def admin_diagnostic_job_route(job_id):
+    if 'allowed_user_type' not in session: return jsonify({"error": "Unauthorized"}), 401
+    if not is_admin_session(): return jsonify({"error": "Admin access required"}), 403
+    if not DIAGNOSTIC_JOB_ID_PATTERN.match(job_id): return jsonify({"error": "Invalid job id"}), 400
+    if os.path.exists(diagnostics_path(f"{job_id}.collapsed")):
+        with open(diagnostics_path(f"{job_id}.collapsed")) as f_result:
+            return Response(f_result.read(), mimetype='text/plain',
+                            headers={'Content-Disposition': f'attachment; filename=profile-{job_id}.collapsed'})
+    if os.path.exists(diagnostics_path(f"{job_id}.json")):
+        with open(diagnostics_path(f"{job_id}.json")) as f_result:
+            return Response(f_result.read(), mimetype='application/json')
+    if os.path.exists(diagnostics_path(f"{job_id}.request.json")) or os.path.exists(diagnostics_path(f"{job_id}.running")):
+        return jsonify({'job_id': job_id, 'status': 'pending'}), 202
+    return jsonify({"error": "Unknown or expired job"}), 404
+
 if __name__ == "__main__":
     init_db()
     app.run(debug=True, port=5001, host="0.0.0.0")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Migrate and bulk-load candidate accounts in users.db.
+
+`migrate` adds the password_hash column and a unique index on username, then hashes
+every legacy plaintext password in chunks (one transaction per chunk, so a stopped run
+simply continues where it left off) and clears the plaintext. `import` loads a CSV of
+username,password,allowed rows with the same salted hashing.
+
+Usage:
+    python manage_users.py migrate
+    python manage_users.py import candidates.csv --update
+    python manage_users.py migrate --db data/users.db --workers 8
+"""
+
+import argparse
+import csv
+import functools
+import logging
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Add current directory to path to import main module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from werkzeug.security import generate_password_hash
+
+
+def ensure_users_schema(conn):
+    """Adds password_hash and the username index; returns the duplicated usernames that block the index"""
+    columns = {row[1].lower() for row in conn.execute('PRAGMA table_info(users)')}
+    if not columns:
+        conn.execute('''
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                password TEXT NOT NULL,
+                allowed TEXT NOT NULL,
+                password_hash TEXT
+            )
+        ''')
+    elif 'password_hash' not in columns:
+        conn.execute('ALTER TABLE users ADD COLUMN password_hash TEXT')
+    duplicates = [row[0] for row in conn.execute('SELECT username FROM users GROUP BY username HAVING COUNT(*) > 1')]
+    if not duplicates:
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)')
+    conn.commit()
+    return duplicates
+
+
+def hash_passwords(passwords, executor):
+    hasher = functools.partial(generate_password_hash, method=main.PASSWORD_HASH_METHOD)
+    return list(executor.map(hasher, passwords, chunksize=16) if executor else map(hasher, passwords))
+
+
+def make_executor(workers):
+    # Hashing is CPU-bound and deliberately slow; processes spread it over cores
+    return ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+
+def migrate(db_path, chunk_size=500, workers=1):
+    conn = sqlite3.connect(db_path)
+    executor = make_executor(workers)
+    try:
+        duplicates = ensure_users_schema(conn)
+        if duplicates:
+            logging.error(f"Migrate: Duplicate usernames must be resolved first: {', '.join(duplicates[:20])}")
+            return None
+        migrated = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, password FROM users WHERE password_hash IS NULL AND password != '' ORDER BY id LIMIT ?", (chunk_size,)
+            ).fetchall()
+            if not rows: break
+            hashes = hash_passwords([password for _, password in rows], executor)
+            with conn:
+                conn.executemany("UPDATE users SET password_hash = ?, password = '' WHERE id = ?",
+                                 [(password_hash, user_id) for (user_id, _), password_hash in zip(rows, hashes)])
+            migrated += len(rows)
+            logging.info(f"Migrate: {migrated} passwords hashed (last id {rows[-1][0]})")
+        return migrated
+    finally:
+        if executor: executor.shutdown()
+        conn.close()
+
+
+def iter_csv_chunks(csv_path, chunk_size):
+    with open(csv_path, newline='', encoding='utf-8') as f_csv:
+        chunk = []
+        for line_num, record in enumerate(csv.DictReader(f_csv), start=2):
+            record = {key.strip().lower(): (value or '').strip() for key, value in record.items() if key}
+            if not record.get('username') or not record.get('password') or not record.get('allowed'):
+                logging.warning(f"Import: Skipping line {line_num}; username, password and allowed are required")
+                continue
+            chunk.append((record['username'], record['password'], record['allowed']))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk: yield chunk
+
+
+def import_users(db_path, csv_path, update=False, chunk_size=500, workers=1):
+    """Returns (inserted, updated, skipped)"""
+    conn = sqlite3.connect(db_path)
+    executor = make_executor(workers)
+    inserted = updated = skipped = 0
+    try:
+        duplicates = ensure_users_schema(conn)
+        if duplicates:
+            logging.error(f"Import: Duplicate usernames must be resolved first: {', '.join(duplicates[:20])}")
+            return None
+        for chunk in iter_csv_chunks(csv_path, chunk_size):
+            chunk = list({username: (username, password, allowed) for username, password, allowed in chunk}.values())
+            placeholders = ','.join('?' * len(chunk))
+            existing = {row[0] for row in conn.execute(f'SELECT username FROM users WHERE username IN ({placeholders})',
+                                                       [username for username, _, _ in chunk])}
+            if not update:
+                skipped += sum(1 for username, _, _ in chunk if username in existing)
+                chunk = [row for row in chunk if row[0] not in existing]
+            hashes = hash_passwords([password for _, password, _ in chunk], executor)
+            with conn:
+                conn.executemany('''
+                    INSERT INTO users (username, password, allowed, password_hash) VALUES (?, '', ?, ?)
+                    ON CONFLICT(username) DO UPDATE SET password = '', allowed = excluded.allowed, password_hash = excluded.password_hash
+                ''', [(username, allowed, password_hash) for (username, _, allowed), password_hash in zip(chunk, hashes)])
+            updated += sum(1 for username, _, _ in chunk if username in existing)
+            inserted += sum(1 for username, _, _ in chunk if username not in existing)
+            logging.info(f"Import: {inserted} inserted, {updated} updated, {skipped} skipped so far")
+        return inserted, updated, skipped
+    finally:
+        if executor: executor.shutdown()
+        conn.close()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate users.db to salted password hashes and bulk-import candidates.")
+    parser.add_argument('--db', default=main.USERS_DB_PATH, help="SQLite database with the users table")
+    parser.add_argument('--chunk-size', type=int, default=500, help="Rows hashed and committed per transaction")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes used for password hashing")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('migrate', help="Hash legacy plaintext passwords in place")
+    import_parser = subparsers.add_parser('import', help="Load username,password,allowed rows from a CSV file")
+    import_parser.add_argument('csv_path', help="CSV with a username,password,allowed header")
+    import_parser.add_argument('--update', action='store_true', help="Overwrite password and role of existing usernames")
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        if not os.path.exists(args.db):
+            logging.error(f"Database '{args.db}' not found.")
+            return 1
+        migrated = migrate(args.db, args.chunk_size, args.workers)
+        if migrated is None: return 1
+        print(f"Hashed {migrated} legacy passwords in {args.db}")
+        return 0
+    if not os.path.exists(args.csv_path):
+        logging.error(f"CSV file '{args.csv_path}' not found.")
+        return 1
+    result = import_users(args.db, args.csv_path, args.update, args.chunk_size, args.workers)
+    if result is None: return 1
+    print(f"Imported users into {args.db}: {result[0]} inserted, {result[1]} updated, {result[2]} skipped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI API used by load tests.
+
+Serves /v1/chat/completions (text, JSON mode, vision and SSE streaming) and
+/v1/audio/speech with configurable latency, so the app can be driven at load
+without network access or API cost. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+
+Usage:
+    python mock_openai_server.py --port 8089 --chat-latency 0.4 --token-delay 0.01
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCORE_CATEGORIES = ["Ideas", "Organization", "Accuracy", "Voice", "Grammar Usage and Sentence Fluency", "Stop words"]
+MOCK_QUESTIONS = [
+    "What was the most difficult decision you made in your last role?",
+    "How did you measure the impact of your work on the team?",
+    "Which skill from your resume are you most proud of developing?",
+    "How do you prioritise when several deadlines collide?",
+    "What did you learn from a project that did not go as planned?",
+    "How would your previous manager describe your working style?",
+    "Why is this the right next step in your career?",
+    "How do you keep up with developments in your field?",
+    "Describe how you handled a disagreement with a colleague?",
+    "What would you change about your last project if you could start again?",
+    "How do you explain complex ideas to non-specialists?",
+    "What motivates you to do your best work?",
+]
+MOCK_FEEDBACK = "Anchor the answer in one concrete example, state your own contribution and close with a measurable result."
+MOCK_AUDIO_CHUNK = b"\xff\xf3\x44\xc4" + b"\x00" * 1020  # silent MP3-ish frame, 1 KiB
+
+
+class MockSettings:
+    chat_latency = 0.3
+    vision_latency = 1.0
+    tts_latency = 0.5
+    token_delay = 0.0
+    tts_bytes = 24 * 1024
+    requests_served = 0
+    lock = threading.Lock()
+
+
+def message_text(messages):
+    parts = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(part.get('text', '') for part in content if isinstance(part, dict))
+    return "\n".join(parts)
+
+
+def has_image(messages):
+    return any(isinstance(m.get('content'), list) and any(p.get('type') == 'image_url' for p in m['content'] if isinstance(p, dict))
+               for m in messages)
+
+
+def build_chat_reply(body):
+    """A plausible reply for whichever app prompt this is, so parsing/validation paths behave as in production"""
+    messages = body.get('messages', [])
+    prompt = message_text(messages)
+    if has_image(messages):
+        return "I can see you have a tidy workspace behind you; how do you usually organise your day before an interview?"
+    if (body.get('response_format') or {}).get('type') == 'json_object':
+        scores = {category: {"score": 7, "justification": "Mock justification."} for category in SCORE_CATEGORIES}
+        item_ids = [int(i) for i in re.findall(r'^ID (\d+)$', prompt, re.MULTILINE)]
+        if item_ids:
+            return json.dumps({"results": [{"id": i, "scores": scores, "feedback": MOCK_FEEDBACK} for i in item_ids]})
+        return json.dumps({
+            "reply": "Thank you for sharing that example.",
+            "scores": scores,
+            "feedback": MOCK_FEEDBACK,
+            "follow_up": "What would you do differently if you faced that situation again?",
+            "headline": "Analyst with several years of client-facing experience",
+            "experience": ["Analyst, Example Corp, 2020-2024"],
+            "education": ["MBA, Example University"],
+            "skills": ["Financial modelling", "Stakeholder management"],
+            "achievements": ["Reduced reporting time by 30%"],
+        })
+    if "Category:" in prompt:
+        return "\n".join(f"Category: {category} (7/10)\nJustification: Mock justification for {category.lower()}." for category in SCORE_CATEGORIES)
+    if re.search(r'numbered list|\d+-\d+ unique', prompt, re.IGNORECASE):
+        return "\n".join(f"{i}. {q}" for i, q in enumerate(MOCK_QUESTIONS, 1))
+    if prompt.rstrip().endswith("Feedback:"):
+        return MOCK_FEEDBACK
+    return "Thank you, that is a clear and well-structured answer."
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        with MockSettings.lock:
+            MockSettings.requests_served += 1
+        try:
+            body = self.read_json()
+        except ValueError:
+            self.send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+        if self.path.endswith('/chat/completions'):
+            self.handle_chat(body)
+        elif self.path.endswith('/audio/speech'):
+            self.handle_speech()
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def handle_chat(self, body):
+        reply = build_chat_reply(body)
+        tokens = reply.split(' ')
+        time.sleep(MockSettings.vision_latency if has_image(body.get('messages', [])) else MockSettings.chat_latency)
+        model = body.get('model', 'gpt-4o-mini')
+        usage = {"prompt_tokens": len(message_text(body.get('messages', []))) // 4, "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if body.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for index, token in enumerate(tokens):
+                delta = {"content": token if index == 0 else f" {token}"}
+                self.write_chunk(f"data: {json.dumps({'id': 'mock', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n".encode())
+                time.sleep(MockSettings.token_delay)
+            self.write_chunk(f"data: {json.dumps({'id': 'mock', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n".encode())
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+            return
+        time.sleep(MockSettings.token_delay * len(tokens))
+        self.send_json(200, {
+            "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def handle_speech(self):
+        time.sleep(MockSettings.tts_latency)
+        chunks = max(1, MockSettings.tts_bytes // len(MOCK_AUDIO_CHUNK))
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(chunks * len(MOCK_AUDIO_CHUNK)))
+        self.end_headers()
+        for _ in range(chunks):
+            self.wfile.write(MOCK_AUDIO_CHUNK)
+            time.sleep(MockSettings.token_delay)
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_mock_server(port=0, chat_latency=0.3, vision_latency=1.0, tts_latency=0.5, token_delay=0.0):
+    """Starts the mock in a daemon thread; returns (server, base_url)"""
+    MockSettings.chat_latency, MockSettings.vision_latency = chat_latency, vision_latency
+    MockSettings.tts_latency, MockSettings.token_delay = tts_latency, token_delay
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockOpenAIHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='mock-openai').start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI chat, vision and TTS endpoints.")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--chat-latency', type=float, default=0.3, help="Seconds before a chat reply starts")
+    parser.add_argument('--vision-latency', type=float, default=1.0, help="Seconds before a vision reply starts")
+    parser.add_argument('--tts-latency', type=float, default=0.5, help="Seconds before TTS audio starts")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Seconds per generated token / audio chunk")
+    args = parser.parse_args()
+    server, base_url = start_mock_server(args.port, args.chat_latency, args.vision_latency, args.tts_latency, args.token_delay)
+    print(f"Mock OpenAI API listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Re-score stored interview answers after a change to WEIGHTS_EVAL or the scoring prompt.
+
+Rows are streamed from the `evaluations` table in id order, one chunk at a time,
+scored with bounded concurrency, and written to a versioned results table
+(evaluations_rescored_v<version>). Progress is checkpointed after every chunk,
+so an interrupted run resumes where it stopped.
+
+Usage:
+    python rescore_evaluations.py --version 2
+    python rescore_evaluations.py --version 2 --mock --chunk-size 1000
+    python rescore_evaluations.py --version 3 --batch --concurrency 2
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Add current directory to path to import main module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main
+
+
+def results_table_name(version):
+    return f"evaluations_rescored_v{int(version)}"
+
+
+def ensure_tables(conn, version):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {results_table_name(version)} (
+            evaluation_id INTEGER PRIMARY KEY,
+            evaluation TEXT,
+            score REAL,
+            feedback TEXT,
+            scorer TEXT,
+            weights TEXT,
+            rescored_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rescore_checkpoints (
+            version INTEGER PRIMARY KEY,
+            last_id INTEGER,
+            rows_done INTEGER,
+            updated_at TEXT
+        )
+    ''')
+    conn.commit()
+
+
+def load_checkpoint(conn, version):
+    row = conn.execute('SELECT last_id, rows_done FROM rescore_checkpoints WHERE version = ?', (version,)).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def iter_evaluation_chunks(conn, start_after_id, chunk_size, limit=None):
+    """Keyset pagination over evaluations so only one chunk is held in memory"""
+    last_id, yielded = start_after_id, 0
+    while limit is None or yielded < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - yielded)
+        rows = conn.execute(
+            'SELECT id, question, answer, username FROM evaluations WHERE id > ? ORDER BY id LIMIT ?', (last_id, size)
+        ).fetchall()
+        if not rows: return
+        yield rows
+        last_id = rows[-1][0]
+        yielded += len(rows)
+
+
+def mock_scorer(question, answer, job_description):
+    return main.fallback_ai_evaluation(question or '', answer or '')
+
+
+def score_row(scorer, row, job_description):
+    # Re-scoring runs in the batch class so it never holds LLM slots a live interview is waiting for
+    with main.llm_priority('batch'):
+        return scorer(row[1] or '', row[2] or '', job_description)
+
+
+def score_chunk(rows, executor, use_batch, use_mock, job_description):
+    """Returns [(evaluation_id, evaluation, score, feedback)] for a chunk"""
+    if use_batch and not use_mock:
+        items = [{'question': question or '', 'answer': answer or ''} for _, question, answer, _ in rows]
+        with main.llm_priority('batch'):
+            results = main.batch_evaluate_answers(items, job_description, include_scores=True)
+        return [(row[0], result['evaluation'], result['score'], result['feedback']) for row, result in zip(rows, results)]
+    scorer = mock_scorer if use_mock else main.evaluate_response_with_ai_scoring
+    scored = executor.map(lambda row: score_row(scorer, row, job_description), rows)
+    return [(row[0], evaluation, score, None) for row, (evaluation, score) in zip(rows, scored)]
+
+
+def rescore(db_path, version, chunk_size=500, concurrency=4, use_mock=False, use_batch=False, limit=None, restart=False,
+            job_description="Interview Candidate"):
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_tables(conn, version)
+        last_id, rows_done = (0, 0) if restart else load_checkpoint(conn, version)
+        if last_id:
+            logging.info(f"Rescore v{version}: Resuming after evaluation id {last_id} ({rows_done} rows already done)")
+        scorer_name = 'mock' if use_mock else ('batch' if use_batch else 'ai_scoring')
+        weights_json = json.dumps(main.WEIGHTS_EVAL, sort_keys=True)
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            for rows in iter_evaluation_chunks(conn, last_id, chunk_size, limit):
+                scored = score_chunk(rows, executor, use_batch, use_mock, job_description)
+                now = datetime.now().isoformat()
+                with conn:
+                    conn.executemany(
+                        f'INSERT OR REPLACE INTO {results_table_name(version)} '
+                        f'(evaluation_id, evaluation, score, feedback, scorer, weights, rescored_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        [(eval_id, evaluation, score, feedback, scorer_name, weights_json, now) for eval_id, evaluation, score, feedback in scored]
+                    )
+                    rows_done += len(rows)
+                    conn.execute(
+                        'INSERT OR REPLACE INTO rescore_checkpoints (version, last_id, rows_done, updated_at) VALUES (?, ?, ?, ?)',
+                        (version, rows[-1][0], rows_done, now)
+                    )
+                elapsed = max(time.time() - started, 1e-6)
+                logging.info(f"Rescore v{version}: {rows_done} rows done (last id {rows[-1][0]}, {len(rows) / elapsed:.1f} rows/s this run)")
+                started = time.time()
+        return rows_done
+    finally:
+        conn.close()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score stored interview evaluations into a versioned table.")
+    parser.add_argument('--db', default='interview_data.db', help="SQLite database with the evaluations table")
+    parser.add_argument('--version', type=int, required=True, help="Result version; rows go to evaluations_rescored_v<version>")
+    parser.add_argument('--chunk-size', type=int, default=500, help="Rows read, scored and committed per chunk")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent scoring calls within a chunk")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this many rows in this run")
+    parser.add_argument('--mock', action='store_true', help="Use the local fallback scorer instead of OpenAI")
+    parser.add_argument('--batch', action='store_true', help="Score each chunk with the batched evaluator")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and start from the first row")
+    parser.add_argument('--job-description', default="Interview Candidate", help="Role context passed to the scorer")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        logging.error(f"Database '{args.db}' not found.")
+        return 1
+    try:
+        rows_done = rescore(args.db, args.version, args.chunk_size, args.concurrency, args.mock, args.batch,
+                            args.limit, args.restart, args.job_description)
+    except sqlite3.Error as e_rescore_db:
+        logging.error(f"Rescore failed: {e_rescore_db}", exc_info=True)
+        return 1
+    print(f"Re-scored {rows_done} evaluations into {results_table_name(args.version)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
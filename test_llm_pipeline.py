@@ -0,0 +1,668 @@
+#!/usr/bin/env python3
+"""
+Test script for the LLM call path, using a local stand-in for the OpenAI client
+"""
+
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+# Add current directory to path to import main module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main
+
+
+class FakeCompletions:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.replies.pop(0) if self.replies else "Fake reply."
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20)
+        )
+
+
+class FakeClient:
+    def __init__(self, replies=()):
+        self.completions = FakeCompletions(replies)
+        self.chat = SimpleNamespace(completions=self.completions)
+
+    def with_options(self, **kwargs):
+        return self
+
+
+def use_fake_client(monkeypatch, replies=()):
+    fake = FakeClient(replies)
+    monkeypatch.setattr(main, 'client', fake)
+    return fake
+
+
+def test_task_policy_sets_model_and_token_cap(monkeypatch):
+    fake = use_fake_client(monkeypatch, ["That is a clear answer."])
+    monkeypatch.setitem(main.LLM_TASK_POLICIES, 'ack', {'provider': 'openai', 'model': 'gpt-4o-mini', 'max_tokens': 30})
+    reply = main.generate_conversational_reply("I led a team of five on a pricing project.", "mba")
+    assert reply == "That is a clear answer."
+    assert fake.completions.calls[0]['model'] == 'gpt-4o-mini'
+    assert fake.completions.calls[0]['max_tokens'] == 30
+    assert main.get_llm_task_stats()['ack']['prompt_tokens'] >= 100
+
+
+def test_local_route_skips_api(monkeypatch):
+    fake = use_fake_client(monkeypatch)
+    monkeypatch.setitem(main.LLM_TASK_POLICIES, 'ack', {'provider': 'local'})
+    reply = main.generate_conversational_reply("Short answer.", "bank")
+    assert reply
+    assert fake.completions.calls == []
+
+
+def combined_payload(**overrides):
+    payload = {
+        "reply": "Thanks for walking me through that project.",
+        "scores": {category: {"score": 7, "justification": "Clear."} for category in main.WEIGHTS_EVAL},
+        "feedback": "Quantify the outcome of the project and describe your own role more specifically.",
+        "follow_up": "What would you do differently if you ran that project again?"
+    }
+    payload.update(overrides)
+    return payload
+
+
+def test_combined_mode_returns_all_artifacts_in_one_call(monkeypatch):
+    fake = use_fake_client(monkeypatch, [json.dumps(combined_payload())])
+    artifacts = main.generate_combined_answer_artifacts(
+        "Tell me about a project you led?", "I led a pricing project for a retail team.", "MBA Candidate", "mba", "resume", True
+    )
+    assert len(fake.completions.calls) == 1
+    assert fake.completions.calls[0]['response_format'] == {"type": "json_object"}
+    assert artifacts['follow_up'].endswith('?')
+    evaluation, score = main.finalize_ai_scoring(artifacts['scores'], "I led a pricing project for a retail team.")
+    assert 0 < score <= 10
+    assert evaluation.startswith("[AI Detailed Scoring Complete]")
+
+
+def test_combined_deadline_miss_uses_local_follow_up(monkeypatch, tmp_path):
+    monkeypatch.setattr(main.app, 'session_interface', main.StoreSessionInterface(lambda: main.SQLiteSessionStore(str(tmp_path / 'sessions.db'))))
+    monkeypatch.setattr(main, 'ADMISSION_DB_PATH', str(tmp_path / 'admission.db'))
+    use_fake_client(monkeypatch)
+    tasks = []
+
+    def past_deadline(prompt_messages, task=None, **kwargs):
+        tasks.append(task)
+        return main.DEADLINE_EXCEEDED_RESPONSE
+    monkeypatch.setattr(main, 'get_openai_response_generic', past_deadline)
+    local_follow_up = "What would you change if you ran that pricing project again?"
+    monkeypatch.setattr(main, 'get_fallback_questions_from_pdf', lambda job_type, track: [local_follow_up])
+    monkeypatch.setattr(main, 'interview_context', dict(main.interview_context_template, questions_list=["Tell me about a project you led."],
+                                                        current_q_idx=0, questions_already_asked=set(), previous_answers_list=[],
+                                                        scores_list=[], current_interview_track='resume'))
+    monkeypatch.setattr(main, 'qna_evaluations', [])
+    app_client = main.app.test_client()
+    with app_client.session_transaction() as sess:
+        sess['allowed_user_type'] = 'MBA'
+        sess['username'] = 'tester'
+
+    reply = app_client.post('/submit_answer', json={'answer': 'I led a pricing project for a retail team of five.'}).get_json()
+    # One combined call missed its deadline; the follow-up came from the local questions, not a second round trip
+    assert tasks == ['combined']
+    assert reply['current_question'] == local_follow_up
+
+
+def test_combined_mode_rejects_incomplete_schema():
+    payload = combined_payload()
+    del payload['scores']['Voice']
+    assert main.validate_combined_artifacts(payload, True) is None
+    assert main.validate_combined_artifacts(combined_payload(feedback="Too short."), True) is None
+    assert main.validate_combined_artifacts(combined_payload(), False)['follow_up'] is None
+
+
+def test_batch_evaluation_chunks_by_token_budget(monkeypatch):
+    items = [{"question": f"Question {i} about your leadership experience?", "answer": "I led a team project that improved results. " * 5} for i in range(4)]
+    feedback = "Add a concrete metric and explain your personal contribution in more detail."
+    replies = [
+        json.dumps({"results": [{"id": 0, "scores": combined_payload()["scores"], "feedback": feedback},
+                                {"id": 1, "scores": combined_payload()["scores"], "feedback": feedback}]}),
+        json.dumps({"results": [{"id": 2, "scores": combined_payload()["scores"], "feedback": feedback}]}),
+    ]
+    fake = use_fake_client(monkeypatch, replies)
+    budget = 2 * (main.estimate_tokens(items[0]["question"]) + main.estimate_tokens(items[0]["answer"])
+                  + main.BATCH_EVAL_FEEDBACK_TOKENS + main.BATCH_EVAL_SCORES_TOKENS)
+    results = main.batch_evaluate_answers(items, "Bank Candidate", include_scores=True, token_budget=budget)
+    assert len(fake.completions.calls) >= 2
+    assert [r["feedback"] for r in results[:3]] == [feedback] * 3
+    assert all(0 < r["score"] <= 10 for r in results)
+    # Item 3 was omitted from the batch replies and went through the single-item fallbacks
+    assert results[3]["feedback"]
+
+
+def test_fill_missing_feedback_only_touches_missing(monkeypatch):
+    use_fake_client(monkeypatch, [json.dumps({"results": [{"id": 0, "feedback": "Structure the answer around one example and state the result clearly."}]})])
+    evaluations = [{"question": "Q1?", "answer": "A1", "feedback": "Existing."}, {"question": "Q2?", "answer": "A2"}]
+    main.fill_missing_feedback(evaluations, "MBA Candidate")
+    assert evaluations[0]["feedback"] == "Existing."
+    assert evaluations[1]["feedback"].startswith("Structure the answer")
+
+
+def test_resume_summary_is_cached_and_reused(monkeypatch):
+    summary_reply = json.dumps({"headline": "Analyst with 3 years in retail banking", "experience": ["Credit analyst, XYZ Bank, 2021-2024"],
+                                "education": ["B.Com, Delhi University"], "skills": ["Excel"], "achievements": ["Cut loan turnaround by 20%"]})
+    questions_reply = "\n".join(f"{i}. What did you learn from credit analysis project number {i}?" for i in range(1, 7))
+    fake = use_fake_client(monkeypatch, [summary_reply, questions_reply, questions_reply])
+    resume_text = "Credit Analyst at XYZ Bank 2021-2024\n" + "Responsible for many routine tasks.\n" * 2000
+    first = main.generate_resume_questions(resume_text, 'bank', set())
+    second = main.generate_resume_questions(resume_text, 'bank', set())
+    assert len(first) >= 5 and len(second) >= 5
+    task_names = [call.get('response_format') is not None for call in fake.completions.calls]
+    assert task_names == [True, False, False]  # one summary call, then two question calls
+    question_prompt = fake.completions.calls[1]['messages'][0]['content']
+    assert "Cut loan turnaround by 20%" in question_prompt
+    assert main.estimate_tokens(question_prompt) < main.estimate_tokens(resume_text) // 10
+
+
+def test_truncate_to_tokens_respects_budget():
+    text = "First sentence here. Second sentence follows. " * 100
+    truncated = main.truncate_to_tokens(text, 50)
+    assert main.estimate_tokens(truncated) <= 50
+    assert truncated.endswith('.')
+
+
+def test_truncate_to_tokens_cuts_unpunctuated_text(monkeypatch):
+    text = 'word ' * 500
+    truncated = main.truncate_to_tokens(text, 50)
+    assert truncated.startswith('word word') and main.estimate_tokens(truncated) <= 50
+
+    class CharacterEncoding:
+        def encode(self, text, disallowed_special=()): return [ord(character) for character in text]
+        def decode(self, tokens): return ''.join(chr(token) for token in tokens)
+    monkeypatch.setattr(main, 'token_encoding_state', {'encoding': CharacterEncoding(), 'unavailable': True})
+    assert main.truncate_to_tokens(text, 50) == ('word ' * 10).strip()
+
+
+def test_deadline_returns_fallback_and_caches_late_result(monkeypatch):
+    release = threading.Event()
+    fake = use_fake_client(monkeypatch, ["Late but thoughtful feedback about structuring the answer with one clear example."])
+    original_create = fake.completions.create
+
+    def slow_create(**kwargs):
+        release.wait(5)
+        return original_create(**kwargs)
+
+    monkeypatch.setattr(fake.completions, 'create', slow_create)
+    monkeypatch.setitem(main.LLM_TASK_POLICIES, 'feedback', {'provider': 'openai', 'model': 'gpt-4o-mini', 'max_tokens': 160, 'deadline_s': 0.2})
+    started = time.perf_counter()
+    first = main.generate_answer_feedback("Why banking?", "Because I like finance.", "Bank Candidate")
+    assert time.perf_counter() - started < 2
+    assert first == main.fallback_answer_feedback("Because I like finance.")
+    release.set()
+    for _ in range(50):
+        if main.late_llm_results: break
+        time.sleep(0.05)
+    second = main.generate_answer_feedback("Why banking?", "Because I like finance.", "Bank Candidate")
+    assert second.startswith("Late but thoughtful feedback")
+    assert len(fake.completions.calls) == 1
+
+
+def test_followup_picks_best_candidate_from_single_call(monkeypatch):
+    reply = "\n".join([
+        "1. Why banking?",
+        "2. Tell me about yourself?",
+        "3. How did you measure the impact of the loan turnaround changes you introduced?",
+        "4. Why",
+    ])
+    fake = use_fake_client(monkeypatch, [reply])
+    asked = {main.normalize_text("Why banking?")}
+    follow_up = main.generate_next_question(
+        "Describe a process you improved.", "I redesigned our loan turnaround process and cut approval time by twenty percent.",
+        7, 'resume', 'bank', asked
+    )
+    assert len(fake.completions.calls) == 1
+    assert follow_up == "How did you measure the impact of the loan turnaround changes you introduced?"
+
+
+def test_paraphrased_question_is_near_duplicate():
+    asked = {main.normalize_text(q) for q in ["Tell me about a time you led a team?", "Why do you want to join our bank?"]}
+    assert main.find_near_duplicate("Describe a time when you were leading a team?", asked) == "tell me about a time you led a team?"
+    assert main.is_question_asked("Why did you want to join this bank?", asked)
+    assert not main.is_question_asked("How do you assess credit risk for a small business loan?", asked)
+    assert main.nearest_asked_questions("team leadership project", asked, k=1) == ["tell me about a time you led a team?"]
+
+
+def test_question_pool_refills_and_draws(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'QUESTION_POOL_DB_PATH', str(tmp_path / 'pool.db'))
+    monkeypatch.setattr(main, 'QUESTION_POOL_TARGET', 4)
+    monkeypatch.setattr(main, 'QUESTION_POOL_LOW_WATERMARK', 3)
+    topics = ["credit scoring models", "branch customer complaints", "liquidity coverage ratios", "loan recovery strategies", "digital payment fraud"]
+    use_fake_client(monkeypatch, ["\n".join(f"{i}. How would you approach {topic} in a retail bank?" for i, topic in enumerate(topics, 1))])
+    assert main.refill_question_pool('bank', 'bank_type', 'retail') == 4
+    assert main.question_pool_size('bank', 'bank_type', 'retail') == 4
+
+    scheduled = []
+    monkeypatch.setattr(main, 'schedule_question_pool_refill', lambda *key: scheduled.append(key))
+    asked = {main.normalize_text("How would you approach credit scoring models in a retail bank?")}
+    drawn = main.draw_pool_questions('bank', 'bank_type', 'retail', 2, asked)
+    assert len(drawn) == 2
+    assert not any(main.is_question_asked(q, asked) for q in drawn)
+    assert main.question_pool_size('bank', 'bank_type', 'retail') == 2
+    assert scheduled == [('bank', 'bank_type', 'retail')]
+
+
+def test_start_interview_attaches_prepared_resume(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'client', None)
+    monkeypatch.setattr(main, 'QUESTION_POOL_DB_PATH', str(tmp_path / 'pool.db'))
+    monkeypatch.setattr(main, 'extract_resume_text', lambda path: "Credit Analyst at XYZ Bank 2021-2024")
+    prepared_qs = ["What did you learn as a credit analyst at XYZ Bank?", "How did you reduce loan turnaround time?"]
+    monkeypatch.setattr(main, 'generate_resume_questions', lambda text, job_type, asked: list(prepared_qs))
+    app_client = main.app.test_client()
+    with app_client.session_transaction() as sess:
+        sess['allowed_user_type'] = 'Banking'
+        sess['username'] = 'tester'
+
+    upload = app_client.post('/upload_resume', data={'resume': (io.BytesIO(b'%PDF-1.4'), 'resume.pdf')}, content_type='multipart/form-data')
+    resume_id = upload.get_json()['resume_id']
+    assert main.get_resume_prep_result(resume_id, 'tester', 'bank', wait_seconds=5)[0] is not None
+    monkeypatch.setattr(main, 'generate_resume_questions', lambda *args: pytest.fail("questions regenerated at start"))
+    started = app_client.post('/start_interview', data={'resume_id': resume_id, 'interview_track': 'bank_type', 'sub_track': 'retail', 'mode': 'text'})
+    assert started.status_code == 200
+    assert main.interview_context['generated_resume_questions_cache'] == prepared_qs
+    assert app_client.get(f'/upload_resume/{resume_id}').get_json()['ready'] is True
+
+
+def test_prepared_resume_is_shared_across_workers(monkeypatch, tmp_path):
+    sessions_db = str(tmp_path / 'sessions.db')
+    monkeypatch.setattr(main.app, 'session_interface', main.StoreSessionInterface(lambda: main.SQLiteSessionStore(sessions_db)))
+    monkeypatch.setattr(main, 'ADMISSION_DB_PATH', str(tmp_path / 'admission.db'))
+    monkeypatch.setattr(main, 'client', None)
+    monkeypatch.setattr(main, 'QUESTION_POOL_DB_PATH', str(tmp_path / 'pool.db'))
+    monkeypatch.setattr(main, 'extract_resume_text', lambda path: "Credit Analyst at XYZ Bank 2021-2024")
+    prepared_qs = ["What did you learn as a credit analyst at XYZ Bank?", "How did you reduce loan turnaround time?"]
+    monkeypatch.setattr(main, 'generate_resume_questions', lambda text, job_type, asked: list(prepared_qs))
+    app_client = main.app.test_client()
+    with app_client.session_transaction() as sess:
+        sess['allowed_user_type'] = 'Banking'
+        sess['username'] = 'tester'
+
+    upload = app_client.post('/upload_resume', data={'resume': (io.BytesIO(b'%PDF-1.4'), 'resume.pdf')}, content_type='multipart/form-data')
+    resume_id = upload.get_json()['resume_id']
+    assert main.get_resume_prep_result(resume_id, 'tester', 'bank', wait_seconds=5)[0] is not None
+
+    # Another worker: no local future and its own store connection over the same database
+    monkeypatch.setattr(main, 'resume_prep_jobs', {})
+    monkeypatch.setattr(main.app, 'session_interface', main.StoreSessionInterface(lambda: main.SQLiteSessionStore(sessions_db)))
+    monkeypatch.setattr(main, 'generate_resume_questions', lambda *args: pytest.fail("questions regenerated at start"))
+    assert app_client.get(f'/upload_resume/{resume_id}').get_json() == {'ready': True, 'question_count': 2}
+    assert main.get_resume_prep_result(resume_id, 'someone_else', 'bank')[1] is False
+    started = app_client.post('/start_interview', data={'resume_id': resume_id, 'interview_track': 'bank_type', 'sub_track': 'retail', 'mode': 'text'})
+    assert started.status_code == 200
+    assert main.interview_context['generated_resume_questions_cache'] == prepared_qs
+
+
+def test_metrics_endpoint_exposes_llm_histograms(monkeypatch):
+    use_fake_client(monkeypatch, ["That is a clear answer."])
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    main.generate_conversational_reply("I led a team of five on a pricing project.", "mba")
+    main.decode_frame_bytes(b'not a jpeg')
+    body = main.app.test_client().get('/metrics').get_data(as_text=True)
+    assert 'interviewer_llm_request_seconds_count{task="ack"}' in body
+    assert 'interviewer_frame_decode_seconds_count' in body
+
+    # Without METRICS_TOKEN the endpoint fails closed for external and proxied requests
+    monkeypatch.setattr(main, 'METRICS_TOKEN', None)
+    app_client = main.app.test_client()
+    assert app_client.get('/metrics', environ_base={'REMOTE_ADDR': '8.8.8.8'}).status_code == 404
+    assert app_client.get('/metrics', headers={'X-Forwarded-For': '8.8.8.8'}).status_code == 404
+    assert app_client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.3.4'}).status_code == 404
+    assert app_client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 200
+    monkeypatch.setattr(main, 'METRICS_TOKEN', 'scrape-token')
+    assert app_client.get('/metrics').status_code == 401
+    assert app_client.get('/metrics', environ_base={'REMOTE_ADDR': '8.8.8.8'},
+                          headers={'Authorization': 'Bearer scrape-token'}).status_code == 200
+
+
+def test_request_spans_share_request_id(monkeypatch):
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(main, 'tracer', provider.get_tracer('test'))
+    use_fake_client(monkeypatch, ["Thanks for that detailed explanation."])
+
+    # Run the request hooks around a direct call, as Flask would around a view
+    with main.app.test_request_context('/submit_answer', method='POST', headers={'X-Request-ID': 'req-123'}):
+        main.app.preprocess_request()
+        main.generate_conversational_reply("I led a team of five on a pricing project.", "mba")
+        response = main.app.process_response(main.app.response_class("ok"))
+        main.app.do_teardown_request()
+    assert response.headers['X-Request-ID'] == 'req-123'
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert {'POST /submit_answer', 'llm.request', 'openai.chat'} <= set(spans)
+    assert spans['openai.chat'].attributes['request.id'] == 'req-123'
+    assert spans['openai.chat'].attributes['llm.prompt_tokens'] == 100
+    assert spans['openai.chat'].context.trace_id == spans['POST /submit_answer'].context.trace_id
+
+
+def test_json_logs_carry_request_id_and_frame_logs_are_sampled(monkeypatch, tmp_path):
+    log_path = tmp_path / 'app.log'
+    monkeypatch.setattr(main, 'LOG_FORMAT', 'json')
+    monkeypatch.setattr(main, 'LOG_FILE', str(log_path))
+    monkeypatch.setattr(main, 'LOG_LEVEL', 'DEBUG')
+    monkeypatch.setattr(main, 'FRAME_LOG_SAMPLE_EVERY', 10)
+    monkeypatch.setattr(main, 'frame_log_counter', 0)
+    try:
+        main.setup_logging()
+        with main.app.test_request_context('/analyze_visuals', method='POST', headers={'X-Request-ID': 'req-log'}):
+            main.app.preprocess_request()
+            logging.info("Frame batch %d analyzed", 7)
+            assert sum(main.should_log_frame() for _ in range(30)) == 3
+            main.app.do_teardown_request()
+        main.stop_logging()
+        entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+    finally:
+        monkeypatch.undo()
+        main.setup_logging()
+    entry = next(e for e in entries if e['message'] == "Frame batch 7 analyzed")
+    assert entry['level'] == 'INFO'
+    assert entry['request_id'] == 'req-log'
+
+
+def test_admin_profile_returns_collapsed_stacks(monkeypatch):
+    def busy_loop(stop):
+        while not stop.is_set():
+            sum(i * i for i in range(1000))
+
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name='busy')
+    worker.start()
+    app_client = main.app.test_client()
+    with app_client.session_transaction() as sess:
+        sess['allowed_user_type'] = 'MBA'
+        sess['username'] = 'candidate'
+    assert app_client.post('/admin/diagnostics/profile').status_code == 403
+
+    monkeypatch.setattr(main, 'ADMIN_USERS', {'candidate'})
+    try:
+        response = app_client.post('/admin/diagnostics/profile', json={'seconds': 0.3, 'interval_ms': 2})
+    finally:
+        stop.set()
+        worker.join()
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    busy_line = next(line for line in lines if line.startswith('busy;'))
+    stack, count = busy_line.rsplit(' ', 1)
+    assert 'busy_loop (test_llm_pipeline.py:' in stack
+    assert int(count) > 10
+    report = app_client.post('/admin/diagnostics/slow_requests').get_json()
+    assert report['routes']['/admin/diagnostics/<action>'][0]['duration_ms'] >= 300
+
+
+def test_session_survives_worker_switch_and_key_rotation(monkeypatch, tmp_path):
+    def reload_keys():
+        monkeypatch.setattr(main, 'session_keyring_state', {'keys': [], 'mtime': None, 'checked_at': 0.0})
+
+    def new_worker_interface():
+        return main.StoreSessionInterface(lambda: main.SQLiteSessionStore(str(tmp_path / 'sessions.db')))
+
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    monkeypatch.setattr(main, 'SESSION_KEYRING_FILE', str(tmp_path / 'session_keyring.json'))
+    monkeypatch.setattr(main, 'ADMISSION_DB_PATH', str(tmp_path / 'admission.db'))
+    monkeypatch.setattr(main, 'authenticate_user', lambda username, password: 'MBA')
+    monkeypatch.setattr(main.app, 'session_interface', new_worker_interface())
+    reload_keys()
+    app_client = main.app.test_client()
+    assert app_client.post('/login', data={'username': 'candidate', 'password': 'pw'}).get_json()['success']
+    # LLM routing, cost and rate-limit details are for admins only
+    assert app_client.get('/llm_stats').status_code == 403
+    monkeypatch.setattr(main, 'ADMIN_USERS', {'candidate'})
+    assert app_client.get('/llm_stats').status_code == 200
+
+    # Another worker: fresh interface, store connection and key cache, same shared keyring and store
+    monkeypatch.setattr(main.app, 'session_interface', new_worker_interface())
+    reload_keys()
+    assert app_client.get('/waiting_room').status_code == 200
+
+    main.rotate_session_keyring(keep=2)
+    reload_keys()
+    assert app_client.get('/waiting_room').status_code == 200
+    main.rotate_session_keyring(keep=2)
+    reload_keys()
+    assert app_client.get('/waiting_room').status_code == 401
+
+
+def test_login_issues_a_new_session_id(monkeypatch, tmp_path):
+    store = main.SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    monkeypatch.setattr(main, 'SESSION_KEYRING_FILE', str(tmp_path / 'session_keyring.json'))
+    monkeypatch.setattr(main.app, 'session_interface', main.StoreSessionInterface(lambda: store))
+    monkeypatch.setattr(main, 'authenticate_user', lambda username, password: 'MBA')
+    signer = main.app.session_interface.signer()
+    # The attacker gets a session of their own and plants its cookie in the victim's browser
+    planted_sid = 'planted' + main.uuid.uuid4().hex
+    store.setex(main.SESSION_KEY_PREFIX + planted_sid, 600, main.app.session_interface.serializer.dumps({'lang': 'en'}))
+    victim = main.app.test_client()
+    victim.set_cookie('session', signer.sign(planted_sid).decode())
+    assert victim.post('/login', data={'username': 'candidate', 'password': 'pw'}).get_json()['success']
+    new_sid = signer.unsign(victim.get_cookie('session').value).decode()
+    assert new_sid != planted_sid and store.get(main.SESSION_KEY_PREFIX + planted_sid) is None
+    attacker = main.app.test_client()
+    attacker.set_cookie('session', signer.sign(planted_sid).decode())
+    assert attacker.get('/llm_stats').status_code == 401
+
+
+def test_importing_main_writes_no_session_keyring(tmp_path):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    env.pop('SECRET_KEY', None)
+    env.pop('SESSION_KEYRING_FILE', None)
+    subprocess.run([sys.executable, '-c', 'import main'], cwd=tmp_path, env=env, check=True, capture_output=True, timeout=120)
+    assert not any(name.startswith('session_keyring') for name in os.listdir(tmp_path))
+
+
+def test_waiting_room_admits_in_fifo_order(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'ADMISSION_DB_PATH', str(tmp_path / 'admission.db'))
+    monkeypatch.setattr(main, 'MAX_ACTIVE_INTERVIEWS', 1)
+    assert main.request_interview_admission('first') is None
+    second = main.request_interview_admission('second')
+    third = main.request_interview_admission('third')
+    assert (second['position'], third['position']) == (1, 2)
+    assert third['eta_seconds'] > second['eta_seconds']
+
+    main.release_interview_admission('first', completed=True)
+    assert main.poll_waiting_room('second')['admitted']
+    assert main.poll_waiting_room('third')['position'] == 1
+    assert main.request_interview_admission('second') is None
+
+    # With the worker's LLM slots all taken, a call falls back instead of queueing behind them
+    use_fake_client(monkeypatch)
+    monkeypatch.setattr(main, 'llm_scheduler', main.LLMScheduler(1, {'interactive': 1}, 20))
+    monkeypatch.setitem(main.LLM_CLASS_WAIT_S, 'interactive', 0.05)
+    assert main.llm_scheduler.acquire('interactive', 0)[0]
+    fallbacks_before = {reason: fallback_count('ack', reason) for reason in ('capacity', 'error')}
+    assert main.get_openai_response_generic([{"role": "user", "content": "Hi"}], task='ack') == main.LLM_CAPACITY_RESPONSE
+    # Counted once, as capacity; the router does not count the sentinel again as an error
+    assert fallback_count('ack', 'capacity') == fallbacks_before['capacity'] + 1
+    assert fallback_count('ack', 'error') == fallbacks_before['error']
+
+
+def test_stopped_or_failed_interview_releases_its_slot(monkeypatch, tmp_path):
+    monkeypatch.setattr(main.app, 'session_interface', main.StoreSessionInterface(lambda: main.SQLiteSessionStore(str(tmp_path / 'sessions.db'))))
+    monkeypatch.setattr(main, 'ADMISSION_DB_PATH', str(tmp_path / 'admission.db'))
+    monkeypatch.setattr(main, 'MAX_ACTIVE_INTERVIEWS', 1)
+    monkeypatch.setattr(main, 'client', None)
+    monkeypatch.setattr(main, 'QUESTION_POOL_DB_PATH', str(tmp_path / 'pool.db'))
+    monkeypatch.setattr(main, 'extract_resume_text', lambda path: "Credit Analyst at XYZ Bank 2021-2024")
+    monkeypatch.setattr(main, 'generate_resume_questions', lambda text, job_type, asked: ["Tell me about XYZ Bank."])
+    app_client = main.app.test_client()
+    with app_client.session_transaction() as sess:
+        sess['allowed_user_type'] = 'Banking'
+        sess['username'] = 'tester'
+
+    # A start that fails after admission hands the slot back
+    assert app_client.post('/start_interview', data={'interview_track': 'resume', 'mode': 'text'}).status_code == 400
+    assert main.request_interview_admission('waiter') is None
+    main.release_interview_admission('waiter')
+
+    started = app_client.post('/start_interview', data={'resume': (io.BytesIO(b'%PDF-1.4'), 'resume.pdf'), 'interview_track': 'resume', 'mode': 'text'},
+                              content_type='multipart/form-data')
+    assert started.status_code == 200
+    assert main.request_interview_admission('waiter')['position'] == 1
+    stopped = app_client.post('/submit_answer', json={'answer': 'Please stop the interview now.'})
+    assert stopped.get_json()['finished'] is True
+    assert main.poll_waiting_room('waiter')['admitted']
+    assert main.request_interview_admission('waiter') is None
+
+
+def fallback_count(task, reason):
+    return main.REGISTRY.get_sample_value('interviewer_llm_fallback_total', {'task': task, 'reason': reason}) or 0
+
+
+def test_llm_scheduler_prefers_interactive_and_ages_batch(monkeypatch):
+    scheduler = main.LLMScheduler(1, {'interactive': 1, 'near_term': 1, 'batch': 1}, 0.3)
+    assert scheduler.acquire('batch', 0)[0]
+    granted_order = []
+
+    def wait_for_slot(priority_class):
+        if scheduler.acquire(priority_class, 5)[0]:
+            granted_order.append(priority_class)
+            time.sleep(0.05)
+            scheduler.release(priority_class)
+
+    threads = []
+    for priority_class in ('batch', 'near_term', 'interactive'):
+        threads.append(threading.Thread(target=wait_for_slot, args=(priority_class,)))
+        threads[-1].start()
+        time.sleep(0.02)
+    scheduler.release('batch')
+    for thread in threads: thread.join()
+    assert granted_order == ['interactive', 'near_term', 'batch']
+
+    # A batch request that has waited past the starvation age goes ahead of newer interactive work
+    assert scheduler.acquire('near_term', 0)[0]
+    aged = threading.Thread(target=wait_for_slot, args=('batch',))
+    aged.start()
+    time.sleep(0.35)
+    fresh = threading.Thread(target=wait_for_slot, args=('interactive',))
+    fresh.start()
+    time.sleep(0.02)
+    scheduler.release('near_term')
+    aged.join(); fresh.join()
+    assert granted_order[-2:] == ['batch', 'interactive']
+    assert scheduler.snapshot()['batch']['aged'] == 1
+
+    # Offline work tagged batch is scheduled as batch whatever its task policy says
+    with main.llm_priority('batch'):
+        assert main.llm_task_priority('ack') == 'batch'
+    assert main.llm_task_priority('ack') == 'interactive'
+    assert main.llm_task_priority(None) == 'near_term'
+
+
+def test_rate_limit_buckets_are_shared_and_reconciled(monkeypatch, tmp_path):
+    # Two backend instances over the same directory stand in for two workers on one node
+    worker_a = main.SharedMemoryBucketBackend(str(tmp_path))
+    worker_b = main.SharedMemoryBucketBackend(str(tmp_path))
+    assert worker_a.apply('node', 'take', 1, 10, rpm=2, tpm=1000)[0]
+    assert worker_b.apply('node', 'take', 1, 10, rpm=2, tpm=1000)[0]
+    granted, retry_after = worker_a.apply('node', 'take', 1, 10, rpm=2, tpm=1000)
+    assert not granted and 25 < retry_after <= 30
+
+    cluster = main.SQLiteBucketBackend(str(tmp_path / 'admission.db'))
+    node_bucket = ('node', worker_a, 'tokens', 0, 1000)
+    cluster_bucket = ('cluster', cluster, 'tokens', 0, 1000)
+    monkeypatch.setitem(main.rate_limit_state, 'buckets', [node_bucket, cluster_bucket])
+    fake = use_fake_client(monkeypatch, ["Fine."])
+    assert main.get_openai_response_generic([{"role": "user", "content": "Hi"}], max_tokens=400, task='ack') == "Fine."
+    # The estimate (prompt + max_tokens) was replaced by the 120 tokens the fake reported
+    assert all(880 <= bucket_token_level(bucket) < 890 for bucket in (node_bucket, cluster_bucket))
+
+    # A 429 blocks every bucket for Retry-After, then the call is retried and succeeds
+    rate_limit_error = main.RateLimitError("Rate limit reached", body=None, response=rate_limit_response({'retry-after': '0.3'}))
+    replies = iter([rate_limit_error])
+
+    def create_once_limited(**kwargs):
+        error = next(replies, None)
+        if error: raise error
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Retried."))],
+                               usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+    monkeypatch.setattr(fake.completions, 'create', create_once_limited)
+    started = time.monotonic()
+    assert main.get_openai_response_generic([{"role": "user", "content": "Hi"}], task='ack') == "Retried."
+    assert time.monotonic() - started >= 0.3
+
+    # With no capacity before the class's wait budget, the call falls back instead of sleeping past it
+    monkeypatch.setitem(main.rate_limit_state, 'buckets', [('node', worker_a, 'node', 2, 1000)])
+    monkeypatch.setitem(main.LLM_CLASS_WAIT_S, 'interactive', 1)
+    assert main.get_openai_response_generic([{"role": "user", "content": "Hi"}], task='ack') == main.LLM_RATE_LIMITED_RESPONSE
+
+    # The task's hedge deadline also caps the wait, so an abandoned call never waits on (and spends) capacity later
+    monkeypatch.setitem(main.LLM_CLASS_WAIT_S, 'interactive', 30)
+    monkeypatch.setitem(main.LLM_TASK_POLICIES['ack'], 'deadline_s', 0.5)
+    monkeypatch.setattr(fake.completions, 'create', lambda **kwargs: pytest.fail("request sent after the deadline"))
+    started = time.monotonic()
+    assert main.get_openai_response_generic([{"role": "user", "content": "Hello"}], task='ack') == main.LLM_RATE_LIMITED_RESPONSE
+    assert time.monotonic() - started < 0.5
+
+
+def test_unlimited_bucket_dimension_keeps_no_debt(tmp_path):
+    for backend in (main.SharedMemoryBucketBackend(str(tmp_path)), main.SQLiteBucketBackend(str(tmp_path / 'admission.db'))):
+        # With no limit configured, calls and reconciliations must not build up a debt in the stored bucket
+        for _ in range(50):
+            assert backend.apply('node', 'take', 1, 5000, rpm=0, tpm=0)[0]
+            backend.apply('node', 'adjust', 0, 2000, rpm=0, tpm=0)
+        # A limit set later starts from a full bucket
+        assert backend.apply('node', 'take', 1, 900, rpm=2, tpm=1000) == (True, 0.0)
+        assert backend.apply('node', 'take', 1, 50, rpm=2, tpm=1000) == (True, 0.0)
+        granted, retry_after = backend.apply('node', 'take', 1, 10, rpm=2, tpm=1000)
+        assert not granted and retry_after <= 30
+
+
+def bucket_token_level(bucket):
+    _, backend, key, _, _ = bucket
+    if isinstance(backend, main.SharedMemoryBucketBackend):
+        return backend.STATE.unpack_from(backend.bucket_map(key)[1])[1]
+    return backend.connection().execute('SELECT token_level FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()[0]
+
+
+def rate_limit_response(headers):
+    return httpx.Response(429, headers=headers, request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+
+
+def test_duplicate_answer_submissions_replay_one_response(monkeypatch, tmp_path):
+    store = main.SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    monkeypatch.setattr(main.app, 'session_interface', main.StoreSessionInterface(lambda: store))
+    monkeypatch.setattr(main, 'authenticate_user', lambda username, password: 'MBA')
+    processed = []
+
+    def slow_submission():
+        processed.append(main.request.get_json()['answer'])
+        time.sleep(0.3)
+        return main.jsonify({'reply': 'Noted.', 'question_number': len(processed) + 1})
+    monkeypatch.setattr(main, 'process_submitted_answer', slow_submission)
+    app_client = main.app.test_client()
+    assert app_client.post('/login', data={'username': 'candidate', 'password': 'pw'}).get_json()['success']
+
+    headers = {'Idempotency-Key': 'question-0001'}
+    responses = []
+    duplicates = [threading.Thread(target=lambda: responses.append(
+        app_client.post('/submit_answer', json={'answer': 'I led the pricing project.'}, headers=headers))) for _ in range(3)]
+    for thread in duplicates: thread.start()
+    for thread in duplicates: thread.join()
+    assert processed == ['I led the pricing project.']
+    assert [response.get_json() for response in responses] == [{'reply': 'Noted.', 'question_number': 2}] * 3
+    assert sum(response.headers.get('Idempotent-Replayed') == 'true' for response in responses) == 2
+
+    retry = app_client.post('/submit_answer', json={'answer': 'I led the pricing project.'}, headers=headers)
+    assert retry.headers['Idempotent-Replayed'] == 'true' and len(processed) == 1
+    assert app_client.post('/submit_answer', json={'answer': 'Something else.'}, headers=headers).status_code == 422
+    app_client.post('/submit_answer', json={'answer': 'Next answer.'}, headers={'Idempotency-Key': 'question-0002'})
+    assert processed == ['I led the pricing project.', 'Next answer.']
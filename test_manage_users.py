@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test script for the users.db migration/import tool and the hashed login path
+"""
+
+import os
+import sqlite3
+import sys
+
+# Add current directory to path to import main module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from manage_users import main_cli
+
+
+def make_legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL, password TEXT NOT NULL, allowed TEXT NOT NULL
+        )
+    ''')
+    conn.executemany('INSERT INTO users (username, password, allowed) VALUES (?, ?, ?)',
+                     [('asha', '1234', 'MBA'), ('ravi', '5678', 'Bank')])
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_and_import_then_login(monkeypatch, tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    make_legacy_db(db_path)
+    monkeypatch.setattr(main, 'USERS_DB_PATH', db_path)
+    monkeypatch.setattr(main, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    main.invalidate_auth_cache()
+
+    assert main.authenticate_user('asha', '1234') == 'MBA'  # legacy plaintext row still works before migrating
+    assert main_cli(['--db', db_path, '--workers', '1', 'migrate']) == 0
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT password, password_hash FROM users ORDER BY id').fetchall()
+    conn.close()
+    assert all(password == '' and password_hash.startswith('pbkdf2:sha256:1000$') for password, password_hash in rows)
+
+    csv_path = tmp_path / 'candidates.csv'
+    csv_path.write_text("username,password,allowed\nmeera,pass-1,MBA\nravi,new-pass,MBA\n")
+    assert main_cli(['--db', db_path, '--workers', '1', 'import', str(csv_path), '--update']) == 0
+
+    main.invalidate_auth_cache()
+    assert main.authenticate_user('meera', 'pass-1') == 'MBA'
+    assert main.authenticate_user('ravi', 'new-pass') == 'MBA'
+    assert main.authenticate_user('ravi', '5678') is None
+    assert main.authenticate_user('nobody', 'x') is None
+
+    # Cached logins skip the database entirely, but only for the password that was verified
+    monkeypatch.setattr(main, 'USERS_DB_PATH', str(tmp_path / 'missing' / 'users.db'))
+    assert main.authenticate_user('meera', 'pass-1') == 'MBA'
+    assert main.authenticate_user('meera', 'wrong') is None
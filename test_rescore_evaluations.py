@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline re-scoring CLI (mock scorer, checkpoint/resume)
+"""
+
+import os
+import sqlite3
+import sys
+
+# Add current directory to path to import main module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rescore_evaluations import load_checkpoint, main_cli, rescore, results_table_name
+
+
+def make_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE evaluations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT, question TEXT, answer TEXT,
+            evaluation TEXT, score INTEGER, feedback TEXT, timestamp TEXT
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO evaluations (username, question, answer) VALUES (?, ?, ?)',
+        [('user', f"Question {i}?", "I worked on a team project and achieved a measurable result. " * (i % 4)) for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_rescore_resumes_from_checkpoint(tmp_path):
+    db_path = str(tmp_path / 'interview_data.db')
+    make_db(db_path, 25)
+    assert rescore(db_path, 2, chunk_size=10, use_mock=True, limit=10) == 10
+    conn = sqlite3.connect(db_path)
+    assert load_checkpoint(conn, 2) == (10, 10)
+    conn.close()
+
+    assert rescore(db_path, 2, chunk_size=10, use_mock=True) == 25
+    conn = sqlite3.connect(db_path)
+    count, scorer = conn.execute(f'SELECT COUNT(*), MIN(scorer) FROM {results_table_name(2)}').fetchone()
+    conn.close()
+    assert count == 25
+    assert scorer == 'mock'
+
+
+def test_cli_writes_new_version_table(tmp_path):
+    db_path = str(tmp_path / 'interview_data.db')
+    make_db(db_path, 5)
+    assert main_cli(['--db', db_path, '--version', '3', '--mock', '--chunk-size', '2']) == 0
+    conn = sqlite3.connect(db_path)
+    assert conn.execute(f'SELECT COUNT(*) FROM {results_table_name(3)}').fetchone()[0] == 5
+    conn.close()
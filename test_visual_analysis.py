@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script for the frame analysis path (scene-change sampling)
+"""
+
+import io
+import json
+import os
+import sys
+import threading
+
+import cv2
+import numpy as np
+
+# Add current directory to path to import main module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from main import analyze_frame_for_visuals, compute_frame_statistics, new_frame_scene_cache, suggest_frame_interval_ms, to_grayscale, FRAME_INTERVAL_MIN_MS
+
+
+def make_frame(seed, height=480, width=640):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+
+def jpeg_bytes(frame):
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def test_unchanged_frame_reuses_detection():
+    scene_cache = new_frame_scene_cache()
+    frame = make_frame(1)
+    first = analyze_frame_for_visuals(frame, scene_cache)
+    second = analyze_frame_for_visuals(frame.copy(), scene_cache)
+    assert first['detection_reused'] is False
+    assert first['scene_changed'] is True
+    assert second['detection_reused'] is True
+    assert second['scene_changed'] is False
+    assert second['face_count'] == first['face_count']
+
+
+def test_changed_frame_runs_detection():
+    scene_cache = new_frame_scene_cache()
+    analyze_frame_for_visuals(make_frame(1), scene_cache)
+    changed = analyze_frame_for_visuals(make_frame(2), scene_cache)
+    assert changed['detection_reused'] is False
+    assert changed['scene_changed'] is True
+
+
+def test_scene_cache_can_be_bypassed():
+    frame = make_frame(3)
+    analyze_frame_for_visuals(frame)
+    result = analyze_frame_for_visuals(frame)
+    assert result['detection_reused'] is False
+
+
+def test_scene_cache_is_not_shared_between_streams():
+    frame = make_frame(5)
+    analyze_frame_for_visuals(frame, new_frame_scene_cache())
+    other_candidate = analyze_frame_for_visuals(frame.copy(), new_frame_scene_cache())
+    assert other_candidate['detection_reused'] is False
+
+
+def test_motion_raises_sampling_rate():
+    assert suggest_frame_interval_ms({'scene_changed': True, 'face_detected': True}) <= suggest_frame_interval_ms({'scene_changed': False, 'face_detected': True})
+    assert suggest_frame_interval_ms({'scene_changed': False, 'face_detected': False}) >= FRAME_INTERVAL_MIN_MS
+
+
+def test_frame_statistics_match_full_frame():
+    for height, width in [(480, 640), (720, 1280)]:
+        frame = make_frame(4, height, width)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        brightness, contrast = compute_frame_statistics(to_grayscale(frame))
+        assert abs(brightness - float(np.mean(gray))) < 1.0
+        assert abs(contrast - float(np.std(gray))) < 1.0
+
+
+def test_frame_buffers_are_bounded_per_thread(monkeypatch):
+    monkeypatch.setattr(main, 'frame_buffers_local', threading.local())
+    for width in range(100, 140):
+        main.analyze_frame_for_visuals(np.zeros((80, width, 3), dtype=np.uint8))
+    assert len(main.frame_buffers_local.buffers) <= main.FRAME_BUFFER_SHAPES
+    gray = main.get_frame_buffer('gray', (80, 139))
+    assert main.get_frame_buffer('gray', (80, 139)) is gray  # the most recent shape is still reused
+
+
+class FakeWebSocket:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def receive(self):
+        return self.messages.pop(0) if self.messages else None
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+
+def run_frame_stream(monkeypatch, tmp_path, messages, logged_in=True):
+    store = main.SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    monkeypatch.setattr(main.app, 'session_interface', main.StoreSessionInterface(lambda: store))
+    monkeypatch.setattr(main.cv2, 'imwrite', lambda path, frame: True)
+    ws = FakeWebSocket(messages)
+    with main.app.test_request_context('/ws/frames'):
+        if logged_in: main.session.update(allowed_user_type='MBA', username='candidate')
+        main.frame_stream_handler(ws)
+    return ws
+
+
+def test_frame_stream_rejects_anonymous_connections(monkeypatch, tmp_path):
+    ws = run_frame_stream(monkeypatch, tmp_path, [jpeg_bytes(make_frame(6))], logged_in=False)
+    assert ws.sent == [{'error': 'Unauthorized'}]
+    assert len(ws.messages) == 1
+
+
+def test_frame_stream_beyond_worker_limit_falls_back_to_http(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'FRAME_STREAMS_PER_WORKER', 1)
+    monkeypatch.setattr(main, 'frame_stream_slots', threading.BoundedSemaphore(1))
+    assert main.frame_stream_slots.acquire(blocking=False)  # one stream already holds this worker's thread budget
+    ws = run_frame_stream(monkeypatch, tmp_path, [jpeg_bytes(make_frame(9))])
+    assert ws.sent == [{'error': 'Frame streams busy', 'fallback': 'http'}]
+    main.frame_stream_slots.release()
+    ws = run_frame_stream(monkeypatch, tmp_path, [json.dumps({'type': 'stop'})])
+    assert 'next_interval_ms' in ws.sent[0]
+    assert main.frame_stream_slots.acquire(blocking=False)  # the finished stream gave its slot back
+
+
+def test_frame_stream_replies_with_analysis_until_stop(monkeypatch, tmp_path):
+    ws = run_frame_stream(monkeypatch, tmp_path, [
+        jpeg_bytes(make_frame(7)), b'not a jpeg', json.dumps({'type': 'stop'}), jpeg_bytes(make_frame(8))
+    ])
+    hello, analyzed, bad_frame = ws.sent
+    assert hello['next_interval_ms'] > 0
+    assert analyzed['success'] and 'face_count' in analyzed['analysis'] and analyzed['next_interval_ms'] > 0
+    assert bad_frame['error'] == 'Failed to decode image' and bad_frame['next_interval_ms'] > 0
+    assert len(ws.messages) == 1  # nothing is read after 'stop'
+
+
+def test_failed_pool_submit_does_not_leak_pending_count(monkeypatch, tmp_path):
+    def broken_submit(*args, **kwargs): raise RuntimeError('cannot schedule new futures after shutdown')
+    monkeypatch.setattr(main, 'submit_with_context', broken_submit)
+    pending_before = main.frame_analysis_pending
+    ws = run_frame_stream(monkeypatch, tmp_path, [jpeg_bytes(make_frame(9))])
+    assert ws.sent[1]['error'] == 'Frame analysis failed'
+    assert main.frame_analysis_pending == pending_before
+
+
+def test_icebreaker_precheck_rejects_dark_and_faceless_frames():
+    assert main.icebreaker_precheck(np.zeros((480, 640, 3), dtype=np.uint8)) == (False, 'Frame too dark')
+    assert main.icebreaker_precheck(make_frame(10)) == (False, 'No face detected')
+
+
+def test_icebreaker_image_is_downscaled():
+    data_url = main.encode_icebreaker_image(make_frame(11, 720, 1280))
+    jpeg = np.frombuffer(main.base64.b64decode(data_url.split(',', 1)[1]), np.uint8)
+    assert cv2.imdecode(jpeg, cv2.IMREAD_COLOR).shape[:2] == (288, 512)
+
+
+def logged_in_client(monkeypatch, tmp_path, username):
+    monkeypatch.setattr(main.app, 'session_interface', main.StoreSessionInterface(lambda: main.SQLiteSessionStore(str(tmp_path / 'sessions.db'))))
+    monkeypatch.setattr(main, 'authenticate_user', lambda username, password: 'MBA')
+    app_client = main.app.test_client()
+    assert app_client.post('/login', data={'username': username, 'password': 'pw'}).get_json()['success']
+    return app_client
+
+
+def test_icebreaker_job_is_served_by_any_worker_to_its_owner_only(monkeypatch, tmp_path):
+    vision_call_may_finish = threading.Event()
+
+    def slow_vision_call(image_data_url):
+        vision_call_may_finish.wait(5)
+        return "What is the story behind the bookshelf behind you?"
+    monkeypatch.setattr(main, 'icebreaker_precheck', lambda cv_frame: (True, None))
+    monkeypatch.setattr(main, 'generate_environment_icebreaker_question', slow_vision_call)
+    monkeypatch.setattr(main.cv2, 'imwrite', lambda path, frame: True)
+    candidate = logged_in_client(monkeypatch, tmp_path, 'candidate')
+    started = candidate.post('/capture_initial_frame', data={'image': (io.BytesIO(jpeg_bytes(make_frame(12))), 'frame.jpg')}).get_json()
+    assert started['success'] and not started['icebreaker_ready']
+    icebreaker_url = f"/icebreaker/{started['icebreaker_id']}"
+    assert candidate.get(f"{icebreaker_url}?wait=-5").get_json() == {'ready': False, 'icebreaker_question': None}
+
+    # Another worker has no future for this job; it answers from the shared record
+    local_jobs = dict(main.icebreaker_jobs)
+    monkeypatch.setattr(main, 'icebreaker_jobs', {})
+    assert candidate.get(f"{icebreaker_url}?wait=0").get_json()['ready'] is False
+    vision_call_may_finish.set()
+    local_jobs[started['icebreaker_id']]['future'].result(timeout=5)
+    assert candidate.get(f"{icebreaker_url}?wait=1").get_json()['icebreaker_question'] == "What is the story behind the bookshelf behind you?"
+
+    other_candidate = logged_in_client(monkeypatch, tmp_path, 'someone-else')
+    assert other_candidate.get(icebreaker_url).status_code == 404
+    assert main.app.test_client().get(icebreaker_url).status_code == 401